@@ -0,0 +1,27 @@
+"""
+Configuration gunicorn (chargée automatiquement depuis le répertoire courant)
+"""
+
+# L'application est importée une seule fois par le maître : les caches préchauffés avant le fork
+# sont partagés par les workers (copy-on-write)
+preload_app = True
+
+
+def on_starting(server):
+    # Les métriques des workers d'un lancement précédent ne doivent pas être additionnées
+    from src.services import metrics
+    metrics.clear_metrics_dir()
+
+
+def when_ready(server):
+    # Appelé dans le maître avant le démarrage des workers ; wsgi() garantit que l'application
+    # (et donc les caches qu'elle enregistre) est chargée à ce stade
+    server.app.wsgi()
+    from src.services import warm_start
+    warm_start.warm()
+
+
+def pre_fork(server, worker):
+    # Un worker recyclé repart du dernier snapshot écrit sur disque par ses prédécesseurs
+    from src.services import warm_start
+    warm_start.load()
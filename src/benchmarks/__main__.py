@@ -0,0 +1,75 @@
+"""
+Suite de benchmarks des services et routes
+
+Usage:
+    python -m src.benchmarks run [--filter routes.] [--min-time 1] [--save main] [--compare main]
+    python -m src.benchmarks list
+    python -m src.benchmarks record [--max-isins 5]
+"""
+import argparse
+import json
+import logging
+import sys
+
+from . import suites  # noqa: F401  (enregistre les benchmarks)
+from .fixtures import FIXTURES_DIR, FixtureStore, record, replay
+from .harness import (compare, format_comparison, format_report, load_baseline, registered, run,
+                      save_baseline)
+
+logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m src.benchmarks', description="Benchmarks Atlas_View")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = sub.add_parser('run', help="Lancer les benchmarks")
+    run_parser.add_argument('--filter', default='', help="Ne lancer que les benchmarks contenant ce texte")
+    run_parser.add_argument('--min-time', type=float, default=1.0, help="Durée minimale par benchmark (s)")
+    run_parser.add_argument('--fixtures', default=FIXTURES_DIR, help="Répertoire des fixtures enregistrées")
+    run_parser.add_argument('--save', metavar='NOM', help="Enregistrer le rapport comme référence")
+    run_parser.add_argument('--compare', metavar='NOM', help="Comparer à une référence enregistrée")
+    run_parser.add_argument('--threshold', type=float, default=0.10, help="Seuil de régression (défaut 0.10)")
+    run_parser.add_argument('--json', action='store_true', help="Afficher le rapport en JSON")
+
+    sub.add_parser('list', help="Lister les benchmarks")
+
+    record_parser = sub.add_parser('record', help="Enregistrer les réponses BVMT/irbe7 réelles")
+    record_parser.add_argument('--output', default=FIXTURES_DIR)
+    record_parser.add_argument('--max-isins', type=int, default=5)
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'list':
+        print('\n'.join(registered()))
+        return 0
+
+    if args.command == 'record':
+        written = record(args.output, max_isins=args.max_isins)
+        print(f"{len(written)} réponses enregistrées dans {args.output}")
+        return 0 if written else 1
+
+    names = [n for n in registered() if args.filter in n]
+    store = FixtureStore(args.fixtures)
+    if not store.recorded:
+        print("Aucune fixture enregistrée : réponses synthétiques utilisées", file=sys.stderr)
+
+    with replay(store):
+        report = run(names, min_time=args.min_time)
+
+    print(json.dumps(report, indent=2) if args.json else format_report(report))
+
+    status = 0
+    if args.compare:
+        rows = compare(report, load_baseline(args.compare), threshold=args.threshold)
+        print()
+        print(format_comparison(rows))
+        if any(r['status'] == 'régression' for r in rows):
+            status = 1
+    if args.save:
+        print(f"\nRéférence enregistrée: {save_baseline(report, args.save)}")
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
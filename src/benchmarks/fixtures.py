@@ -0,0 +1,381 @@
+"""
+Réponses BVMT / irbe7 enregistrées pour les benchmarks
+
+Les fixtures sont des fichiers JSON bruts (un par URL appelée) dans le répertoire
+`src/benchmarks/fixtures/`, produits par `python -m src.benchmarks record`.
+Lorsqu'une réponse n'a pas été enregistrée, une réponse synthétique déterministe
+de même forme est générée, pour que les benchmarks tournent aussi hors ligne.
+"""
+import json
+import logging
+import os
+import random
+import tempfile
+import zlib
+from contextlib import contextmanager
+from datetime import date, timedelta
+from typing import Dict, Iterator, List, Optional
+from unittest import mock
+from urllib.parse import quote, unquote, urlsplit
+
+import requests
+from requests.adapters import BaseAdapter
+
+from ..services.bvmt_service import (TUNINDEX20_ISIN, TUNINDEX_ISIN, endpoint_template, get_bvmt_base_url,
+                                     get_irbe7_base_url)
+
+logger = logging.getLogger(__name__)
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+BVMT_PREFIX = '/rest_api/rest/'
+IRBE7_HOST = 'data.irbe7.com'
+IRBE7_PATHS = ('/api/data', '/api/data/history', '/dataCharts')
+INDEX_ISINS = (TUNINDEX_ISIN, TUNINDEX20_ISIN)
+MARKET_KEY = 'market/groups/11,12,51,52,99'
+
+
+def url_to_key(url: str) -> str:
+    """
+    Clé de fixture d'une URL : endpoint BVMT ('history/TN...') ou 'irbe7:/api/data...'
+    """
+    parts = urlsplit(url)
+    if IRBE7_HOST in parts.netloc or parts.path in IRBE7_PATHS:
+        return f"irbe7:{parts.path}"
+    path = parts.path
+    if BVMT_PREFIX in path:
+        path = path.split(BVMT_PREFIX, 1)[1]
+    return path.strip('/')
+
+
+def key_to_filename(key: str) -> str:
+    return quote(key, safe='') + '.json'
+
+
+def _isin(i: int) -> str:
+    return f"TN{i:09d}{i % 10}"
+
+
+class FixtureStore:
+    """
+    Fournit le corps brut d'une réponse upstream à partir d'une clé de fixture
+    """
+
+    def __init__(self, directory: Optional[str] = FIXTURES_DIR, seed: int = 42, n_stocks: int = 80,
+                 history_sessions: int = 750, intraday_points: int = 400):
+        self.seed = seed
+        self.n_stocks = n_stocks
+        self.history_sessions = history_sessions
+        self.intraday_points = intraday_points
+        self._recorded: Dict[str, bytes] = {}
+        self._by_template: Dict[str, bytes] = {}
+        self._generated: Dict[str, bytes] = {}
+        if directory and os.path.isdir(directory):
+            for name in sorted(os.listdir(directory)):
+                if name.endswith('.json'):
+                    key = unquote(name[:-5])
+                    with open(os.path.join(directory, name), 'rb') as f:
+                        self._recorded[key] = f.read()
+                    self._by_template.setdefault(endpoint_template(key), self._recorded[key])
+        self._stocks = self._make_stocks()
+        self._market: Optional[List[Dict]] = None
+
+    @property
+    def recorded(self) -> int:
+        return len(self._recorded)
+
+    def _market_rows(self) -> List[Dict]:
+        # Lignes de la réponse marché rejouée (enregistrée si elle existe, synthétique sinon) : les valeurs
+        # interrogées par les benchmarks sont toujours présentes dans le snapshot de l'application
+        if self._market is None:
+            rows = (self.json(MARKET_KEY) or {}).get('markets') or []
+            self._market = [row for row in rows if row.get('isin') and (row.get('referentiel') or {}).get('ticker')]
+        return self._market
+
+    @property
+    def isins(self) -> List[str]:
+        return [row['isin'] for row in self._market_rows()]
+
+    @property
+    def tickers(self) -> List[str]:
+        return [row['referentiel']['ticker'] for row in self._market_rows()]
+
+    def body(self, key: str) -> Optional[bytes]:
+        if key in self._recorded:
+            return self._recorded[key]
+        if key in self._generated:
+            return self._generated[key]
+        # Réponse enregistrée pour une autre valeur du même modèle d'endpoint
+        template = endpoint_template(key)
+        if template in self._by_template:
+            return self._by_template[template]
+        payload = self._synthetic(key)
+        if payload is None:
+            return None
+        body = json.dumps(payload).encode('utf-8')
+        self._generated[key] = body
+        return body
+
+    def json(self, key: str):
+        body = self.body(key)
+        return json.loads(body) if body is not None else None
+
+    # Génération synthétique (même forme que les réponses réelles)
+
+    def _rng(self, *parts) -> random.Random:
+        return random.Random(zlib.crc32(repr((self.seed,) + parts).encode()))
+
+    def _make_stocks(self) -> List[Dict]:
+        rng = self._rng('stocks')
+        stocks = []
+        for i in range(self.n_stocks):
+            last = round(rng.uniform(1, 150), 3)
+            close = round(last / (1 + rng.gauss(0, 0.015)), 3)
+            stocks.append({
+                'isin': _isin(1000 + i),
+                'referentiel': {
+                    'ticker': f"TK{i:02d}",
+                    'stockName': f"SOCIETE {i:02d}",
+                    'arabName': f"شركة {i:02d}",
+                    'valGroup': rng.choice(['11', '11', '12', '51', '52', '99']),
+                    'isin': _isin(1000 + i)
+                },
+                'last': last,
+                'close': close,
+                'open': round(close * (1 + rng.gauss(0, 0.005)), 3),
+                'high': round(max(last, close) * 1.01, 3),
+                'low': round(min(last, close) * 0.99, 3),
+                'volume': rng.randint(0, 200000),
+                'change': round((last / close - 1) * 100, 2),
+                'ychange': round(rng.uniform(-15, 15), 2),
+                'caps': rng.randint(10, 5000) * 1e6,
+                'seance': date(2025, 9, 26).isoformat(),
+                'arabSeance': '2025-09-26',
+                'status': 'A',
+                'time': '14:10:00',
+                'trading': 'C',
+                'min': round(close * 0.97, 3),
+                'max': round(close * 1.03, 3)
+            })
+        return stocks
+
+    def _history(self, isin: str) -> List[Dict]:
+        rng = self._rng('history', isin)
+        price = rng.uniform(5, 100)
+        day = date(2025, 9, 26) - timedelta(days=int(self.history_sessions * 1.45))
+        rows = []
+        while len(rows) < self.history_sessions:
+            day += timedelta(days=1)
+            if day.weekday() >= 5:
+                continue
+            previous = price
+            price = max(0.1, price * (1 + rng.gauss(0.0002, 0.012)))
+            rows.append({
+                'seance': day.isoformat(),
+                'open': round(previous, 3),
+                'high': round(max(previous, price) * (1 + abs(rng.gauss(0, 0.004))), 3),
+                'low': round(min(previous, price) * (1 - abs(rng.gauss(0, 0.004))), 3),
+                'last': round(price, 3),
+                'close': round(price, 3),
+                'volume': rng.randint(0, 50000),
+                'capitalisation': round(price * rng.randint(1000, 5000), 2)
+            })
+        return rows
+
+    def _intraday(self, isin: str) -> List[Dict]:
+        rng = self._rng('intraday', isin)
+        price = rng.uniform(5, 100)
+        points = []
+        for k in range(self.intraday_points):
+            seconds = 9 * 3600 + k * (5 * 3600 // self.intraday_points)
+            price = max(0.1, price * (1 + rng.gauss(0, 0.001)))
+            points.append({
+                'time': f"{seconds // 3600:02d}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}",
+                'last': round(price, 3),
+                'volume': rng.randint(0, 2000)
+            })
+        return points
+
+    def _synthetic(self, key: str):
+        if key.startswith('irbe7:'):
+            return self._synthetic_irbe7(key[len('irbe7:'):])
+
+        template = endpoint_template(key)
+        isin = key.split('/')[-1]
+        if template in ('market/groups/{groups}', 'market/qtys'):
+            return {'markets': self._stocks}
+        if template == 'market/hausses':
+            return {'markets': sorted([s for s in self._stocks if s['change'] > 0], key=lambda s: -s['change'])}
+        if template == 'market/baisses':
+            return {'markets': sorted([s for s in self._stocks if s['change'] < 0], key=lambda s: s['change'])}
+        if template == 'market/volumes':
+            return {'markets': sorted(self._stocks, key=lambda s: -s['volume'])}
+        if template == 'status/all':
+            return {'status': [{'isin': s['isin'], 'status': s['status']} for s in self._stocks]}
+        if template == 'market/{isin}':
+            stock = next((s for s in self._stocks if s['isin'] == isin), None)
+            if stock is None and isin in INDEX_ISINS:
+                stock = {'isin': isin, 'last': 10000.0, 'change': 12.5, 'ychange': 0.12,
+                         'seance': '2025-09-26', 'time': '14:10:00',
+                         'referentiel': {'stockName': 'TUNINDEX' if isin == TUNINDEX_ISIN else 'TUNINDEX20'}}
+            return {'market': stock} if stock else None
+        if template == 'history/{isin}':
+            rows = self._history(isin)
+            if isin in INDEX_ISINS:
+                return {'indexHistorys': [{
+                    'sEANCE': r['seance'], 'lAST': r['close'] * 100, 'oPEN': r['open'] * 100,
+                    'hIGH': r['high'] * 100, 'lOW': r['low'] * 100, 'pREV_CLOSE': r['open'] * 100
+                } for r in rows]}
+            return {'history': rows}
+        if template == 'intraday/{isin}':
+            points = self._intraday(isin)
+            if isin in INDEX_ISINS:
+                return {'intradayDatas': [{'sEANCE': p['time'], 'lAST': p['last'] * 100} for p in points]}
+            return {'intradays': points}
+        if template == 'limits/{isin}':
+            rng = self._rng('limits', isin)
+            price = rng.uniform(5, 100)
+            return {'limits': [{
+                'bidOrd': rng.randint(1, 9), 'bidQty': rng.randint(1, 5000), 'bid': round(price * (1 - 0.002 * k), 3),
+                'ask': round(price * (1 + 0.002 * (k + 1)), 3), 'askQty': rng.randint(1, 5000), 'askOrd': rng.randint(1, 9)
+            } for k in range(5)]}
+        return None
+
+    def _synthetic_irbe7(self, path: str):
+        if path == '/api/data':
+            return [{
+                'referentiel': {k: s['referentiel'][k] for k in ('ticker', 'stockName', 'arabName', 'isin')},
+                'last': s['last'], 'change': s['change'], 'volume': s['volume'], 'close': s['close'],
+                'open': s['open'], 'high': s['high'], 'low': s['low']
+            } for s in self._stocks]
+        if path == '/api/data/history':
+            rows = self._history('irbe7')
+            epoch = date(1970, 1, 1)
+            return {
+                's': 'ok',
+                't': [(date.fromisoformat(r['seance']) - epoch).days * 86400 for r in rows],
+                'o': [r['open'] for r in rows],
+                'h': [r['high'] for r in rows],
+                'l': [r['low'] for r in rows],
+                'c': [r['close'] for r in rows],
+                'v': [r['volume'] for r in rows]
+            }
+        if path == '/dataCharts':
+            return {'charts': []}
+        return None
+
+
+class FixtureAdapter(BaseAdapter):
+    """
+    Adaptateur `requests` qui sert les fixtures au lieu d'appeler le réseau
+    """
+
+    def __init__(self, store: FixtureStore):
+        super().__init__()
+        self.store = store
+        self.calls = 0
+
+    def send(self, request, **kwargs):
+        self.calls += 1
+        body = self.store.body(url_to_key(request.url))
+        response = requests.Response()
+        response.status_code = 200 if body is not None else 404
+        response.reason = 'OK' if body is not None else 'Not Found'
+        response._content = body if body is not None else b'{"error": "fixture absente"}'
+        response.headers['Content-Type'] = 'application/json'
+        response.encoding = 'utf-8'
+        response.url = request.url
+        response.request = request
+        return response
+
+    def close(self):
+        pass
+
+
+_active_store: Optional[FixtureStore] = None
+
+
+def active_store() -> FixtureStore:
+    """
+    Fixtures actuellement rejouées (ou un jeu par défaut hors de `replay`)
+    """
+    global _active_store
+    if _active_store is None:
+        _active_store = FixtureStore()
+    return _active_store
+
+
+@contextmanager
+def replay(store: Optional[FixtureStore] = None) -> Iterator[FixtureAdapter]:
+    """
+    Redirige tous les appels `requests` (BVMTService comme appels directs) vers les fixtures.
+    Le limiteur de débit est désactivé : les fixtures ne coûtent rien à l'amont, et le seau partagé
+    de RATE_LIMIT_DIR reste intact pour les workers de la machine. Les fichiers écrits par l'application
+    (valeurs de démarrage à chaud, archives de séance) vont dans un répertoire temporaire : des données
+    synthétiques ne doivent jamais remplacer celles servies par les workers.
+    """
+    global _active_store
+    previous = _active_store
+    _active_store = store or FixtureStore()
+    adapter = FixtureAdapter(_active_store)
+    try:
+        with tempfile.TemporaryDirectory(prefix='atlas_bench_') as scratch, \
+                mock.patch.object(requests.Session, 'get_adapter', lambda self, url: adapter), \
+                mock.patch.dict(os.environ, {
+                    'RATE_LIMIT_ENABLED': 'false',
+                    'WARM_START_PATH': os.path.join(scratch, 'warm_start.json.gz'),
+                    'SESSION_ARCHIVE_DIR': os.path.join(scratch, 'archives'),
+                    'BACKTEST_RESULTS_DIR': os.path.join(scratch, 'backtests')
+                }):
+            yield adapter
+    finally:
+        _active_store = previous
+
+
+def record(directory: str = FIXTURES_DIR, max_isins: int = 5, timeout: int = 30) -> List[str]:
+    """
+    Enregistre les réponses réelles BVMT / irbe7 utilisées par l'application
+    """
+    bvmt_base = get_bvmt_base_url()
+    irbe7_base = get_irbe7_base_url()
+    session = requests.Session()
+    session.headers.update({'User-Agent': 'Carthago-Market/1.0', 'Accept': 'application/json'})
+    os.makedirs(directory, exist_ok=True)
+    written = []
+
+    def save(key: str, url: str, params: Optional[Dict] = None):
+        try:
+            response = session.get(url, params=params, timeout=timeout)
+            response.raise_for_status()
+            response.json()
+        except (requests.exceptions.RequestException, ValueError) as e:
+            logger.error(f"Enregistrement impossible pour {url}: {e}")
+            return None
+        with open(os.path.join(directory, key_to_filename(key)), 'wb') as f:
+            f.write(response.content)
+        written.append(key)
+        return response.json()
+
+    endpoints = [MARKET_KEY, 'market/qtys', 'market/hausses', 'market/baisses',
+                 'market/volumes', 'status/all']
+    groups = None
+    for endpoint in endpoints:
+        data = save(endpoint, f"{bvmt_base}/{endpoint}")
+        if endpoint.startswith('market/groups'):
+            groups = data
+
+    isins = [m['isin'] for m in (groups or {}).get('markets', []) if m.get('isin')][:max_isins]
+    for isin in list(INDEX_ISINS) + isins:
+        for template in ('market', 'history', 'intraday', 'limits'):
+            if template == 'limits' and isin in INDEX_ISINS:
+                continue
+            save(f"{template}/{isin}", f"{bvmt_base}/{template}/{isin}")
+
+    data = save('irbe7:/api/data', f"{irbe7_base}/api/data")
+    if data:
+        stock_name = next((item['referentiel']['stockName'] for item in data
+                           if item.get('referentiel', {}).get('stockName')), None)
+        if stock_name:
+            save('irbe7:/api/data/history', f"{irbe7_base}/api/data/history",
+                 params={'symbol': stock_name, 'resolution': '1D', 'from': '0', 'to': '9999999999', 'countback': '2'})
+    return written
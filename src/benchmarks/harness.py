@@ -0,0 +1,172 @@
+"""
+Mesure des benchmarks : opérations/s, percentiles de latence, allocations et comparaison à une référence
+"""
+import gc
+import json
+import os
+import platform
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+BASELINES_DIR = os.getenv('BENCHMARK_BASELINES_DIR',
+                          os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), '.benchmarks'))
+
+_registry: Dict[str, Callable[[], Callable[[], object]]] = {}
+
+
+def benchmark(name: str):
+    """
+    Enregistre un benchmark. La fonction décorée prépare le contexte et retourne l'opération à mesurer.
+    """
+    def decorator(setup: Callable[[], Callable[[], object]]):
+        _registry[name] = setup
+        return setup
+    return decorator
+
+
+def registered() -> List[str]:
+    return sorted(_registry)
+
+
+def _percentile(sorted_values: List[int], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * q
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+def measure(op: Callable[[], object], min_time: float = 1.0, min_rounds: int = 20,
+            max_rounds: int = 100000, warmup: int = 3, alloc_rounds: int = 5) -> Dict:
+    """
+    Exécute `op` jusqu'à `min_time` secondes (et au moins `min_rounds` fois) et retourne les statistiques
+    """
+    for _ in range(warmup):
+        result = op()
+    # Taille de la charge utile quand l'opération retourne un corps de réponse
+    payload = result if warmup and isinstance(result, (bytes, bytearray)) else None
+
+    timings = []
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        started = time.perf_counter()
+        while len(timings) < max_rounds and (len(timings) < min_rounds or time.perf_counter() - started < min_time):
+            t0 = time.perf_counter_ns()
+            op()
+            timings.append(time.perf_counter_ns() - t0)
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+
+    # Allocations : mesurées à part, tracemalloc ralentissant fortement l'exécution
+    tracemalloc.start()
+    try:
+        retained = peak = 0
+        for _ in range(alloc_rounds):
+            tracemalloc.reset_peak()
+            start, _ = tracemalloc.get_traced_memory()
+            op()
+            current, round_peak = tracemalloc.get_traced_memory()
+            retained += current - start
+            peak = max(peak, round_peak - start)
+    finally:
+        tracemalloc.stop()
+
+    timings.sort()
+    total = sum(timings)
+    return {
+        'rounds': len(timings),
+        'ops_per_sec': round(len(timings) / (total / 1e9), 2) if total else None,
+        'mean_us': round(total / len(timings) / 1e3, 2),
+        'min_us': round(timings[0] / 1e3, 2),
+        'p50_us': round(_percentile(timings, 0.50) / 1e3, 2),
+        'p90_us': round(_percentile(timings, 0.90) / 1e3, 2),
+        'p99_us': round(_percentile(timings, 0.99) / 1e3, 2),
+        'max_us': round(timings[-1] / 1e3, 2),
+        'retained_bytes_per_op': int(retained / alloc_rounds),
+        'peak_bytes_per_op': int(peak),
+        'payload_bytes': len(payload) if payload is not None else None
+    }
+
+
+def run(names: Optional[List[str]] = None, min_time: float = 1.0) -> Dict:
+    """
+    Lance les benchmarks enregistrés (ou une sélection) et retourne un rapport
+    """
+    results = {}
+    for name in names or registered():
+        op = _registry[name]()
+        results[name] = measure(op, min_time=min_time)
+    return {
+        'created_at': datetime.utcnow().isoformat(),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'results': results
+    }
+
+
+def baseline_path(name: str) -> str:
+    return os.path.join(BASELINES_DIR, f"{name}.json")
+
+
+def save_baseline(report: Dict, name: str) -> str:
+    os.makedirs(BASELINES_DIR, exist_ok=True)
+    path = baseline_path(name)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    return path
+
+
+def load_baseline(name: str) -> Dict:
+    path = name if os.path.isfile(name) else baseline_path(name)
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def compare(report: Dict, baseline: Dict, threshold: float = 0.10) -> List[Dict]:
+    """
+    Compare un rapport à une référence sur la latence médiane.
+    Un ralentissement supérieur à `threshold` (10 % par défaut) est signalé comme régression.
+    """
+    rows = []
+    for name, current in report['results'].items():
+        reference = baseline.get('results', {}).get(name)
+        if not reference or not reference.get('p50_us'):
+            rows.append({'name': name, 'status': 'nouveau', 'p50_us': current['p50_us']})
+            continue
+        ratio = current['p50_us'] / reference['p50_us']
+        status = 'régression' if ratio > 1 + threshold else ('amélioration' if ratio < 1 - threshold else 'stable')
+        rows.append({
+            'name': name,
+            'status': status,
+            'p50_us': current['p50_us'],
+            'baseline_p50_us': reference['p50_us'],
+            'change_percent': round((ratio - 1) * 100, 1),
+            'peak_alloc_change_bytes': current['peak_bytes_per_op'] - reference.get('peak_bytes_per_op', 0)
+        })
+    return rows
+
+
+def format_report(report: Dict) -> str:
+    lines = [f"{'benchmark':<58}{'ops/s':>12}{'p50 µs':>12}{'p90 µs':>12}{'p99 µs':>12}{'peak B/op':>12}"
+             f"{'octets':>10}"]
+    for name, r in report['results'].items():
+        payload = r.get('payload_bytes')
+        lines.append(f"{name:<58}{r['ops_per_sec'] or 0:>12.1f}{r['p50_us']:>12.1f}{r['p90_us']:>12.1f}"
+                     f"{r['p99_us']:>12.1f}{r['peak_bytes_per_op']:>12d}{payload if payload is not None else '-':>10}")
+    return '\n'.join(lines)
+
+
+def format_comparison(rows: List[Dict]) -> str:
+    lines = [f"{'benchmark':<58}{'p50 µs':>12}{'réf. µs':>12}{'écart':>10}  statut"]
+    for r in rows:
+        if 'baseline_p50_us' in r:
+            lines.append(f"{r['name']:<58}{r['p50_us']:>12.1f}{r['baseline_p50_us']:>12.1f}"
+                         f"{r['change_percent']:>9.1f}%  {r['status']}")
+        else:
+            lines.append(f"{r['name']:<58}{r['p50_us']:>12.1f}{'-':>12}{'-':>10}  {r['status']}")
+    return '\n'.join(lines)
@@ -0,0 +1,144 @@
+"""
+Benchmarks des services et des routes (upstream rejoué depuis les fixtures)
+"""
+from .fixtures import active_store
+from .harness import benchmark
+
+
+@benchmark('services.normalize_stock_data')
+def bench_normalize_stock_data():
+    from ..services.bvmt_service import BVMTService
+    service = BVMTService()
+    row = active_store().json('market/groups/11,12,51,52,99')['markets'][0]
+    return lambda: service.normalize_stock_data(row)
+
+
+@benchmark('services.normalize_stock_data[market]')
+def bench_normalize_market():
+    from ..services.bvmt_service import BVMTService
+    service = BVMTService()
+    rows = active_store().json('market/groups/11,12,51,52,99')['markets']
+    return lambda: [service.normalize_stock_data(row) for row in rows]
+
+
+@benchmark('services.DataService.get_market_summary')
+def bench_market_summary():
+    from ..services.data_service import DataService
+    service = DataService()
+    return service.get_market_summary
+
+
+@benchmark('services.DataService.search_stocks')
+def bench_search_stocks():
+    from ..services.data_service import DataService
+    service = DataService()
+    return lambda: service.search_stocks('soc', 20)
+
+
+@benchmark('services.AIStockAnalyzer.analyze_stock_with_indicators')
+def bench_ai_analyzer():
+    from ..services.ai_analysis import AIStockAnalyzer
+    analyzer = AIStockAnalyzer()
+    indicators = {'rsi': 50, 'macd': 0.12, 'macd_signal': 0.08, 'sma_20': 10.2, 'sma_50': 9.8, 'momentum': 0.4}
+    return lambda: analyzer.analyze_stock_with_indicators(
+        indicators=indicators, current_price=10.5, support=9.1, resistance=11.2,
+        current_volume=12000, previous_volume=9500, avg_volume_20=10000, volume_trend='hausse'
+    )
+
+
+def _news_texts(n: int):
+    subjects = ('La BIAT', 'SFBT', 'Le TUNINDEX', 'Poulina', 'La BNA', 'Délice Holding', 'Carthage Cement', 'L\'UIB')
+    verbs = ('enregistre une hausse de', 'recule de', 'publie un bénéfice en progression de', 'subit une perte de')
+    return [f"{subjects[i % len(subjects)]} {verbs[(i // 3) % len(verbs)]} {1 + i % 9}.{i % 7} % "
+            f"sur la séance n°{i}, dans un marché {'optimiste' if i % 2 else 'inquiet'}." for i in range(n)]
+
+
+@benchmark('inference.sentiment[local, x64 unbatched]')
+def bench_inference_unbatched():
+    from ..services.inference import LocalSentimentBackend
+    backend = LocalSentimentBackend()
+    texts = _news_texts(64)
+    return lambda: [backend.predict([text]) for text in texts]
+
+
+@benchmark('inference.sentiment[local, x64 micro-batched]')
+def bench_inference_batched():
+    from ..services.inference import InferenceService, LocalSentimentBackend
+    # Cache désactivé : seul le gain du regroupement en lots est mesuré
+    service = InferenceService({'sentiment': LocalSentimentBackend()}, max_batch_size=32, max_wait_ms=2,
+                               cache_size=0)
+    texts = _news_texts(64)
+    return lambda: service.sentiment(texts)
+
+
+def _client():
+    from ..main import app
+    return app.test_client()
+
+
+def _get(client, url, headers=None):
+    def op():
+        response = client.get(url, headers=headers)
+        assert response.status_code == 200, f"{url} -> {response.status_code}"
+        return response.data
+    return op
+
+
+@benchmark('routes.stocks.history')
+def bench_route_stock_history():
+    return _get(_client(), f"/api/stocks/history/{active_store().isins[0]}")
+
+
+@benchmark('routes.stocks.history_window[json]')
+def bench_route_history_window_json():
+    return _get(_client(), f"/api/stocks/{active_store().isins[0]}/history?period=all")
+
+
+@benchmark('routes.stocks.history_window[columnar]')
+def bench_route_history_window_columnar():
+    from ..services.columnar import MIMETYPE
+    return _get(_client(), f"/api/stocks/{active_store().isins[0]}/history?period=all", {'Accept': MIMETYPE})
+
+
+def _history_window():
+    from ..services.history_store import StockHistory
+    isin = active_store().isins[0]
+    return StockHistory.from_payload(isin, active_store().json(f'history/{isin}'))
+
+
+@benchmark('wire.history[json]')
+def bench_wire_history_json():
+    import json
+    history = _history_window()
+    # Conversions en listes mémorisées comme sur la route : seule la sérialisation est mesurée
+    history.rows()
+    return lambda: json.dumps(history.select('all')).encode('utf-8')
+
+
+@benchmark('wire.history[columnar]')
+def bench_wire_history_columnar():
+    from ..services.columnar import encode
+    history = _history_window()
+    history.wire_columns()
+
+    def op():
+        selection = history.select('all', columnar=True)
+        return encode(selection.pop('columns'), selection)
+    return op
+
+
+@benchmark('routes.stocks.ticker')
+def bench_route_stock_by_ticker():
+    return _get(_client(), f"/api/stocks/{active_store().tickers[0]}")
+
+
+@benchmark('routes.dataCharts.history')
+def bench_route_datacharts_history():
+    from ..benchmarks.fixtures import url_to_key
+    data = active_store().json(url_to_key('https://data.irbe7.com/api/data'))
+    return _get(_client(), f"/api/dataCharts/history/{data[0]['referentiel']['ticker']}")
+
+
+@benchmark('routes.stocks.market_summary')
+def bench_route_market_summary():
+    return _get(_client(), '/api/stocks/market-summary')
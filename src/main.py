@@ -11,6 +11,11 @@ from .routes.stocks import stocks_bp
 from .routes.indices import indices_bp
 from .routes.dataCharts import dataCharts_bp
 from .routes.ai_analysis import ai_analysis_bp
+from .routes.analytics import analytics_bp
+from .routes.portfolio import portfolio_bp
+from .routes.ai import ai_bp
+from .services import cache, metrics, rate_limiter, tracing
+from .services.bvmt_service import get_bvmt_base_url, get_irbe7_base_url
 
 
 import requests
@@ -32,6 +37,15 @@ app.register_blueprint(stocks_bp, url_prefix='/api/stocks')
 app.register_blueprint(indices_bp, url_prefix='/api/indices')
 app.register_blueprint(dataCharts_bp, url_prefix='/api/dataCharts')
 app.register_blueprint(ai_analysis_bp, url_prefix='/api/ai-analysis')
+app.register_blueprint(analytics_bp, url_prefix='/api/analytics')
+app.register_blueprint(portfolio_bp, url_prefix='/api/portfolio')
+app.register_blueprint(ai_bp, url_prefix='/api/ai')
+
+# Métriques Prometheus (latences par endpoint, appels amont, caches) exposées sur /metrics
+metrics.init_app(app)
+
+# Traçage par requête (en-tête Server-Timing, requêtes lentes, profilage à la demande)
+tracing.init_app(app)
 
 
 
@@ -49,17 +63,31 @@ def after_request(response):
 def get_bvmt_market():
     """Proxy pour l'API BVMT"""
     try:
-        response = requests.get('https://bvmt.com.tn/rest_api/rest/market/qtys')
+        with rate_limiter.limited('bvmt'), metrics.upstream_call('bvmt:market/qtys') as call:
+            response = requests.get(f'{get_bvmt_base_url()}/market/qtys')
+            if not response.ok:
+                call.outcome = 'http_error'
         return jsonify(response.json())
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/status/caches', methods=['GET'])
+def get_cache_status():
+    """Occupation mémoire, taux de succès et évictions des caches du worker qui répond"""
+    try:
+        return jsonify({'success': True, 'data': cache.report()})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 @app.route('/dataCharts', methods=['GET'])
 def get_all_charts():
     """Route pour récupérer toutes les données des graphiques"""
     try:
         # Faire la requête vers l'API externe
-        response = requests.get('https://data.irbe7.com/dataCharts')
+        with metrics.upstream_call('irbe7:/dataCharts') as call:
+            response = requests.get(f'{get_irbe7_base_url()}/dataCharts')
+            if not response.ok:
+                call.outcome = 'http_error'
         if not response.ok:
             return jsonify({'error': 'Erreur lors de la récupération des données'}), 500
 
@@ -0,0 +1,86 @@
+"""
+Routes API pour l'analyse de texte (sentiment, résumé)
+"""
+from flask import Blueprint, jsonify, request
+import logging
+
+logger = logging.getLogger(__name__)
+
+ai_bp = Blueprint('ai', __name__)
+
+MAX_TEXTS = 64
+MAX_TEXT_LENGTH = 20000
+
+
+# Initialize service lazily (les modèles ne sont chargés qu'à la première requête)
+def get_ai_service():
+    from ..services.ai_service import AIService
+    return AIService()
+
+
+def _texts_from_body(data: dict):
+    texts = data.get('texts')
+    if texts is None and data.get('text') is not None:
+        texts = [data.get('text')]
+    if not isinstance(texts, list) or not texts or not all(isinstance(t, str) and t.strip() for t in texts):
+        return None, "Le champ 'text' ou 'texts' (liste de textes non vides) est requis"
+    if len(texts) > MAX_TEXTS:
+        return None, f"Au plus {MAX_TEXTS} textes par requête"
+    return [t[:MAX_TEXT_LENGTH] for t in texts], None
+
+
+@ai_bp.route('/analyze', methods=['POST'])
+def analyze_text():
+    """
+    Analyse un ou plusieurs textes : {"text": "..."} ou {"texts": [...]}, "analysis_type": sentiment|summary|full
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        texts, error = _texts_from_body(data)
+        if error:
+            return jsonify({'success': False, 'error': error}), 400
+        analysis_type = data.get('analysis_type', 'full')
+        if analysis_type not in ('sentiment', 'summary', 'full'):
+            return jsonify({'success': False, 'error': "analysis_type doit valoir sentiment, summary ou full"}), 400
+
+        ai_service = get_ai_service()
+        results = [{} for _ in texts]
+        if analysis_type in ('summary', 'full'):
+            for result, summary in zip(results, ai_service.summarize_many(texts)):
+                result['summary'] = summary
+        if analysis_type in ('sentiment', 'full'):
+            for result, sentiment in zip(results, ai_service.analyze_sentiments(texts)):
+                result['sentiment'] = sentiment
+
+        return jsonify({'success': True, 'data': results if 'texts' in data else results[0]})
+    except Exception as e:
+        logger.error(f"Erreur dans analyze_text: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@ai_bp.route('/summarize', methods=['POST'])
+def summarize():
+    """
+    Résume une liste de textes : {"texts": [...]}
+    """
+    try:
+        texts, error = _texts_from_body(request.get_json(silent=True) or {})
+        if error:
+            return jsonify({'success': False, 'error': error}), 400
+        return jsonify({'success': True, 'data': get_ai_service().summarize_many(texts)})
+    except Exception as e:
+        logger.error(f"Erreur dans summarize: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@ai_bp.route('/status', methods=['GET'])
+def get_status():
+    """
+    Backends chargés, taille moyenne des lots et efficacité du cache d'inférence
+    """
+    try:
+        from ..services.inference import get_inference_service
+        return jsonify({'success': True, 'data': get_inference_service().stats()})
+    except Exception as e:
+        logger.error(f"Erreur dans get_status: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
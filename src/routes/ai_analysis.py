@@ -5,14 +5,33 @@ from flask import Blueprint, jsonify, request
 import requests
 import logging
 
-from ..services.ai_analysis import AIStockAnalyzer
-
 logger = logging.getLogger(__name__)
 
 ai_analysis_bp = Blueprint('ai_analysis', __name__)
 
-# Initialiser l'analyseur IA
-analyzer = AIStockAnalyzer()
+_analyzer = None
+
+# Analyseur IA construit à la première requête (et non à l'import du module)
+def get_analyzer():
+    global _analyzer
+    if _analyzer is None:
+        from ..services.ai_analysis import AIStockAnalyzer
+        _analyzer = AIStockAnalyzer()
+    return _analyzer
+
+def get_session_stats_for(symbol):
+    """Statistiques de séance d'un ticker (None si l'action ou son historique est inconnu)"""
+    try:
+        from ..services.data_service import DataService
+        from ..services.volatility import get_session_stats
+
+        stock = DataService().get_stock_by_ticker(symbol)
+        if not stock or not stock.get('isin'):
+            return None
+        return get_session_stats().get(stock['isin'])
+    except Exception as e:
+        logger.error(f"Erreur lors de la récupération des statistiques de séance pour {symbol}: {e}")
+        return None
 
 @ai_analysis_bp.route('/analyze/<symbol>', methods=['POST'])
 def analyze_stock(symbol):
@@ -61,13 +80,19 @@ def analyze_stock(symbol):
 
         logger.info(f"Indicateurs reçus pour {symbol}: RSI={indicators.get('rsi')}, MACD={indicators.get('macd')}")
 
+        # ATR, volatilité et volumes réels issus de l'historique local (calculés une fois par séance)
+        session_stats = get_session_stats_for(symbol) or {}
+        recent_volume = recent_volume or session_stats.get('volume') or 0
+        avg_volume = avg_volume or session_stats.get('avg_volume_20') or 0
+
         # Analyser avec l'IA (indicateurs déjà calculés en JS)
-        # Calculer les volumes nécessaires
         current_volume = recent_volume  # Volume récent comme volume actuel
-        previous_volume = avg_volume * 0.95  # Estimation du volume précédent
+        previous_volume = session_stats.get('previous_volume')
+        if previous_volume is None:
+            previous_volume = avg_volume * 0.95  # Estimation faute d'historique
         volume_trend = "hausse" if recent_volume > avg_volume else "baisse" if recent_volume < avg_volume * 0.9 else "stable"
 
-        analysis_result = analyzer.analyze_stock_with_indicators(
+        analysis_result = get_analyzer().analyze_stock_with_indicators(
             indicators=indicators,
             current_price=current_price,
             support=support,
@@ -75,7 +100,8 @@ def analyze_stock(symbol):
             current_volume=current_volume,
             previous_volume=previous_volume,
             avg_volume_20=avg_volume,
-            volume_trend=volume_trend
+            volume_trend=volume_trend,
+            session_stats=session_stats
         )
 
         if not analysis_result.get('success'):
@@ -112,7 +138,7 @@ def get_available_stocks():
         data_service = DataService()
 
         # Récupérer toutes les actions
-        stocks = data_service.get_all_stocks()
+        stocks = data_service.snapshot()
 
         # Formater les données pour le frontend
         formatted_stocks = []
@@ -143,3 +169,56 @@ def get_available_stocks():
             'success': False,
             'error': str(e)
         }), 500
+
+
+@ai_analysis_bp.route('/backtest', methods=['GET'])
+def get_backtest_results():
+    """
+    Retourne les derniers résultats enregistrés du backtest des règles de l'analyseur sur tout le marché
+    (calculés par python -m src.scripts.backtest_signals, jamais dans la requête)
+
+    Paramètres:
+        horizon: nombre de séances pour évaluer chaque signal (défaut 5)
+        rsi: "true" pour utiliser un RSI(14) réel au lieu de la valeur envoyée par le frontend
+        details: "true" pour inclure les résultats par valeur
+    """
+    try:
+        from ..services.backtest import get_backtest_results as load_results
+
+        horizon = int(request.args.get('horizon', 5))
+        if horizon < 1 or horizon > 60:
+            return jsonify({
+                'success': False,
+                'error': 'Le paramètre horizon doit être compris entre 1 et 60'
+            }), 400
+
+        use_rsi = request.args.get('rsi', 'false').lower() == 'true'
+        details = request.args.get('details', 'false').lower() == 'true'
+
+        report = load_results(horizon=horizon, use_rsi=use_rsi)
+        if report is None:
+            return jsonify({
+                'success': False,
+                'error': f"Aucun résultat de backtest pour horizon={horizon}"
+                         f"{' avec RSI' if use_rsi else ''} : lancer python -m src.scripts.backtest_signals "
+                         f"--horizon {horizon}{' --rsi' if use_rsi else ''}"
+            }), 404
+        if not details:
+            report = {k: v for k, v in report.items() if k != 'per_symbol'}
+
+        return jsonify({
+            'success': True,
+            'data': report
+        })
+
+    except ValueError:
+        return jsonify({
+            'success': False,
+            'error': 'Paramètre horizon invalide'
+        }), 400
+    except Exception as e:
+        logger.error(f"Erreur lors de la récupération du backtest: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
@@ -0,0 +1,73 @@
+"""
+Routes API pour les analyses transversales (corrélations, covariances)
+"""
+from flask import Blueprint, jsonify, request
+import logging
+
+logger = logging.getLogger(__name__)
+
+analytics_bp = Blueprint('analytics', __name__)
+
+# Initialize services lazily to avoid loading NumPy at import time
+def get_correlation_engine():
+    from ..services.analytics import get_correlation_engine
+    return get_correlation_engine()
+
+@analytics_bp.route('/correlation', methods=['GET'])
+def get_correlation():
+    """
+    Retourne les matrices de corrélation et de covariance des rendements quotidiens
+
+    Paramètres:
+        window: nombre de séances de la fenêtre glissante (défaut 60)
+        tickers: liste de tickers séparés par des virgules (défaut: tout le marché)
+        matrix: correlation, covariance ou both (défaut both)
+    """
+    try:
+        window = int(request.args.get('window', 60))
+        if window < 2 or window > 2000:
+            return jsonify({
+                'success': False,
+                'error': 'Le paramètre window doit être compris entre 2 et 2000'
+            }), 400
+
+        matrix = request.args.get('matrix', 'both').lower()
+        if matrix not in ('correlation', 'covariance', 'both'):
+            return jsonify({
+                'success': False,
+                'error': 'Le paramètre matrix doit valoir correlation, covariance ou both'
+            }), 400
+
+        tickers = [t.strip() for t in request.args.get('tickers', '').split(',') if t.strip()]
+
+        engine = get_correlation_engine()
+        result = engine.get_matrices(window=window, tickers=tickers or None, matrix=matrix)
+
+        if not result:
+            return jsonify({
+                'success': False,
+                'error': 'Historiques indisponibles pour le calcul des corrélations'
+            }), 500
+
+        if tickers and not result['tickers']:
+            return jsonify({
+                'success': False,
+                'error': f"Aucun ticker reconnu: {', '.join(result['unknown_tickers'])}"
+            }), 404
+
+        return jsonify({
+            'success': True,
+            'data': result
+        })
+
+    except ValueError:
+        return jsonify({
+            'success': False,
+            'error': 'Paramètre window invalide'
+        }), 400
+    except Exception as e:
+        logger.error(f"Erreur dans get_correlation: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
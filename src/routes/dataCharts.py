@@ -7,15 +7,39 @@ import logging
 import json
 import time
 
+from ..services import metrics, warm_start
+from ..services.bvmt_service import get_irbe7_base_url
+
 logger = logging.getLogger(__name__)
 
 dataCharts_bp = Blueprint('dataCharts', __name__)
 
+
+def _fetch_stock_names():
+    """Correspondance ticker -> stockName (l'API history d'irbe7 attend le stockName)"""
+    with metrics.upstream_call('irbe7:/api/data') as call:
+        response = requests.get(f'{get_irbe7_base_url()}/api/data', timeout=30)
+        if not response.ok:
+            call.outcome = 'http_error'
+            return None
+    names = {}
+    for item in response.json():
+        ref = item.get('referentiel') or {}
+        if ref.get('ticker') and ref.get('stockName'):
+            names[ref['ticker']] = ref['stockName']
+    return names or None
+
+
+stock_names = warm_start.register('stock_names', _fetch_stock_names, ttl=6 * 3600, max_stale=7 * 24 * 3600)
+
 @dataCharts_bp.route('/stocks', methods=['GET'])
 def get_stocks_list():
     """Récupère la liste des actions disponibles depuis l'API data"""
     try:
-        response = requests.get('https://data.irbe7.com/api/data', timeout=30)
+        with metrics.upstream_call('irbe7:/api/data') as call:
+            response = requests.get(f'{get_irbe7_base_url()}/api/data', timeout=30)
+            if not response.ok:
+                call.outcome = 'http_error'
         if response.ok:
             data = response.json()
             stocks = []
@@ -56,22 +80,18 @@ def get_stocks_list():
 def get_chart_history(symbol):
     """Récupère les données historiques pour un symbole en utilisant le stockName"""
     try:
-        # D'abord récupérer la liste des actions pour trouver le stockName
-        response = requests.get('https://data.irbe7.com/api/data', timeout=30)
-        if not response.ok:
+        # Le stockName est lu dans la correspondance ticker -> stockName partagée (démarrage à chaud)
+        names = stock_names.get()
+        if names is None:
             return jsonify({
                 'success': False,
-                'error': f'Erreur lors de la récupération de la liste. Status: {response.status_code}'
+                'error': 'Erreur lors de la récupération de la liste des actions'
             }), 500
 
-        data = response.json()
-
-        # Trouver le stockName correspondant au ticker
-        stock_name = None
-        for item in data:
-            if item.get('referentiel') and item['referentiel'].get('ticker') == symbol:
-                stock_name = item['referentiel'].get('stockName')
-                break
+        stock_name = names.get(symbol)
+        if not stock_name and stock_names.age() > 60:
+            # Ticker inconnu : la liste a peut-être changé depuis le dernier chargement
+            stock_name = (stock_names.refresh() or {}).get(symbol)
 
         if not stock_name:
             return jsonify({
@@ -93,7 +113,7 @@ def get_chart_history(symbol):
         from_timestamp = int(from_date.timestamp())
 
         # Utiliser le stockName dans l'URL de l'API history
-        history_url = f'https://data.irbe7.com/api/data/history'
+        history_url = f'{get_irbe7_base_url()}/api/data/history'
         params = {
             'symbol': stock_name,
             'resolution': '1D',
@@ -104,7 +124,10 @@ def get_chart_history(symbol):
 
         logger.info(f"Requête historique pour {stock_name} de {from_date.strftime('%Y-%m-%d')} à aujourd'hui")
 
-        history_response = requests.get(history_url, params=params, timeout=30)
+        with metrics.upstream_call('irbe7:/api/data/history') as call:
+            history_response = requests.get(history_url, params=params, timeout=30)
+            if not history_response.ok:
+                call.outcome = 'http_error'
 
         if history_response.ok:
             history_data = history_response.json()
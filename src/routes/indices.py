@@ -1,7 +1,7 @@
 """
 Routes API pour les indices boursiers (TUNINDEX, TUNINDEX20, etc.)
 """
-from flask import Blueprint, jsonify
+from flask import Blueprint, jsonify, request
 import logging
 
 logger = logging.getLogger(__name__)
@@ -115,4 +115,70 @@ def get_tunindex20():
         }), 500
 
 
+def _index_series_response(kind: str, isin: str):
+    from ..services import columnar
+    from ..services.bvmt_service import is_isin
+    from ..services.index_series import MAX_POINTS, get_index_series_store
 
+    if not is_isin(isin):
+        return jsonify({'success': False, 'error': f'ISIN invalide: {isin}'}), 400
+    try:
+        points = int(request.args.get('points', 500))
+    except ValueError:
+        return jsonify({'success': False, 'error': 'Paramètre points invalide'}), 400
+    points = max(2, min(points, MAX_POINTS))
+
+    store = get_index_series_store()
+    series = store.history(isin) if kind == 'history' else store.intraday(isin)
+    if series is None or not len(series):
+        return jsonify({
+            'success': False,
+            'error': f'Aucune donnée {kind} pour l\'indice {isin}'
+        }), 404
+    binary = columnar.wants_columnar(request)
+    try:
+        data = series.render(points, request.args.get('period') if kind == 'history' else None, columnar=binary)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    if binary:
+        return columnar.response(data)
+    response = jsonify({'success': True, 'data': data})
+    response.headers['Vary'] = 'Accept'
+    return response
+
+@indices_bp.route('/history/<isin>', methods=['GET'])
+def get_index_history(isin):
+    """
+    Historique des séances d'un indice (cache partagé, réduit pour l'affichage)
+
+    Paramètres:
+        period: 1w, 1m, 3m, 6m, 1y, 2y, 3y, 5y, 10y, ytd ou all (défaut)
+        points: nombre maximal de points (2 à 2000, défaut 500)
+        format: json (défaut) ou columnar, également négociable par Accept: application/vnd.atlas.columnar
+    """
+    try:
+        return _index_series_response('history', isin)
+    except Exception as e:
+        logger.error(f"Erreur dans get_index_history: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@indices_bp.route('/intraday/<isin>', methods=['GET'])
+def get_index_intraday(isin):
+    """
+    Points intraday de la séance d'un indice (cache partagé, réduit pour l'affichage)
+
+    Paramètres:
+        points: nombre maximal de points (2 à 2000, défaut 500)
+        format: json (défaut) ou columnar, également négociable par Accept: application/vnd.atlas.columnar
+    """
+    try:
+        return _index_series_response('intraday', isin)
+    except Exception as e:
+        logger.error(f"Erreur dans get_index_intraday: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
@@ -0,0 +1,93 @@
+"""
+Routes API pour la valorisation et le risque de portefeuilles
+"""
+from flask import Blueprint, jsonify, request
+import logging
+
+logger = logging.getLogger(__name__)
+
+portfolio_bp = Blueprint('portfolio', __name__)
+
+MAX_POSITIONS = 50000
+
+# Initialize services lazily to avoid loading NumPy at import time
+def get_portfolio_engine():
+    from ..services.portfolio import PortfolioEngine
+    return PortfolioEngine()
+
+def get_data_service():
+    from ..services.data_service import DataService
+    return DataService()
+
+@portfolio_bp.route('/evaluate', methods=['POST'])
+def evaluate_portfolios():
+    """
+    Valorise un ou plusieurs portefeuilles contre l'instantané courant du marché
+
+    Body JSON: {
+        "portfolios": [{"id": "p1", "positions": [{"ticker": "BIAT", "qty": 100, "cost": 95.5}]}],
+        "window": 250,
+        "confidence": 0.95
+    }
+    Un portefeuille unique peut aussi être envoyé directement: {"positions": [...]}
+    """
+    try:
+        data = request.get_json(silent=True)
+
+        if not data:
+            return jsonify({
+                'success': False,
+                'error': 'Aucune donnée fournie'
+            }), 400
+
+        portfolios = data.get('portfolios')
+        if portfolios is None and 'positions' in data:
+            portfolios = [{'id': data.get('id', 0), 'positions': data['positions']}]
+
+        if not isinstance(portfolios, list) or not portfolios or \
+                not all(isinstance(p, dict) and isinstance(p.get('positions', []), list) for p in portfolios):
+            return jsonify({
+                'success': False,
+                'error': 'Format invalide: liste "portfolios" de {"positions": [...]} attendue'
+            }), 400
+
+        n_positions = sum(len(p.get('positions') or []) for p in portfolios)
+        if n_positions > MAX_POSITIONS:
+            return jsonify({
+                'success': False,
+                'error': f'Trop de positions ({n_positions}), maximum {MAX_POSITIONS}'
+            }), 400
+
+        window = int(data.get('window', 250))
+        confidence = float(data.get('confidence', 0.95))
+        if window < 2 or not 0.5 <= confidence < 1:
+            return jsonify({
+                'success': False,
+                'error': 'Paramètres window (>= 2) ou confidence ([0.5, 1[) invalides'
+            }), 400
+
+        stocks = get_data_service().get_all_stocks()
+        if not stocks:
+            return jsonify({
+                'success': False,
+                'error': 'Impossible de récupérer les cours du marché'
+            }), 500
+
+        results = get_portfolio_engine().evaluate(portfolios, stocks, window=window, confidence=confidence)
+
+        return jsonify({
+            'success': True,
+            'data': results
+        })
+
+    except (TypeError, ValueError) as e:
+        return jsonify({
+            'success': False,
+            'error': f'Paramètres invalides: {e}'
+        }), 400
+    except Exception as e:
+        logger.error(f"Erreur dans evaluate_portfolios: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
@@ -1,6 +1,7 @@
 """
 Routes API pour les actions (stocks)
 """
+
 from flask import Blueprint, jsonify, request
 import logging
 
@@ -17,37 +18,95 @@ def get_bvmt_service():
     from ..services.bvmt_service import BVMTService
     return BVMTService()
 
+def _as_of():
+    """
+    Paramètre as_of de la requête en secondes epoch (None s'il est absent, ValueError s'il est illisible)
+    """
+    raw = request.args.get('as_of')
+    if not raw:
+        return None
+    from ..services.snapshot_history import parse_as_of
+    return parse_as_of(raw)
+
 @stocks_bp.route('/', methods=['GET'])
 def get_stocks():
     """
-    Récupère la liste des actions avec pagination
+    Récupère la liste des actions, triée et filtrée, avec pagination par curseur (ou par page)
+
+    Paramètres:
+        sort: colonne de tri (ticker par défaut, last_price, change_percent, volume, market_cap, ...)
+        order: asc (défaut) ou desc
+        limit: taille de page (max 100, défaut 20)
+        cursor: valeur next_cursor de la page précédente
+        page: numéro de page, si aucun curseur n'est fourni
+        search, val_group, trading_status, status, min_<champ>, max_<champ>: filtres
+        as_of: date-heure (ISO, HH:MM ou timestamp) du snapshot à interroger, dans la fenêtre de rétention
     """
     try:
+        from ..services.stock_index import DEFAULT_SORT, parse_filters
+
         data_service = get_data_service()
-        page = int(request.args.get('page', 1))
-        limit = min(int(request.args.get('limit', 20)), 100)  # Max 100 par page
-        search = request.args.get('search', '')
+        try:
+            page = int(request.args.get('page', 1))
+            limit = max(1, min(int(request.args.get('limit', 20)), 100))  # Max 100 par page
+            result = data_service.query_stocks(
+                sort=request.args.get('sort', DEFAULT_SORT),
+                order=request.args.get('order', 'asc').lower(),
+                limit=limit,
+                cursor=request.args.get('cursor') or None,
+                page=page,
+                filters=parse_filters(request.args),
+                as_of=_as_of()
+            )
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        except LookupError as e:
+            return jsonify({'success': False, 'error': str(e)}), 404
 
-        if search:
-            stocks = data_service.search_stocks(search, limit)
-            total = len(stocks)
-        else:
-            all_stocks = data_service.get_all_stocks()
-            total = len(all_stocks)
-            skip = (page - 1) * limit
-            stocks = all_stocks[skip:skip+limit]
+        response = {
+            'success': True,
+            'data': result['data'],
+            'pagination': result['pagination']
+        }
+        if 'snapshot_at' in result:
+            response['snapshot_at'] = result['snapshot_at']
+        return jsonify(response)
+    except Exception as e:
+        logger.error(f"Erreur dans get_stocks: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@stocks_bp.route('/batch', methods=['GET'])
+def get_stocks_batch():
+    """
+    Récupère plusieurs actions en une requête (liste de suivi)
+
+    Paramètres:
+        tickers: tickers séparés par des virgules (max 50)
+        include: history et/ou intraday, séparés par des virgules
+    """
+    try:
+        tickers = [t for t in request.args.get('tickers', '').split(',') if t.strip()]
+        include = {i.strip().lower() for i in request.args.get('include', '').split(',') if i.strip()}
+        if not tickers:
+            return jsonify({'success': False, 'error': 'Paramètre tickers requis'}), 400
+        if len(tickers) > 50:
+            return jsonify({'success': False, 'error': 'Au plus 50 tickers par requête'}), 400
+        unknown = include - {'history', 'intraday'}
+        if unknown:
+            return jsonify({
+                'success': False,
+                'error': f"Valeurs include non supportées: {', '.join(sorted(unknown))} (history, intraday)"
+            }), 400
 
+        result = get_data_service().get_stocks_batch(tickers, include)
         return jsonify({
             'success': True,
-            'data': stocks,
-            'pagination': {
-                'page': page,
-                'limit': limit,
-                'total': total
-            }
+            'data': result['stocks'],
+            'not_found': result['not_found'],
+            'deferred': result['deferred']
         })
     except Exception as e:
-        logger.error(f"Erreur dans get_stocks: {e}")
+        logger.error(f"Erreur dans get_stocks_batch: {e}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @stocks_bp.route('/<ticker>', methods=['GET'])
@@ -83,9 +142,13 @@ def get_stock_by_ticker(ticker):
             result['data']['history'] = history
 
         if include_intraday and stock.get('isin'):
-            bvmt_service = get_bvmt_service()
-            intraday = bvmt_service.get_stock_intraday(stock['isin'])
-            result['data']['intraday'] = intraday
+            from ..services.intraday import get_intraday_store
+            buffer = get_intraday_store().get(stock['isin'])
+            if buffer is not None:
+                with buffer.lock:
+                    result['data']['intraday'] = {**buffer.summary(), 'intradays': buffer.point_list()}
+            else:
+                result['data']['intraday'] = None
 
         return jsonify(result)
 
@@ -100,10 +163,18 @@ def get_stock_by_ticker(ticker):
 def get_market_summary():
     """
     Récupère un résumé du marché
+
+    Paramètres:
+        as_of: date-heure (ISO, HH:MM ou timestamp) du snapshot à résumer, dans la fenêtre de rétention
     """
     try:
         data_service = get_data_service()
-        summary = data_service.get_market_summary()
+        try:
+            summary = data_service.get_market_summary(as_of=_as_of())
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        except LookupError as e:
+            return jsonify({'success': False, 'error': str(e)}), 404
 
         # Convertir ObjectId en string pour tous les stocks
         for category in ['top_gainers', 'top_losers', 'most_active']:
@@ -124,6 +195,96 @@ def get_market_summary():
             'error': str(e)
         }), 500
 
+@stocks_bp.route('/breadth', methods=['GET'])
+def get_market_breadth():
+    """
+    Récupère les hausses/baisses/inchangées, volumes et capitalisations par groupe de cotation
+    """
+    try:
+        data_service = get_data_service()
+        breadth = data_service.get_market_breadth()
+
+        if not breadth:
+            return jsonify({
+                'success': False,
+                'error': 'Impossible de calculer les agrégats du marché'
+            }), 500
+
+        return jsonify({
+            'success': True,
+            'data': breadth
+        })
+
+    except Exception as e:
+        logger.error(f"Erreur dans get_market_breadth: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@stocks_bp.route('/anomalies', methods=['GET'])
+def get_anomalies():
+    """
+    Récupère les dernières anomalies de volume et de cours (z-scores extrêmes)
+
+    Paramètres:
+        type: "volume" ou "price" (défaut: les deux)
+        since: numéro de séquence de la dernière anomalie déjà reçue
+        limit: nombre maximal d'anomalies (défaut 50, max 500)
+    """
+    try:
+        anomaly_type = request.args.get('type')
+        if anomaly_type not in (None, 'volume', 'price'):
+            return jsonify({
+                'success': False,
+                'error': 'Le paramètre type doit valoir volume ou price'
+            }), 400
+        since = int(request.args.get('since', 0))
+        limit = min(int(request.args.get('limit', 50)), 500)
+
+        anomalies = get_data_service().get_anomalies(since, anomaly_type, limit)
+        if not anomalies:
+            return jsonify({
+                'success': False,
+                'error': 'Impossible de récupérer les anomalies'
+            }), 500
+
+        return jsonify({
+            'success': True,
+            'data': anomalies
+        })
+
+    except ValueError:
+        return jsonify({
+            'success': False,
+            'error': 'Paramètres since/limit invalides'
+        }), 400
+    except Exception as e:
+        logger.error(f"Erreur dans get_anomalies: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@stocks_bp.route('/snapshots', methods=['GET'])
+def get_snapshot_history():
+    """
+    Versions d'instantanés conservées pour les requêtes as_of (plus ancienne, plus récente, mémoire estimée)
+    """
+    try:
+        from ..services.snapshot_history import get_snapshot_history as snapshot_history
+        get_data_service().snapshot()
+        return jsonify({
+            'success': True,
+            'data': snapshot_history().stats()
+        })
+    except Exception as e:
+        logger.error(f"Erreur dans get_snapshot_history: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
 @stocks_bp.route('/update', methods=['POST'])
 def update_stocks_data():
     """
@@ -174,8 +335,26 @@ def search_stocks():
 def get_market_rises():
     """
     Récupère les hausses du marché depuis l'API BVMT
+
+    Paramètres:
+        as_of: date-heure (ISO, HH:MM ou timestamp) ; les hausses sont alors calculées sur le snapshot en vigueur
     """
     try:
+        try:
+            as_of = _as_of()
+            if as_of is not None:
+                from ..services.snapshot_history import iso_utc
+                snapshot_at, movers = get_data_service().get_market_movers('rises', as_of)
+                return jsonify({
+                    'success': True,
+                    'data': movers,
+                    'snapshot_at': iso_utc(snapshot_at)
+                })
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        except LookupError as e:
+            return jsonify({'success': False, 'error': str(e)}), 404
+
         bvmt_service = get_bvmt_service()
         rises_data = bvmt_service.get_market_rises()
         
@@ -185,17 +364,14 @@ def get_market_rises():
                 'error': 'Impossible de récupérer les données de hausses'
             }), 500
         
-        # Normaliser les données
-        normalized_data = []
-        if 'markets' in rises_data:
-            for stock in rises_data['markets']:
-                normalized_stock = bvmt_service.normalize_stock_data(stock)
-                if normalized_stock:
-                    normalized_data.append(normalized_stock)
+        from ..services.bvmt_service import stamped
+
+        # Normaliser les données (réutilisées tant que la réponse amont est inchangée)
+        normalized_data = bvmt_service.normalize_markets(rises_data, 'market/hausses')
         
         return jsonify({
             'success': True,
-            'data': normalized_data
+            'data': [stamped(row) for row in normalized_data]
         })
         
     except Exception as e:
@@ -209,8 +385,26 @@ def get_market_rises():
 def get_market_falls():
     """
     Récupère les baisses du marché depuis l'API BVMT
+
+    Paramètres:
+        as_of: date-heure (ISO, HH:MM ou timestamp) ; les baisses sont alors calculées sur le snapshot en vigueur
     """
     try:
+        try:
+            as_of = _as_of()
+            if as_of is not None:
+                from ..services.snapshot_history import iso_utc
+                snapshot_at, movers = get_data_service().get_market_movers('falls', as_of)
+                return jsonify({
+                    'success': True,
+                    'data': movers,
+                    'snapshot_at': iso_utc(snapshot_at)
+                })
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        except LookupError as e:
+            return jsonify({'success': False, 'error': str(e)}), 404
+
         bvmt_service = get_bvmt_service()
         falls_data = bvmt_service.get_market_falls()
         
@@ -220,17 +414,14 @@ def get_market_falls():
                 'error': 'Impossible de récupérer les données de baisses'
             }), 500
         
-        # Normaliser les données
-        normalized_data = []
-        if 'markets' in falls_data:
-            for stock in falls_data['markets']:
-                normalized_stock = bvmt_service.normalize_stock_data(stock)
-                if normalized_stock:
-                    normalized_data.append(normalized_stock)
+        from ..services.bvmt_service import stamped
+
+        # Normaliser les données (réutilisées tant que la réponse amont est inchangée)
+        normalized_data = bvmt_service.normalize_markets(falls_data, 'market/baisses')
         
         return jsonify({
             'success': True,
-            'data': normalized_data
+            'data': [stamped(row) for row in normalized_data]
         })
         
     except Exception as e:
@@ -244,8 +435,26 @@ def get_market_falls():
 def get_market_volumes():
     """
     Récupère les volumes du marché depuis l'API BVMT
+
+    Paramètres:
+        as_of: date-heure (ISO, HH:MM ou timestamp) ; les volumes sont alors calculées sur le snapshot en vigueur
     """
     try:
+        try:
+            as_of = _as_of()
+            if as_of is not None:
+                from ..services.snapshot_history import iso_utc
+                snapshot_at, movers = get_data_service().get_market_movers('volumes', as_of)
+                return jsonify({
+                    'success': True,
+                    'data': movers,
+                    'snapshot_at': iso_utc(snapshot_at)
+                })
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        except LookupError as e:
+            return jsonify({'success': False, 'error': str(e)}), 404
+
         bvmt_service = get_bvmt_service()
         volumes_data = bvmt_service.get_market_volumes()
         
@@ -255,17 +464,14 @@ def get_market_volumes():
                 'error': 'Impossible de récupérer les données de volumes'
             }), 500
         
-        # Normaliser les données
-        normalized_data = []
-        if 'markets' in volumes_data:
-            for stock in volumes_data['markets']:
-                normalized_stock = bvmt_service.normalize_stock_data(stock)
-                if normalized_stock:
-                    normalized_data.append(normalized_stock)
+        from ..services.bvmt_service import stamped
+
+        # Normaliser les données (réutilisées tant que la réponse amont est inchangée)
+        normalized_data = bvmt_service.normalize_markets(volumes_data, 'market/volumes')
         
         return jsonify({
             'success': True,
-            'data': normalized_data
+            'data': [stamped(row) for row in normalized_data]
         })
         
     except Exception as e:
@@ -299,28 +505,101 @@ def get_stock_history(isin):
     try:
         data_service = get_data_service()
         history = data_service.get_stock_history(isin)
-        # Formatage des champs utiles pour le graphique
+        # Formatage des champs utiles pour le graphique (copies : la réponse amont est partagée)
         if 'history' in history:
-            for h in history['history']:
-                h['date'] = h.get('seance')
-                h['last'] = h.get('last')
-            return jsonify({'success': True, 'data': history['history']})
+            rows = [{**h, 'date': h.get('seance'), 'last': h.get('last')} for h in history['history']]
+            return jsonify({'success': True, 'data': rows})
         return jsonify({'success': True, 'data': history})
     except Exception as e:
         logger.error(f"Erreur dans get_stock_history: {e}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@stocks_bp.route('/<symbol>/history', methods=['GET'])
+def get_stock_history_window(symbol):
+    """
+    Historique des séances d'une action (ticker ou ISIN) limité à une fenêtre
+
+    Paramètres:
+        period: 1d, 1w, 1m, 3m, 6m, 1y, 2y, 3y, 5y, 10y, ytd ou all (défaut)
+        from, to: bornes incluses (AAAA-MM-JJ), prioritaires sur period
+        days: nombre de jours avant la dernière séance (ou avant to)
+        format: json (défaut) ou columnar, également négociable par Accept: application/vnd.atlas.columnar
+    """
+    try:
+        from ..services import columnar
+        from ..services.bvmt_service import is_isin
+
+        data_service = get_data_service()
+        binary = columnar.wants_columnar(request)
+        isin, ticker = symbol, None
+        if not is_isin(symbol):
+            stock = data_service.get_stock_by_ticker(symbol)
+            if not stock or not stock.get('isin'):
+                return jsonify({'success': False, 'error': f'Action {symbol} non trouvée'}), 404
+            isin, ticker = stock['isin'], stock.get('ticker')
+        try:
+            days = request.args.get('days')
+            result = data_service.get_stock_history_window(
+                isin,
+                period=request.args.get('period') or None,
+                date_from=request.args.get('from') or None,
+                date_to=request.args.get('to') or None,
+                days=int(days) if days else None,
+                columnar=binary
+            )
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        if result is None:
+            return jsonify({'success': False, 'error': f'Historique indisponible pour {symbol}'}), 404
+        if binary:
+            columns = result.pop('columns')
+            return columnar.response(columnar.encode(columns, {**result, 'ticker': ticker}))
+        response = jsonify({'success': True, 'data': {**result, 'ticker': ticker}})
+        response.headers['Vary'] = 'Accept'
+        return response
+    except Exception as e:
+        logger.error(f"Erreur dans get_stock_history_window: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 @stocks_bp.route('/intraday/<isin>', methods=['GET'])
-def proxy_intraday_bvmt(isin):
+def get_stock_intraday(isin):
     """
-    Proxy pour contourner le CORS et récupérer les données intraday BVMT pour un ISIN
+    Retourne les points intraday, les barres OHLC et le VWAP de la séance pour un ISIN
+
+    Paramètres:
+        interval: durée des barres en minutes (1, 5, 15, 30 ou 60, défaut 1)
+        points: "false" pour ne pas inclure les points bruts
     """
-    import requests
     try:
-        url = f'https://www.bvmt.com.tn/rest_api/rest/intraday/{isin}'
-        resp = requests.get(url, timeout=10)
-        return (resp.content, resp.status_code, {'Content-Type': resp.headers.get('Content-Type', 'application/json')})
+        from ..services.intraday import BAR_INTERVALS, get_intraday_store
+
+        interval = int(request.args.get('interval', 1))
+        if interval not in BAR_INTERVALS:
+            return jsonify({
+                'success': False,
+                'error': f"Le paramètre interval doit valoir {', '.join(map(str, BAR_INTERVALS))}"
+            }), 400
+        include_points = request.args.get('points', 'true').lower() == 'true'
+
+        buffer = get_intraday_store().get(isin)
+        if buffer is None:
+            return jsonify({
+                'success': False,
+                'error': f'Aucune donnée intraday pour {isin}'
+            }), 404
+
+        with buffer.lock:
+            data = buffer.summary()
+            data['interval'] = interval
+            data['bars'] = buffer.bar_list(interval)
+            if include_points:
+                data['intradays'] = buffer.point_list()
+
+        return jsonify({'success': True, 'data': data})
+    except ValueError:
+        return jsonify({'success': False, 'error': 'Paramètre interval invalide'}), 400
     except Exception as e:
+        logger.error(f"Erreur dans get_stock_intraday: {e}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @stocks_bp.route('/marketwatch', methods=['GET'])
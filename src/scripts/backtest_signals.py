@@ -0,0 +1,55 @@
+"""
+Script de backtest des règles de l'analyseur IA sur l'historique de toutes les valeurs
+
+Seuls les résultats sur tout le marché sont servis par /api/ai-analysis/backtest ; ce script (ou une tâche
+planifiée) est le seul à les recalculer.
+
+Usage:
+    python -m src.scripts.backtest_signals --horizon 5 --workers 4
+    python -m src.scripts.backtest_signals --isin TN0001100254 --isin TN0001800457 --rsi
+"""
+import argparse
+import json
+import logging
+import sys
+
+from ..services import rate_limiter
+from ..services.backtest import run_market_backtest, save_results
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Backtest des signaux de l'analyseur IA")
+    parser.add_argument('--horizon', type=int, default=5, help="Séances après le signal (défaut: 5)")
+    parser.add_argument('--workers', type=int, default=None, help="Taille du pool de processus (0 = sans pool)")
+    parser.add_argument('--isin', action='append', dest='isins', help="Restreindre à un ISIN (répétable)")
+    parser.add_argument('--rsi', action='store_true', help="Utiliser un RSI(14) réel au lieu de 50")
+    parser.add_argument('--output', default=None,
+                        help="Fichier de résultats JSON (défaut: backtests/, un fichier par horizon, RSI et univers)")
+    parser.add_argument('--details', action='store_true', help="Afficher les résultats par valeur")
+    args = parser.parse_args(argv)
+
+    # Récupération des historiques en priorité basse : les utilisateurs passent avant
+    with rate_limiter.priority('backfill'):
+        report = run_market_backtest(horizon=args.horizon, workers=args.workers,
+                                     use_rsi=args.rsi, isins=args.isins)
+    if not report.get('observations'):
+        logger.error("Aucun historique exploitable pour le backtest")
+        return 1
+
+    path = save_results(report, args.output)
+    logger.info(f"{report['symbols']} valeurs, {report['observations']} observations "
+                f"en {report['duration_seconds']}s -> {path}")
+
+    printed = report if args.details else {k: v for k, v in report.items() if k != 'per_symbol'}
+    print(json.dumps(printed, ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
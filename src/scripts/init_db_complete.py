@@ -16,6 +16,7 @@ load_dotenv()
 from src.database.mongodb import mongo_client, db, init_mongodb
 from src.services.data_service import DataService
 from src.services.bvmt_service import BVMTService
+from src.services import rate_limiter
 
 # Configuration du logging
 logging.basicConfig(level=logging.INFO)
@@ -82,4 +83,5 @@ def init_database():
     print("\n=== Initialisation terminée ===")
 
 if __name__ == "__main__":
-    init_database()
\ No newline at end of file
+    with rate_limiter.priority('backfill'):
+        init_database()
\ No newline at end of file
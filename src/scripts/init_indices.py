@@ -10,6 +10,7 @@ from datetime import datetime
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
 from dotenv import load_dotenv
+from ..services import rate_limiter
 from ..services.bvmt_service import BVMTService
 from ..database.mongodb import init_mongodb, get_collection
 
@@ -57,7 +58,8 @@ def init_indices_collection():
 
 if __name__ == "__main__":
     try:
-        init_indices_collection()
+        with rate_limiter.priority('backfill'):
+            init_indices_collection()
         logger.info("Script d'initialisation terminé avec succès")
     except Exception as e:
         logger.error(f"Erreur lors de l'exécution du script: {e}")
@@ -14,6 +14,8 @@ from dotenv import load_dotenv
 from pymongo import MongoClient
 import requests
 
+from src.services.rate_limiter import get_rate_limiter
+
 # Configuration du logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -46,6 +48,7 @@ def init_indices_manually():
 
         logger.info(f"Récupération des indices depuis {indices_url}")
 
+        get_rate_limiter('bvmt').acquire('backfill')
         response = requests.get(indices_url, timeout=10)
         response.raise_for_status()
         indices_data = response.json()
@@ -0,0 +1,202 @@
+"""
+Générateur de charge reproduisant les appels du frontend contre l'application déployée (gunicorn)
+
+Usage:
+    python -m src.scripts.load_test --target http://localhost:5000 --users 32 --duration 60
+    python -m src.scripts.load_test --mix dashboard --json rapport.json
+
+L'application visée interroge de préférence le serveur de substitution (src.scripts.upstream_standin) avec
+un RATE_LIMIT_DIR privé, pour ne pas vider le seau à jetons partagé des workers réels de la machine.
+
+Le rapport donne, par modèle de route, le débit (req/s), le taux d'erreurs et les percentiles de latence.
+"""
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+import requests
+
+# Appels effectués par les pages du frontend, avec leur poids relatif
+MIXES = {
+    'default': [
+        ('/api/stocks/marketwatch', 20),
+        ('/api/indices/', 15),
+        ('/api/stocks/market-summary', 10),
+        ('/api/stocks/?limit=500', 5),
+        ('/api/stocks/{ticker}', 10),
+        ('/api/stocks/intraday/{isin}', 10),
+        ('/api/stocks/history/{isin}', 8),
+        ('/api/stocks/orderbook/{isin}', 8),
+        ('/api/dataCharts/stocks', 4),
+        ('/api/dataCharts/history/{ticker}', 4),
+        ('/api/ai-analysis/stocks', 3),
+        ('POST /api/ai-analysis/analyze/{ticker}', 3),
+    ],
+    'dashboard': [
+        ('/api/stocks/marketwatch', 40),
+        ('/api/indices/', 30),
+        ('/api/stocks/market-summary', 30),
+    ],
+    'charts': [
+        ('/api/stocks/intraday/{isin}', 30),
+        ('/api/stocks/history/{isin}', 30),
+        ('/api/dataCharts/history/{ticker}', 20),
+        ('/api/stocks/orderbook/{isin}', 20),
+    ],
+}
+
+ANALYZE_BODY = {
+    'indicators': {'rsi': 50, 'macd': 0.1, 'macd_signal': 0.05, 'sma_20': 10, 'sma_50': 9.5, 'momentum': 0.3},
+    'current_price': 10.2, 'support': 9.1, 'resistance': 11.4, 'avg_volume': 12000, 'recent_volume': 15000
+}
+
+
+def _percentile(sorted_values: List[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * q
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+class LoadTest:
+    """
+    Utilisateurs virtuels en boucle fermée (une requête à la fois, avec temps de réflexion)
+    """
+
+    def __init__(self, target: str, mix: List[tuple], users: int, duration: float,
+                 think_ms: float = 0.0, timeout: float = 30.0, seed: Optional[int] = None):
+        self.target = target.rstrip('/')
+        self.mix = mix
+        self.users = users
+        self.duration = duration
+        self.think_ms = think_ms
+        self.timeout = timeout
+        self.seed = seed
+        self.tickers: List[str] = []
+        self.isins: List[str] = []
+        self._latencies: Dict[str, List[float]] = defaultdict(list)
+        self._errors: Dict[str, int] = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def discover(self) -> None:
+        """Récupère la liste des valeurs pour paramétrer les routes {ticker}/{isin}"""
+        response = requests.get(f"{self.target}/api/stocks/marketwatch", timeout=self.timeout)
+        response.raise_for_status()
+        stocks = response.json().get('data', [])
+        self.tickers = [s['ticker'] for s in stocks if s.get('ticker') not in (None, '-')]
+        self.isins = [s['isin'] for s in stocks if s.get('isin') not in (None, '-')]
+        if not self.tickers or not self.isins:
+            raise RuntimeError("Aucune valeur retournée par /api/stocks/marketwatch")
+
+    def _user(self, index: int, deadline: float) -> None:
+        rng = random.Random(None if self.seed is None else self.seed + index)
+        session = requests.Session()
+        routes = [r for r, _ in self.mix]
+        weights = [w for _, w in self.mix]
+        while time.monotonic() < deadline:
+            template = rng.choices(routes, weights)[0]
+            method, _, path = template.rpartition(' ')
+            url = self.target + path.format(ticker=rng.choice(self.tickers), isin=rng.choice(self.isins))
+            started = time.perf_counter()
+            try:
+                if method == 'POST':
+                    response = session.post(url, json=ANALYZE_BODY, timeout=self.timeout)
+                else:
+                    response = session.get(url, timeout=self.timeout)
+                ok = response.status_code < 500
+            except requests.exceptions.RequestException:
+                ok = False
+            elapsed = (time.perf_counter() - started) * 1000
+            with self._lock:
+                self._latencies[template].append(elapsed)
+                if not ok:
+                    self._errors[template] += 1
+            if self.think_ms:
+                time.sleep(rng.expovariate(1000.0 / self.think_ms))
+
+    def run(self) -> Dict:
+        self.discover()
+        started = time.monotonic()
+        deadline = started + self.duration
+        threads = [threading.Thread(target=self._user, args=(i, deadline), daemon=True) for i in range(self.users)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return self.report(time.monotonic() - started)
+
+    def report(self, elapsed: float) -> Dict:
+        routes = {}
+        total = errors = 0
+        for template, latencies in sorted(self._latencies.items()):
+            latencies.sort()
+            total += len(latencies)
+            errors += self._errors[template]
+            routes[template] = {
+                'requests': len(latencies),
+                'errors': self._errors[template],
+                'rps': round(len(latencies) / elapsed, 2),
+                'p50_ms': round(_percentile(latencies, 0.50), 1),
+                'p90_ms': round(_percentile(latencies, 0.90), 1),
+                'p99_ms': round(_percentile(latencies, 0.99), 1),
+                'max_ms': round(latencies[-1], 1)
+            }
+        return {
+            'target': self.target,
+            'users': self.users,
+            'duration_seconds': round(elapsed, 2),
+            'requests': total,
+            'errors': errors,
+            'rps': round(total / elapsed, 2) if elapsed else 0.0,
+            'routes': routes
+        }
+
+
+def format_report(report: Dict) -> str:
+    lines = [
+        f"{report['requests']} requêtes en {report['duration_seconds']}s "
+        f"({report['rps']} req/s, {report['users']} utilisateurs, {report['errors']} erreurs)",
+        f"{'route':<42}{'req':>7}{'err':>6}{'req/s':>9}{'p50 ms':>9}{'p90 ms':>9}{'p99 ms':>9}{'max ms':>9}"
+    ]
+    for template, r in report['routes'].items():
+        lines.append(f"{template:<42}{r['requests']:>7}{r['errors']:>6}{r['rps']:>9.1f}"
+                     f"{r['p50_ms']:>9.1f}{r['p90_ms']:>9.1f}{r['p99_ms']:>9.1f}{r['max_ms']:>9.1f}")
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Test de charge de bout en bout")
+    parser.add_argument('--target', default='http://localhost:5000', help="URL de l'application")
+    parser.add_argument('--mix', choices=sorted(MIXES), default='default', help="Répartition des appels")
+    parser.add_argument('--users', type=int, default=16, help="Utilisateurs virtuels concurrents")
+    parser.add_argument('--duration', type=float, default=30.0, help="Durée du test (s)")
+    parser.add_argument('--think-ms', type=float, default=0.0, help="Temps de réflexion moyen entre requêtes")
+    parser.add_argument('--timeout', type=float, default=30.0)
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--json', metavar='FICHIER', help="Écrire le rapport JSON dans ce fichier")
+    args = parser.parse_args(argv)
+
+    test = LoadTest(args.target, MIXES[args.mix], args.users, args.duration,
+                    think_ms=args.think_ms, timeout=args.timeout, seed=args.seed)
+    try:
+        report = test.run()
+    except (requests.exceptions.RequestException, RuntimeError) as e:
+        print(f"Impossible de démarrer le test de charge: {e}", file=sys.stderr)
+        return 1
+
+    print(format_report(report))
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,82 @@
+"""
+Rejeu accéléré d'une séance archivée (SESSION_ARCHIVE_DIR/session-AAAA-MM-JJ.jsonl.gz)
+
+Les archives sont écrites en fin de séance par le serveur WebSocket (src/websocket_server.py), qui interroge
+le marché toute la journée. Le rejeu republie snapshots, points intraday et carnets d'ordres par les chemins
+d'ingestion du direct : détecteur d'anomalies, agrégats, historique des snapshots et caches sont alimentés
+comme pendant la séance, sans appel à bvmt.com.tn.
+
+Usage:
+    python -m src.scripts.session_replay info archives/session-2025-09-26.jsonl.gz
+    python -m src.scripts.session_replay replay archives/session-2025-09-26.jsonl.gz --speed 60
+    python src/websocket_server.py --replay archives/session-2025-09-26.jsonl.gz --speed 60
+
+Le rapport de rejeu donne le nombre d'enregistrements republiés, la durée et le retard maximal sur
+l'horloge accélérée (un retard important indique que l'ingestion ne suit pas cette vitesse).
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+
+logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+
+def archive_info(path: str) -> dict:
+    from ..services.session_archive import read_archive
+
+    counts = {}
+    header = None
+    first = last = None
+    for record in read_archive(path):
+        if record['type'] == 'session':
+            header = record
+            continue
+        counts[record['type']] = counts.get(record['type'], 0) + 1
+        if 'ts' in record:
+            first = record['ts'] if first is None else first
+            last = record['ts']
+    return {'header': header, 'records': counts, 'bytes': os.path.getsize(path),
+            'duration_seconds': round(last - first, 1) if first is not None else 0}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m src.scripts.session_replay',
+                                     description="Archives de séance : description et rejeu accéléré")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    info_parser = sub.add_parser('info', help="Décrire une archive")
+    info_parser.add_argument('archive')
+
+    replay_parser = sub.add_parser('replay', help="Rejouer une archive dans ce processus")
+    replay_parser.add_argument('archive')
+    replay_parser.add_argument('--speed', type=float, default=60.0, help="Accélération (défaut 60x)")
+
+    args = parser.parse_args(argv)
+    if not os.path.isfile(args.archive):
+        print(f"Archive introuvable: {args.archive}", file=sys.stderr)
+        return 1
+
+    if args.command == 'info':
+        print(json.dumps(archive_info(args.archive), indent=2, ensure_ascii=False))
+        return 0
+
+    # Rejeu hors ligne : le limiteur de débit partagé n'a pas lieu d'être
+    os.environ.setdefault('RATE_LIMIT_ENABLED', 'false')
+    from ..services.anomalies import get_anomaly_detector
+    from ..services.session_archive import SessionReplayer
+    from ..services.snapshot_history import get_snapshot_history
+
+    stats = SessionReplayer(args.archive, speed=args.speed).run()
+    report = {
+        'replay': stats,
+        'anomalies': get_anomaly_detector().summary(limit=0)['last_seq'],
+        'snapshot_history': get_snapshot_history().stats()
+    }
+    print(json.dumps(report, indent=2, ensure_ascii=False, default=str))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,148 @@
+"""
+Rapport des temps d'import (python -X importtime) et budget de démarrage de src.main:app
+
+Usage:
+    python -m src.scripts.startup_time                     # modules les plus coûteux au démarrage
+    python -m src.scripts.startup_time --check             # code de sortie 1 si le budget est dépassé
+    python -m src.scripts.startup_time --check --budget-ms 1200 --runs 7
+
+Le contrôle échoue si le démarrage médian dépasse le budget (STARTUP_BUDGET_MS, 1000 ms par défaut)
+ou si un module lourd (torch, transformers, pandas, ...) est importé au démarrage.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from typing import Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Modules qui ne doivent être chargés qu'à la première utilisation
+HEAVY_MODULES = ('torch', 'transformers', 'pandas', 'sklearn', 'scipy', 'openai', 'matplotlib')
+
+
+def parse_importtime(stderr: str) -> List[Dict]:
+    """
+    Analyse la sortie de -X importtime : une entrée par module (temps propre et cumulé en µs)
+    """
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        parts = line[len('import time:'):].split('|')
+        if len(parts) != 3 or not parts[0].strip().isdigit():
+            continue  # ligne d'en-tête
+        name = parts[2].rstrip()
+        entries.append({
+            'module': name.strip(),
+            'depth': (len(name) - len(name.lstrip())) // 2,
+            'self_us': int(parts[0]),
+            'cumulative_us': int(parts[1])
+        })
+    return entries
+
+
+def import_profile(module: str) -> List[Dict]:
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=ROOT, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Import de {module} impossible:\n{result.stderr[-2000:]}")
+    return parse_importtime(result.stderr)
+
+
+def measure_startup(module: str, runs: int) -> List[float]:
+    """
+    Durée (ms) d'un interpréteur neuf qui importe le module, mesurée `runs` fois
+    """
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        subprocess.run([sys.executable, '-c', f'import {module}'], cwd=ROOT, check=True,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        timings.append((time.perf_counter() - started) * 1000)
+    return timings
+
+
+def by_package(entries: List[Dict]) -> Dict[str, int]:
+    """
+    Temps propre cumulé par paquet de premier niveau (µs)
+    """
+    totals: Dict[str, int] = {}
+    for e in entries:
+        package = e['module'].split('.')[0]
+        totals[package] = totals.get(package, 0) + e['self_us']
+    return dict(sorted(totals.items(), key=lambda item: item[1], reverse=True))
+
+
+def report(module: str, top: int) -> Dict:
+    entries = import_profile(module)
+    root = next((e for e in entries if e['module'] == module), None)
+    loaded = {e['module'].split('.')[0] for e in entries}
+    return {
+        'module': module,
+        'total_import_ms': round(root['cumulative_us'] / 1000, 1) if root else None,
+        'modules_imported': len(entries),
+        'heavy_modules_loaded': sorted(m for m in HEAVY_MODULES if m in loaded),
+        'top_cumulative': sorted(entries, key=lambda e: e['cumulative_us'], reverse=True)[:top],
+        'top_packages': dict(list(by_package(entries).items())[:top])
+    }
+
+
+def format_report(data: Dict) -> str:
+    lines = [f"Import de {data['module']}: {data['total_import_ms']} ms, {data['modules_imported']} modules"]
+    if data['heavy_modules_loaded']:
+        lines.append(f"Modules lourds chargés au démarrage: {', '.join(data['heavy_modules_loaded'])}")
+    lines.append(f"\n{'module':<60}{'cumulé ms':>12}{'propre ms':>12}")
+    for e in data['top_cumulative']:
+        lines.append(f"{e['module']:<60}{e['cumulative_us'] / 1000:>12.1f}{e['self_us'] / 1000:>12.1f}")
+    lines.append(f"\n{'paquet':<60}{'propre ms':>12}")
+    for package, us in data['top_packages'].items():
+        lines.append(f"{package:<60}{us / 1000:>12.1f}")
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Temps d'import et budget de démarrage")
+    parser.add_argument('--module', default='src.main', help="Module à importer (défaut: src.main)")
+    parser.add_argument('--top', type=int, default=25, help="Nombre de modules affichés")
+    parser.add_argument('--check', action='store_true', help="Vérifier le budget de démarrage")
+    parser.add_argument('--budget-ms', type=float, default=float(os.getenv('STARTUP_BUDGET_MS', 1000)))
+    parser.add_argument('--runs', type=int, default=5, help="Nombre de démarrages mesurés pour --check")
+    parser.add_argument('--json', metavar='FICHIER', help="Écrire le rapport JSON dans ce fichier")
+    args = parser.parse_args(argv)
+
+    try:
+        data = report(args.module, args.top)
+    except RuntimeError as e:
+        print(e, file=sys.stderr)
+        return 2
+    print(format_report(data))
+
+    status = 0
+    if args.check:
+        timings = measure_startup(args.module, args.runs)
+        data['startup_ms'] = [round(t, 1) for t in timings]
+        data['startup_median_ms'] = round(statistics.median(timings), 1)
+        data['budget_ms'] = args.budget_ms
+        print(f"\nDémarrage médian: {data['startup_median_ms']} ms sur {args.runs} essais (budget {args.budget_ms:.0f} ms)")
+        if data['startup_median_ms'] > args.budget_ms:
+            print("ÉCHEC: budget de démarrage dépassé", file=sys.stderr)
+            status = 1
+        if data['heavy_modules_loaded']:
+            print(f"ÉCHEC: modules lourds importés au démarrage: {', '.join(data['heavy_modules_loaded'])}",
+                  file=sys.stderr)
+            status = 1
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2)
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,4 +1,5 @@
 import os
+import sys
 import requests
 from datetime import datetime
 from pymongo import MongoClient, UpdateOne
@@ -6,6 +7,12 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from src.services.rate_limiter import get_rate_limiter
+
+# Débit partagé avec l'application (priorité la plus basse)
+rate_limiter = get_rate_limiter('bvmt')
+
 MONGODB_URI = os.getenv('MONGODB_URI', 'mongodb://localhost:27017/warren_ai')
 DB_NAME = MONGODB_URI.split('/')[-1].split('?')[0] if '/' in MONGODB_URI else 'warren_ai'
 
@@ -21,6 +28,7 @@ for stock in stocks:
         continue
     try:
         url = f'https://www.bvmt.com.tn/rest_api/rest/intraday/{isin}'
+        rate_limiter.acquire('backfill')
         resp = requests.get(url, timeout=10)
         if resp.status_code == 200:
             data = resp.json()
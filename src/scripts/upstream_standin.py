@@ -0,0 +1,154 @@
+"""
+Serveur de substitution local pour les API BVMT (rest_api/rest/*) et data.irbe7.com
+
+Sert les réponses enregistrées (src/benchmarks/fixtures, ou synthétiques à défaut) avec une
+latence, une gigue et un taux d'erreurs configurables, pour tester la charge sans solliciter bvmt.com.tn.
+
+Usage:
+    python -m src.scripts.upstream_standin --port 8900 --latency-ms 150 --jitter-ms 50 --error-rate 0.02
+
+Puis lancer l'application contre ce serveur:
+    BVMT_BASE_URL=http://localhost:8900/rest_api/rest IRBE7_BASE_URL=http://localhost:8900 \
+        gunicorn --workers 4 --bind 0.0.0.0:5000 src.main:app
+"""
+import argparse
+import logging
+import os
+import random
+import threading
+import time
+
+from flask import Flask, Response, jsonify, request
+
+from ..benchmarks.fixtures import FIXTURES_DIR, FixtureStore
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+
+class StandinConfig:
+    """
+    Paramètres de simulation (modifiables à chaud via /_standin/config)
+    """
+
+    def __init__(self, latency_ms: float = 0.0, jitter_ms: float = 0.0, error_rate: float = 0.0,
+                 timeout_rate: float = 0.0, timeout_s: float = 15.0, seed=None, etags: bool = True):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.timeout_rate = timeout_rate
+        self.timeout_s = timeout_s
+        self.etags = etags
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+
+    def draw(self) -> tuple:
+        """Tire la latence (s) et l'issue ('ok', 'error', 'timeout') d'une requête"""
+        with self._lock:
+            self.requests += 1
+            delay = max(0.0, self._random.gauss(self.latency_ms, self.jitter_ms) if self.jitter_ms else self.latency_ms)
+            roll = self._random.random()
+            if roll < self.timeout_rate:
+                outcome = 'timeout'
+            elif roll < self.timeout_rate + self.error_rate:
+                outcome = 'error'
+            else:
+                outcome = 'ok'
+            if outcome != 'ok':
+                self.errors += 1
+        return delay / 1000.0, outcome
+
+    def as_dict(self) -> dict:
+        return {
+            'latency_ms': self.latency_ms,
+            'jitter_ms': self.jitter_ms,
+            'error_rate': self.error_rate,
+            'timeout_rate': self.timeout_rate,
+            'timeout_s': self.timeout_s,
+            'etags': self.etags,
+            'requests': self.requests,
+            'errors': self.errors
+        }
+
+
+def create_app(store: FixtureStore, config: StandinConfig) -> Flask:
+    app = Flask(__name__)
+
+    def serve(key: str):
+        delay, outcome = config.draw()
+        if outcome == 'timeout':
+            time.sleep(config.timeout_s)
+            return Response('', status=504)
+        time.sleep(delay)
+        if outcome == 'error':
+            return Response('{"error": "erreur simulée"}', status=503, mimetype='application/json')
+        body = store.body(key)
+        if body is None:
+            return Response('{"error": "ressource inconnue"}', status=404, mimetype='application/json')
+        response = Response(body, status=200, mimetype='application/json')
+        if config.etags:
+            # Validateur sur le contenu : les requêtes conditionnelles reçoivent 304 si rien n'a changé
+            response.add_etag()
+            return response.make_conditional(request)
+        return response
+
+    @app.route('/rest_api/rest/<path:endpoint>', methods=['GET'])
+    def bvmt(endpoint):
+        return serve(endpoint.strip('/'))
+
+    @app.route('/api/data', methods=['GET'])
+    def irbe7_data():
+        return serve('irbe7:/api/data')
+
+    @app.route('/api/data/history', methods=['GET'])
+    def irbe7_history():
+        return serve('irbe7:/api/data/history')
+
+    @app.route('/dataCharts', methods=['GET'])
+    def irbe7_charts():
+        return serve('irbe7:/dataCharts')
+
+    @app.route('/_standin/config', methods=['GET', 'POST'])
+    def standin_config():
+        if request.method == 'POST':
+            for key, value in (request.get_json(silent=True) or {}).items():
+                if key in ('latency_ms', 'jitter_ms', 'error_rate', 'timeout_rate', 'timeout_s'):
+                    setattr(config, key, float(value))
+        return jsonify(config.as_dict())
+
+    return app
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serveur de substitution BVMT / irbe7")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=int(os.getenv('STANDIN_PORT', 8900)))
+    parser.add_argument('--fixtures', default=FIXTURES_DIR, help="Répertoire des réponses enregistrées")
+    parser.add_argument('--latency-ms', type=float, default=float(os.getenv('STANDIN_LATENCY_MS', 120)))
+    parser.add_argument('--jitter-ms', type=float, default=float(os.getenv('STANDIN_JITTER_MS', 40)))
+    parser.add_argument('--error-rate', type=float, default=float(os.getenv('STANDIN_ERROR_RATE', 0.0)),
+                        help="Proportion de réponses 503")
+    parser.add_argument('--timeout-rate', type=float, default=float(os.getenv('STANDIN_TIMEOUT_RATE', 0.0)),
+                        help="Proportion de requêtes bloquées --timeout-s secondes puis 504")
+    parser.add_argument('--timeout-s', type=float, default=15.0)
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--no-etag', action='store_true', help="Ne pas envoyer d'ETag (pas de réponses 304)")
+    args = parser.parse_args(argv)
+
+    store = FixtureStore(args.fixtures)
+    config = StandinConfig(args.latency_ms, args.jitter_ms, args.error_rate, args.timeout_rate,
+                           args.timeout_s, args.seed, etags=not args.no_etag)
+    logger.info(f"Fixtures enregistrées: {store.recorded} (synthétiques pour le reste) - "
+                f"latence {args.latency_ms}±{args.jitter_ms} ms, erreurs {args.error_rate:.1%}, "
+                f"timeouts {args.timeout_rate:.1%}")
+    logger.info(f"BVMT_BASE_URL=http://{args.host}:{args.port}/rest_api/rest IRBE7_BASE_URL=http://{args.host}:{args.port}")
+    create_app(store, config).run(host=args.host, port=args.port, threaded=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -3,9 +3,8 @@ Module d'analyse IA pour la prédiction de tendances boursières
 Utilise des indicateurs techniques et génère des analyses en langage professionnel
 """
 import numpy as np
-import pandas as pd
 from datetime import datetime
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional, Tuple
 
 class AIStockAnalyzer:
     """Analyseur IA pour les actions de la BVMT"""
@@ -16,7 +15,8 @@ class AIStockAnalyzer:
     def analyze_stock_with_indicators(self, indicators: Dict, current_price: float,
                                      support: float, resistance: float,
                                      current_volume: float, previous_volume: float,
-                                     avg_volume_20: float, volume_trend: str) -> Dict:
+                                     avg_volume_20: float, volume_trend: str,
+                                     session_stats: Optional[Dict] = None) -> Dict:
         """
         Analyse une action avec des indicateurs déjà calculés (côté JS)
 
@@ -29,6 +29,7 @@ class AIStockAnalyzer:
             previous_volume: Volume du jour précédent
             avg_volume_20: Volume moyen sur 20 jours
             volume_trend: Tendance du volume (hausse/baisse/stable)
+            session_stats: Statistiques calculées sur l'historique local (atr, volatility...), si disponibles
 
         Returns:
             Dictionnaire contenant l'analyse complète
@@ -55,8 +56,9 @@ class AIStockAnalyzer:
             )
 
             # Calculer les objectifs de prix (court, moyen, long terme)
+            session_stats = session_stats or {}
             price_targets = self._calculate_price_targets(
-                current_price, support, resistance, trend_analysis
+                current_price, support, resistance, trend_analysis, atr=session_stats.get('atr')
             )
 
             # Générer le texte d'analyse professionnel
@@ -79,6 +81,12 @@ class AIStockAnalyzer:
                 'resistance': round(resistance, 2),
                 'timestamp': datetime.now().isoformat(),
                 'price_targets': price_targets,
+                'volatility': {
+                    'atr': session_stats.get('atr'),
+                    'atr_percent': session_stats.get('atr_percent'),
+                    'realized': session_stats.get('volatility'),
+                    'source': 'historique' if session_stats.get('atr') else 'estimation'
+                },
                 'indicators': {
                     'rsi': indicators.get('rsi'),
                     'macd_signal': trend_analysis.get('macd_signal'),
@@ -190,11 +198,13 @@ class AIStockAnalyzer:
             'average': int(avg_volume_20)
         }
 
-    def _calculate_price_targets(self, current_price: float, support: float, resistance: float, trend: Dict) -> Dict:
-        """Calcule les objectifs de prix à court, moyen et long terme"""
+    def _calculate_price_targets(self, current_price: float, support: float, resistance: float, trend: Dict,
+                                 atr: Optional[float] = None) -> Dict:
+        """Calcule les objectifs de prix à court, moyen et long terme (ATR(14) de l'historique si fourni)"""
 
-        price_range = resistance - support
-        atr = price_range / 2  # Estimation de l'ATR
+        if not atr:
+            price_range = resistance - support
+            atr = price_range / 2  # Estimation de l'ATR faute d'historique
 
         # Objectifs à court terme (1-3 jours)
         short_term_target = resistance + atr
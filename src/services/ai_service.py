@@ -0,0 +1,65 @@
+"""
+Service IA : analyse de sentiment et résumé automatique de textes financiers
+"""
+import logging
+import os
+from datetime import datetime
+from typing import Dict, List
+
+from .inference import get_inference_service
+
+logger = logging.getLogger(__name__)
+
+AI_MODELS = {
+    'summarizer': os.getenv('AI_SUMMARIZER_MODEL', 'facebook/bart-large-cnn'),
+    'sentiment': os.getenv('AI_SENTIMENT_MODEL', 'nlptown/bert-base-multilingual-uncased-sentiment'),
+}
+
+_EXPLANATIONS = {
+    'positive': "Le texte exprime une opinion positive sur la performance du marché.",
+    'negative': "Le texte exprime une opinion négative ou des inquiétudes sur le marché.",
+    'neutral': "Le texte est principalement factuel, sans orientation marquée."
+}
+
+
+class AIService:
+    """
+    Façade des modèles IA ; l'inférence est mutualisée (micro-batchs, cache) par le service d'inférence
+    """
+
+    def __init__(self):
+        self.inference = get_inference_service(AI_MODELS)
+
+    def initialize_models(self) -> Dict:
+        """
+        Charge les modèles (téléchargement au premier lancement) en exécutant une inférence de préchauffage
+        """
+        self.inference.sentiment(["Initialisation du modèle."])
+        self.inference.summarize(["Initialisation du modèle. Deuxième phrase. Troisième phrase."])
+        return self.inference.stats()['backends']
+
+    def analyze_sentiment(self, text: str) -> Dict:
+        return self.analyze_sentiments([text])[0]
+
+    def analyze_sentiments(self, texts: List[str]) -> List[Dict]:
+        results = []
+        for result in self.inference.sentiment(texts):
+            results.append({**result, 'explanation': _EXPLANATIONS[result['sentiment']]})
+        return results
+
+    def summarize(self, text: str) -> Dict:
+        return self.inference.summarize([text])[0]
+
+    def summarize_many(self, texts: List[str]) -> List[Dict]:
+        return self.inference.summarize(texts)
+
+    def analyze_text(self, text: str, analysis_type: str = 'full') -> Dict:
+        """
+        analysis_type: 'sentiment', 'summary' ou 'full'
+        """
+        result = {'timestamp': datetime.utcnow().isoformat()}
+        if analysis_type in ('summary', 'full'):
+            result['summary'] = self.summarize(text)
+        if analysis_type in ('sentiment', 'full'):
+            result['sentiment'] = self.analyze_sentiment(text)
+        return result
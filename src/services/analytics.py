@@ -0,0 +1,284 @@
+"""
+Analyses transversales : matrices de corrélation et de covariance des rendements
+"""
+import logging
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from .cache import get_cache
+from .history_store import HistoryStore, StockHistory, get_history_store
+
+logger = logging.getLogger(__name__)
+
+# Les sommes glissantes accumulent l'erreur d'arrondi : recalcul complet toutes les REBUILD_EVERY séances avancées
+REBUILD_EVERY = 250
+
+
+class ReturnsPanel:
+    """
+    Cours de clôture alignés sur un calendrier commun de séances (T x N)
+    et rendements logarithmiques quotidiens correspondants ((T-1) x N)
+    """
+
+    def __init__(self, isins: List[str], tickers: List[str], dates: np.ndarray, prices: np.ndarray):
+        self.isins = isins
+        self.tickers = tickers
+        self.dates = dates
+        self.prices = prices
+        with np.errstate(divide='ignore', invalid='ignore'):
+            returns = np.diff(np.log(prices), axis=0)
+        # Une valeur non cotée (avant introduction ou sans cours) n'apporte aucun rendement
+        returns[~np.isfinite(returns)] = 0.0
+        self.returns = returns
+        self.index = {isin: i for i, isin in enumerate(isins)}
+        self.ticker_index = {t.upper(): i for i, t in enumerate(tickers) if t}
+
+    @property
+    def size(self) -> int:
+        return len(self.isins)
+
+    @classmethod
+    def build(cls, histories: Dict[str, StockHistory], tickers: Dict[str, str]) -> 'ReturnsPanel':
+        isins = [isin for isin, h in histories.items() if len(h)]
+        if not isins:
+            return cls([], [], np.zeros(0, dtype=np.int64), np.zeros((0, 0)))
+
+        dates = np.unique(np.concatenate([histories[isin].timestamps for isin in isins]))
+        prices = np.full((len(dates), len(isins)), np.nan)
+        for j, isin in enumerate(isins):
+            h = histories[isin]
+            prices[np.searchsorted(dates, h.timestamps), j] = h.close
+        prices[prices <= 0] = np.nan
+
+        # Report du dernier cours connu sur les séances sans transaction
+        rows = np.where(np.isnan(prices), 0, np.arange(len(dates))[:, None])
+        np.maximum.accumulate(rows, axis=0, out=rows)
+        prices = prices[rows, np.arange(len(isins))]
+
+        return cls(isins, [tickers.get(isin, isin) for isin in isins], dates, prices)
+
+    def columns_for(self, tickers: List[str]) -> tuple:
+        """Indices de colonnes pour une liste de tickers (ou d'ISIN), et les inconnus"""
+        columns, unknown = [], []
+        for t in tickers:
+            idx = self.ticker_index.get(t.upper(), self.index.get(t))
+            if idx is None:
+                unknown.append(t)
+            else:
+                columns.append(idx)
+        return columns, unknown
+
+
+class _WindowState:
+    """
+    Sommes glissantes d'une fenêtre : somme des rendements et produits croisés.
+    L'ajout d'une séance coûte O(N²) au lieu de O(W·N²) pour un recalcul complet.
+    """
+
+    def __init__(self, window: int, returns: np.ndarray):
+        self.window = window
+        self._rebuild(returns)
+
+    def _rebuild(self, returns: np.ndarray) -> None:
+        self.start = max(0, len(returns) - self.window)
+        self.end = len(returns)
+        block = returns[self.start:self.end]
+        self.sums = block.sum(axis=0)
+        self.products = block.T @ block
+        self.advanced = 0
+        self._covariance = None
+        self._correlation = None
+
+    @property
+    def count(self) -> int:
+        return self.end - self.start
+
+    @property
+    def nbytes(self) -> int:
+        memos = sum(m.nbytes for m in (self._covariance, self._correlation) if m is not None)
+        return self.sums.nbytes + self.products.nbytes + memos + 512
+
+    def advance(self, returns: np.ndarray) -> None:
+        if self.advanced + len(returns) - self.end >= REBUILD_EVERY:
+            self._rebuild(returns)
+            return
+        for t in range(self.end, len(returns)):
+            row = returns[t]
+            self.sums += row
+            self.products += np.outer(row, row)
+            if t - self.start >= self.window:
+                old = returns[self.start]
+                self.sums -= old
+                self.products -= np.outer(old, old)
+                self.start += 1
+        self.advanced += len(returns) - self.end
+        self.end = len(returns)
+        self._covariance = None
+        self._correlation = None
+
+    def covariance(self) -> np.ndarray:
+        if self._covariance is None:
+            n = self.count
+            if n < 2:
+                self._covariance = np.full(self.products.shape, np.nan)
+            else:
+                self._covariance = (self.products - np.outer(self.sums, self.sums) / n) / (n - 1)
+        return self._covariance
+
+    def correlation(self) -> np.ndarray:
+        if self._correlation is None:
+            cov = self.covariance()
+            std = np.sqrt(np.clip(np.diag(cov), 0.0, None))
+            with np.errstate(divide='ignore', invalid='ignore'):
+                corr = cov / np.outer(std, std)
+            corr[np.outer(std, std) == 0] = np.nan
+            np.clip(corr, -1.0, 1.0, out=corr)
+            np.fill_diagonal(corr, np.where(std > 0, 1.0, np.nan))
+            self._correlation = corr
+        return self._correlation
+
+
+def _matrix_to_list(matrix: np.ndarray) -> list:
+    rounded = np.round(matrix, 8).astype(object)
+    rounded[~np.isfinite(matrix)] = None
+    return rounded.tolist()
+
+
+class CorrelationEngine:
+    """
+    Moteur de corrélation/covariance glissantes sur l'ensemble des valeurs cotées.
+    Les fenêtres récemment demandées sont gardées dans un cache borné et avancées séance par séance.
+    """
+
+    def __init__(self, history_store: Optional[HistoryStore] = None, refresh_seconds: Optional[int] = None):
+        self.history_store = history_store or get_history_store()
+        self.refresh_seconds = refresh_seconds if refresh_seconds is not None else \
+            int(os.getenv('ANALYTICS_REFRESH_SECONDS', 300))
+        self._panel: Optional[ReturnsPanel] = None
+        self._windows = get_cache('correlation_windows', weight=1,
+                                  max_entries=int(os.getenv('ANALYTICS_MAX_WINDOWS', 16)),
+                                  sizer=lambda s: s.nbytes)
+        self._last_refresh = 0.0
+        self._lock = threading.RLock()
+
+    def _load_universe(self) -> Dict[str, str]:
+        from .data_service import DataService
+        stocks = DataService().snapshot()
+        return {s['isin']: s.get('ticker') or s['isin'] for s in stocks if s.get('isin')}
+
+    def refresh(self, force: bool = False) -> Optional[ReturnsPanel]:
+        """
+        Reconstruit le panel de rendements si nécessaire et avance les fenêtres en cache
+        """
+        with self._lock:
+            if not force and self._panel is not None and \
+                    time.monotonic() - self._last_refresh < self.refresh_seconds:
+                return self._panel
+
+            tickers = self._load_universe()
+            if not tickers:
+                return self._panel
+            histories = self.history_store.get_many(sorted(tickers))
+            self.set_panel(ReturnsPanel.build(histories, tickers))
+            self._last_refresh = time.monotonic()
+            return self._panel
+
+    def set_panel(self, panel: ReturnsPanel) -> None:
+        """
+        Remplace le panel courant. Si le nouveau panel ne fait qu'ajouter des séances,
+        les fenêtres en cache sont avancées au lieu d'être recalculées.
+        """
+        with self._lock:
+            old = self._panel
+            appended = (
+                old is not None and old.isins == panel.isins and
+                len(panel.returns) >= len(old.returns) and
+                np.array_equal(panel.dates[:len(old.dates)], old.dates) and
+                np.array_equal(panel.returns[:len(old.returns)], old.returns)
+            )
+            if appended:
+                for window in self._windows.keys():
+                    state = self._windows.get_stale(window)
+                    if state is not None:
+                        state.advance(panel.returns)
+                        self._windows.reweigh(window)
+            else:
+                self._windows.clear()
+            self._panel = panel
+
+    def panel(self) -> Optional[ReturnsPanel]:
+        return self.refresh()
+
+    def window(self, window: int) -> Optional[_WindowState]:
+        self.refresh()
+        with self._lock:
+            return self._window_state(window)
+
+    def _window_state(self, window: int) -> Optional[_WindowState]:
+        """Fenêtre du panel courant (verrou détenu)"""
+        panel = self._panel
+        if panel is None or panel.size == 0:
+            return None
+        state = self._windows.get(window)
+        if state is None:
+            state = _WindowState(window, panel.returns)
+            self._windows.set(window, state)
+        return state
+
+    def get_matrices(self, window: int = 60, tickers: Optional[List[str]] = None,
+                     matrix: str = 'both') -> Dict:
+        """
+        Retourne les matrices de la fenêtre demandée, éventuellement restreintes à quelques tickers
+        """
+        self.refresh()
+        # Panel, fenêtre et matrices lus dans la même section : un set_panel concurrent ne peut pas
+        # associer les matrices d'un panel aux tickers d'un autre
+        with self._lock:
+            panel = self._panel
+            state = self._window_state(window)
+            if state is None:
+                return {}
+            observations = state.count
+            correlation = state.correlation() if matrix in ('correlation', 'both') else None
+            covariance = state.covariance() if matrix in ('covariance', 'both') else None
+            # Les matrices mémoïsées comptent dans la taille de l'entrée
+            self._windows.reweigh(window)
+
+        unknown = []
+        if tickers:
+            columns, unknown = panel.columns_for(tickers)
+        else:
+            columns = list(range(panel.size))
+        selector = np.ix_(columns, columns)
+
+        result = {
+            'window': window,
+            'observations': observations,
+            'as_of': int(panel.dates[-1]) if len(panel.dates) else None,
+            'tickers': [panel.tickers[i] for i in columns],
+            'unknown_tickers': unknown
+        }
+        if correlation is not None:
+            result['correlation'] = _matrix_to_list(correlation[selector])
+        if covariance is not None:
+            result['covariance'] = _matrix_to_list(covariance[selector])
+        return result
+
+
+_correlation_engine = None
+_correlation_engine_lock = threading.Lock()
+
+
+def get_correlation_engine() -> CorrelationEngine:
+    """
+    Retourne le moteur de corrélation partagé par le processus
+    """
+    global _correlation_engine
+    with _correlation_engine_lock:
+        if _correlation_engine is None:
+            _correlation_engine = CorrelationEngine()
+        return _correlation_engine
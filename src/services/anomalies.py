@@ -0,0 +1,205 @@
+"""
+Détection en continu des anomalies de volume et de cours sur l'ensemble des valeurs
+
+Chaque instantané de marché met à jour, pour les seules valeurs ayant traité depuis l'instantané
+précédent, des statistiques glissantes rangées dans des tableaux NumPy (une ligne par ISIN) :
+moyenne/variance de Welford (référence de long terme) et moyenne/variance exponentielles (référence
+récente). Une observation est signalée quand son z-score dépasse le seuil face aux deux références,
+calculées avant de l'intégrer. Aucun historique n'est relu : chaque mise à jour est O(1) par valeur.
+"""
+import logging
+import math
+import os
+import threading
+from collections import deque
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from . import market_feed
+
+logger = logging.getLogger(__name__)
+
+# Colonnes suivies : rendement logarithmique entre deux instantanés, log(1 + volume échangé entre deux instantanés)
+RETURN, VOLUME = 0, 1
+_TYPES = {RETURN: 'price', VOLUME: 'volume'}
+
+
+def _to_float(value) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+class AnomalyDetector:
+    """
+    Détecteur incrémental de z-scores extrêmes sur les rendements et les volumes échangés
+    """
+
+    def __init__(self, threshold: Optional[float] = None, min_observations: Optional[int] = None,
+                 halflife: Optional[float] = None, max_events: int = 500):
+        self.threshold = threshold if threshold is not None else float(os.getenv('ANOMALY_Z', 4.0))
+        self.min_observations = min_observations if min_observations is not None else int(os.getenv('ANOMALY_MIN_OBS', 20))
+        halflife = halflife if halflife is not None else float(os.getenv('ANOMALY_HALFLIFE', 30))
+        self.alpha = 1 - 0.5 ** (1 / halflife)
+        self._lock = threading.Lock()
+        self._slots: Dict[str, int] = {}
+        self._labels: List[tuple] = []
+        # Dernier état connu par ligne
+        self._price = np.zeros(0)
+        self._cum_volume = np.zeros(0)
+        self._session = np.zeros(0, dtype=np.int64)
+        self._seen = np.zeros(0, dtype=bool)
+        # Statistiques par ligne et par colonne suivie
+        self._count = np.zeros((0, 2), dtype=np.int64)
+        self._mean = np.zeros((0, 2))
+        self._m2 = np.zeros((0, 2))
+        self._ew_mean = np.zeros((0, 2))
+        self._ew_var = np.zeros((0, 2))
+        self._events = deque(maxlen=max_events)
+        self._seq = 0
+        self.updates = 0
+        self.timestamp = None
+
+    def _slot(self, stock: Dict) -> int:
+        slot = self._slots.get(stock['isin'])
+        if slot is None:
+            slot = len(self._slots)
+            self._slots[stock['isin']] = slot
+            self._labels.append((stock.get('ticker'), stock.get('stock_name')))
+        return slot
+
+    def _grow(self, size: int) -> None:
+        missing = size - len(self._seen)
+        if missing > 0:
+            self._price = np.concatenate([self._price, np.zeros(missing)])
+            self._cum_volume = np.concatenate([self._cum_volume, np.zeros(missing)])
+            self._session = np.concatenate([self._session, np.zeros(missing, dtype=np.int64)])
+            self._seen = np.concatenate([self._seen, np.zeros(missing, dtype=bool)])
+            for name in ('_count', '_mean', '_m2', '_ew_mean', '_ew_var'):
+                current = getattr(self, name)
+                setattr(self, name, np.vstack([current, np.zeros((missing, 2), dtype=current.dtype)]))
+
+    def update(self, stocks: list) -> int:
+        """
+        Intègre un nouvel instantané d'actions normalisées.
+        Retourne le nombre d'anomalies détectées.
+        """
+        rows = [s for s in stocks if s.get('isin')]
+        with self._lock:
+            slots = np.fromiter((self._slot(s) for s in rows), dtype=np.int64, count=len(rows))
+            price = np.fromiter((_to_float(s.get('last_price', s.get('close_price'))) for s in rows),
+                                dtype=np.float64, count=len(rows))
+            cum_volume = np.fromiter((_to_float(s.get('volume')) for s in rows), dtype=np.float64, count=len(rows))
+            session = np.fromiter((hash(s.get('seance')) for s in rows), dtype=np.int64, count=len(rows))
+            self._grow(len(self._slots))
+
+            # Observations depuis l'instantané précédent de la même séance
+            comparable = self._seen[slots] & (self._session[slots] == session)
+            prev_price, prev_volume = self._price[slots], self._cum_volume[slots]
+            x = np.full((len(rows), 2), np.nan)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                x[:, RETURN] = np.where(comparable & (price > 0) & (prev_price > 0), np.log(price / prev_price), np.nan)
+                traded = cum_volume - prev_volume
+                x[:, VOLUME] = np.where(comparable & (traded >= 0), np.log1p(traded), np.nan)
+            # Seules les valeurs ayant traité apportent une observation
+            ticked = (x[:, VOLUME] > 0) | (np.nan_to_num(x[:, RETURN]) != 0)
+            valid = ~np.isnan(x) & ticked[:, None]
+
+            self._price[slots] = np.where(price > 0, price, prev_price)
+            self._cum_volume[slots] = np.where(np.isnan(cum_volume), prev_volume, cum_volume)
+            self._session[slots] = session
+            self._seen[slots] = True
+
+            found = self._score_and_update(slots, x, valid, rows, traded)
+            self.updates += 1
+            self.timestamp = datetime.utcnow()
+            return found
+
+    def _score_and_update(self, slots: np.ndarray, x: np.ndarray, valid: np.ndarray, rows: list,
+                          traded: np.ndarray) -> int:
+        count, mean, m2 = self._count[slots], self._mean[slots], self._m2[slots]
+        ew_mean, ew_var = self._ew_mean[slots], self._ew_var[slots]
+
+        # z-scores face aux références calculées avant l'observation
+        with np.errstate(divide='ignore', invalid='ignore'):
+            z_long = (x - mean) / np.sqrt(m2 / (count - 1))
+            z_recent = (x - ew_mean) / np.sqrt(ew_var)
+        ready = valid & (count >= self.min_observations) & np.isfinite(z_long) & np.isfinite(z_recent)
+        # Le z-score retenu est le plus prudent des deux
+        z = np.where(np.abs(z_long) < np.abs(z_recent), z_long, z_recent)
+        flagged = ready & (np.abs(z) > self.threshold)
+        # Pour le volume, seules les hausses sont des anomalies
+        flagged[:, VOLUME] &= z[:, VOLUME] > 0
+
+        # Welford
+        new_count = count + valid
+        delta = np.where(valid, x - mean, 0.0)
+        new_mean = mean + np.where(valid, delta / np.maximum(new_count, 1), 0.0)
+        new_m2 = m2 + np.where(valid, delta * (np.nan_to_num(x) - new_mean), 0.0)
+        # Moyenne et variance exponentielles (initialisées sur la première observation)
+        first = valid & (count == 0)
+        diff = np.where(valid, x - ew_mean, 0.0)
+        incr = self.alpha * diff
+        new_ew_mean = np.where(first, np.nan_to_num(x), ew_mean + incr)
+        new_ew_var = np.where(first, 0.0, np.where(valid, (1 - self.alpha) * (ew_var + diff * incr), ew_var))
+
+        self._count[slots], self._mean[slots], self._m2[slots] = new_count, new_mean, new_m2
+        self._ew_mean[slots], self._ew_var[slots] = new_ew_mean, new_ew_var
+
+        now = datetime.utcnow().isoformat()
+        for i, column in zip(*np.nonzero(flagged)):
+            slot = int(slots[i])
+            ticker, name = self._labels[slot]
+            self._seq += 1
+            event = {
+                'seq': self._seq,
+                'type': _TYPES[column],
+                'isin': rows[i]['isin'],
+                'ticker': ticker,
+                'stock_name': name,
+                'z_score': round(float(z[i, column]), 2),
+                'price': float(self._price[slot]),
+                'timestamp': now
+            }
+            if column == VOLUME:
+                typical = math.expm1(float(ew_mean[i, VOLUME]))
+                event['volume'] = float(traded[i])
+                event['ratio'] = round(float(traded[i]) / typical, 1) if typical > 0 else None
+            else:
+                event['change_percent'] = round(math.expm1(float(x[i, RETURN])) * 100, 3)
+            self._events.append(event)
+        return int(flagged.sum())
+
+    def recent(self, since: int = 0, anomaly_type: Optional[str] = None, limit: int = 50) -> List[Dict]:
+        """
+        Anomalies les plus récentes d'abord (seq > since), éventuellement filtrées par type
+        """
+        with self._lock:
+            events = [e for e in self._events if e['seq'] > since]
+        if anomaly_type:
+            events = [e for e in events if e['type'] == anomaly_type]
+        return events[::-1][:limit]
+
+    def summary(self, since: int = 0, anomaly_type: Optional[str] = None, limit: int = 50) -> Dict:
+        return {
+            'timestamp': self.timestamp,
+            'last_seq': self._seq,
+            'threshold': self.threshold,
+            'tracked': len(self._slots),
+            'ready': int((self._count[:, RETURN] >= self.min_observations).sum()) if len(self._count) else 0,
+            'anomalies': self.recent(since, anomaly_type, limit)
+        }
+
+
+_anomaly_detector = AnomalyDetector()
+market_feed.subscribe(_anomaly_detector.update)
+
+
+def get_anomaly_detector() -> AnomalyDetector:
+    """
+    Retourne le détecteur partagé (par processus) alimenté par les instantanés de marché
+    """
+    return _anomaly_detector
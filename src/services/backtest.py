@@ -0,0 +1,343 @@
+"""
+Backtest des règles de l'analyseur IA (AIStockAnalyzer) sur l'historique complet de chaque valeur
+
+Les indicateurs que le frontend envoie à /api/ai-analysis/analyze (MACD 12/26/9, SMA 20/50,
+momentum 10, support/résistance sur 3 mois, volumes sur 20 séances) sont recalculés pour chaque
+séance en une passe vectorisée par valeur, puis les règles de tendance, de confiance et d'objectifs
+de prix sont appliquées à toutes les séances à la fois. Les valeurs sont réparties sur un pool de processus.
+"""
+import hashlib
+import json
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from scipy.signal import lfilter
+
+from .cache import get_cache
+from .volatility import wilder_atr
+
+logger = logging.getLogger(__name__)
+
+# Codes de direction
+BEARISH, NEUTRAL, BULLISH = -1, 0, 1
+DIRECTION_LABELS = {BULLISH: 'haussière', NEUTRAL: 'neutre', BEARISH: 'baissière'}
+
+LOOKBACK = 63  # ~3 mois de séances, comme le frontend
+MIN_HISTORY = 60
+CONFIDENCE_BINS = np.array([0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 0.951])
+
+
+def _ema(values: np.ndarray, period: int) -> np.ndarray:
+    """EMA initialisée sur la première valeur (identique à calculateEMA côté JS)"""
+    k = 2 / (period + 1)
+    out, _ = lfilter([k], [1, -(1 - k)], values, zi=[(1 - k) * values[0]])
+    return out
+
+
+def _sma(values: np.ndarray, period: int) -> np.ndarray:
+    out = np.full(len(values), np.nan)
+    if len(values) >= period:
+        csum = np.cumsum(np.insert(values, 0, 0.0))
+        out[period - 1:] = (csum[period:] - csum[:-period]) / period
+    return out
+
+
+def _rsi(close: np.ndarray, period: int = 14) -> np.ndarray:
+    """RSI de Wilder"""
+    delta = np.diff(close, prepend=close[0])
+    gain, loss = np.clip(delta, 0, None), np.clip(-delta, 0, None)
+    alpha = 1 / period
+    avg_gain = lfilter([alpha], [1, -(1 - alpha)], gain)
+    avg_loss = lfilter([alpha], [1, -(1 - alpha)], loss)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rs = avg_gain / avg_loss
+    return np.where(avg_loss == 0, 100.0, 100 - 100 / (1 + rs))
+
+
+def _mean_of_extremes(values: np.ndarray, lookback: int, highest: bool) -> np.ndarray:
+    """Moyenne des 3 plus bas (ou plus hauts) sur une fenêtre glissante"""
+    out = np.full(len(values), np.nan)
+    if len(values) < lookback:
+        return out
+    windows = sliding_window_view(values, lookback)
+    if highest:
+        part = -np.partition(-windows, 2, axis=1)[:, :3]
+    else:
+        part = np.partition(windows, 2, axis=1)[:, :3]
+    out[lookback - 1:] = np.round(part.mean(axis=1), 2)
+    return out
+
+
+def signal_series(close: np.ndarray, high: np.ndarray, low: np.ndarray, volume: np.ndarray,
+                  use_rsi: bool = False) -> Dict[str, np.ndarray]:
+    """
+    Applique, séance par séance, les règles de _analyze_trend_from_indicators,
+    _calculate_confidence et _calculate_price_targets
+    """
+    ema12, ema26 = _ema(close, 12), _ema(close, 26)
+    macd = ema12 - ema26
+    macd_signal = _ema(macd, 9)
+    sma20 = _sma(close, 20)
+    sma50 = _sma(close, 50)
+    sma20 = np.where(np.isnan(sma20), close, sma20)
+    sma50 = np.where(np.isnan(sma50), close, sma50)
+    momentum = np.zeros_like(close)
+    momentum[10:] = close[10:] - close[:-10]
+    # Le frontend envoie actuellement un RSI neutre de 50
+    rsi = _rsi(close) if use_rsi else np.full_like(close, 50.0)
+
+    # Règles de tendance
+    s_ma = np.where((close > sma20) & (close > sma50), 1, np.where((close < sma20) & (close < sma50), -1, 0))
+    s_macd = np.sign(macd - macd_signal)
+    s_rsi = np.where(rsi > 70, -1, np.where(rsi < 30, 1, np.where(rsi > 50, 1, -1)))
+    s_mom = np.where(momentum > 0, 1, -1)
+    score = (s_ma + s_macd + s_rsi + s_mom) / 4.0
+
+    direction = np.where(score > 0.3, BULLISH, np.where(score < -0.3, BEARISH, NEUTRAL))
+    strong = np.abs(score) > 0.7
+
+    # Supports/résistances et volumes
+    support = _mean_of_extremes(low, LOOKBACK, highest=False)
+    resistance = _mean_of_extremes(high, LOOKBACK, highest=True)
+    avg_volume = _sma(volume, 20)
+    volume_up = volume > avg_volume
+    volume_down = volume < avg_volume * 0.9
+
+    breakout = (close > resistance * 0.98) | (close < support * 1.02)
+
+    # Règles de confiance
+    confidence = np.full(len(close), 0.5)
+    confidence += np.where(direction != NEUTRAL, np.where(strong, 0.2, 0.1), 0.0)
+    confidence += np.where((direction != NEUTRAL) & volume_up, 0.15, 0.0)
+    confidence += np.where((rsi > 70) | (rsi < 30), 0.1, 0.0)
+    confidence += np.where(breakout, 0.15, 0.0)
+    confidence -= np.where(direction == NEUTRAL, 0.2, 0.0)
+    confidence = np.clip(confidence, 0.3, 0.95)
+
+    # Objectifs court terme : ATR(14) de Wilder, comme l'analyseur quand l'historique est disponible
+    atr = wilder_atr(high, low, close)
+    return {
+        'direction': direction,
+        'confidence': confidence,
+        'target_up': resistance + atr,
+        'target_down': support - atr,
+        'valid': ~np.isnan(support) & ~np.isnan(resistance) & ~np.isnan(avg_volume) & ~np.isnan(atr) & (close > 0),
+        'volume_trend': np.where(volume_up, 1, np.where(volume_down, -1, 0))
+    }
+
+
+def backtest_symbol(args: tuple) -> Optional[Dict[str, np.ndarray]]:
+    """
+    Backtest d'une valeur ; exécuté dans un processus du pool
+    """
+    isin, close, high, low, volume, horizon, use_rsi = args
+    n = len(close)
+    if n < max(MIN_HISTORY, LOOKBACK) + horizon:
+        return None
+    close = np.asarray(close, dtype=np.float64)
+    high = np.asarray(high, dtype=np.float64)
+    low = np.asarray(low, dtype=np.float64)
+    volume = np.nan_to_num(np.asarray(volume, dtype=np.float64))
+
+    sig = signal_series(close, high, low, volume, use_rsi=use_rsi)
+
+    # Rendement à horizon et extrêmes atteints sur l'horizon
+    idx = np.arange(n - horizon)
+    forward = close[idx + horizon] / close[idx] - 1
+    future_high = sliding_window_view(high[1:], horizon).max(axis=1)[:n - horizon]
+    future_low = sliding_window_view(low[1:], horizon).min(axis=1)[:n - horizon]
+
+    valid = sig['valid'][:n - horizon] & np.isfinite(forward)
+    direction = sig['direction'][:n - horizon][valid]
+    return {
+        'isin': isin,
+        'direction': direction.astype(np.int8),
+        'confidence': sig['confidence'][:n - horizon][valid].astype(np.float32),
+        'forward': forward[valid].astype(np.float32),
+        'target_hit': np.where(direction == BULLISH, future_high[valid] >= sig['target_up'][:n - horizon][valid],
+                               np.where(direction == BEARISH, future_low[valid] <= sig['target_down'][:n - horizon][valid],
+                                        False))
+    }
+
+
+def _stats(direction: np.ndarray, forward: np.ndarray, target_hit: np.ndarray) -> Dict:
+    stats = {}
+    for code, label in DIRECTION_LABELS.items():
+        mask = direction == code
+        count = int(mask.sum())
+        entry = {'signals': count}
+        if count:
+            fwd = forward[mask]
+            entry['avg_return_percent'] = round(float(fwd.mean()) * 100, 4)
+            entry['median_return_percent'] = round(float(np.median(fwd)) * 100, 4)
+            if code != NEUTRAL:
+                entry['hit_rate'] = round(float((np.sign(fwd) == code).mean()), 4)
+                entry['target_hit_rate'] = round(float(target_hit[mask].mean()), 4)
+            else:
+                entry['avg_abs_return_percent'] = round(float(np.abs(fwd).mean()) * 100, 4)
+        stats[label] = entry
+    return stats
+
+
+def aggregate(results: List[Dict], horizon: int) -> Dict:
+    """
+    Agrège les résultats par valeur : taux de réussite, rendement moyen par signal et calibration de la confiance
+    """
+    results = [r for r in results if r is not None and len(r['direction'])]
+    if not results:
+        return {'horizon': horizon, 'symbols': 0, 'observations': 0}
+
+    direction = np.concatenate([r['direction'] for r in results])
+    confidence = np.concatenate([r['confidence'] for r in results])
+    forward = np.concatenate([r['forward'] for r in results])
+    target_hit = np.concatenate([r['target_hit'] for r in results])
+
+    # Calibration : taux de réussite observé par tranche de confiance annoncée (signaux directionnels)
+    directional = direction != NEUTRAL
+    hits = (np.sign(forward) == direction) & directional
+    bins = np.digitize(confidence, CONFIDENCE_BINS) - 1
+    calibration = []
+    for b in range(len(CONFIDENCE_BINS) - 1):
+        mask = (bins == b) & directional
+        count = int(mask.sum())
+        calibration.append({
+            'confidence_range': [float(CONFIDENCE_BINS[b]), round(float(min(CONFIDENCE_BINS[b + 1], 0.95)), 2)],
+            'signals': count,
+            'mean_confidence': round(float(confidence[mask].mean()), 4) if count else None,
+            'hit_rate': round(float(hits[mask].mean()), 4) if count else None
+        })
+
+    per_symbol = {}
+    for r in results:
+        d = r['direction'] != NEUTRAL
+        per_symbol[r['isin']] = {
+            'observations': int(len(r['direction'])),
+            'hit_rate': round(float((np.sign(r['forward'][d]) == r['direction'][d]).mean()), 4) if d.any() else None
+        }
+
+    return {
+        'horizon': horizon,
+        'symbols': len(results),
+        'observations': int(len(direction)),
+        'signals': _stats(direction, forward, target_hit),
+        'calibration': calibration,
+        'per_symbol': per_symbol
+    }
+
+
+def run_backtest(histories: Dict, horizon: int = 5, workers: Optional[int] = None,
+                 use_rsi: bool = False) -> Dict:
+    """
+    Lance le backtest sur un ensemble d'historiques (ISIN -> StockHistory)
+
+    Args:
+        histories: historiques par ISIN
+        horizon: nombre de séances après le signal pour l'évaluer
+        workers: taille du pool de processus (0 = exécution dans le processus courant)
+        use_rsi: utiliser un vrai RSI(14) plutôt que la valeur neutre envoyée par le frontend
+    """
+    started = time.perf_counter()
+    tasks = [
+        (isin, h.close, h.columns['high'], h.columns['low'], h.columns['volume'], horizon, use_rsi)
+        for isin, h in histories.items()
+    ]
+    if workers == 0 or len(tasks) < 2:
+        results = [backtest_symbol(t) for t in tasks]
+    else:
+        workers = workers or min(len(tasks), os.cpu_count() or 1)
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(backtest_symbol, tasks, chunksize=max(1, len(tasks) // (workers * 4))))
+
+    report = aggregate(results, horizon)
+    report['rsi'] = 'wilder_14' if use_rsi else 'frontend_constant_50'
+    report['generated_at'] = datetime.utcnow().isoformat()
+    report['duration_seconds'] = round(time.perf_counter() - started, 3)
+    return report
+
+
+def results_dir() -> str:
+    return os.getenv('BACKTEST_RESULTS_DIR',
+                     os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'backtests'))
+
+
+def universe_key(isins: Optional[List[str]] = None) -> str:
+    """
+    Univers d'un backtest : 'market' pour toutes les valeurs cotées, sinon empreinte de la sélection d'ISIN
+    """
+    if not isins:
+        return 'market'
+    digest = hashlib.sha1(','.join(sorted(set(isins))).encode('utf-8')).hexdigest()[:12]
+    return f'isins-{digest}'
+
+
+def results_path(horizon: int = 5, use_rsi: bool = False, universe: str = 'market') -> str:
+    """
+    Fichier de résultats d'un backtest, un par (horizon, RSI, univers)
+    """
+    rsi = 'rsi' if use_rsi else 'norsi'
+    return os.path.join(results_dir(), f'backtest-h{horizon}-{rsi}-{universe}.json')
+
+
+_cache = get_cache('backtest', weight=0.5, max_entries=32)
+
+
+def get_backtest_results(horizon: int = 5, use_rsi: bool = False, universe: str = 'market') -> Optional[Dict]:
+    """
+    Derniers résultats enregistrés (par `python -m src.scripts.backtest_signals`) pour ces paramètres,
+    ou None s'il n'y en a pas. Lecture seule : aucun backtest n'est lancé depuis une requête.
+    """
+    path = results_path(horizon, use_rsi, universe)
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return None
+    entry = _cache.get(path)
+    if entry and entry[0] == mtime:
+        return entry[1]
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            report = json.load(f)
+    except (OSError, ValueError) as e:
+        logger.error(f"Résultats de backtest illisibles dans {path}: {e}")
+        return None
+    _cache.set(path, (mtime, report))
+    return report
+
+
+def save_results(report: Dict, path: Optional[str] = None) -> str:
+    """
+    Enregistre un rapport (par défaut dans le fichier de ses paramètres) ; retourne le chemin
+    """
+    path = path or results_path(report['horizon'], report.get('rsi') == 'wilder_14', report.get('universe', 'market'))
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False)
+        os.replace(tmp, path)
+    except OSError as e:
+        logger.error(f"Impossible d'enregistrer les résultats du backtest dans {path}: {e}")
+    return path
+
+
+def run_market_backtest(horizon: int = 5, workers: Optional[int] = None, use_rsi: bool = False,
+                        isins: Optional[List[str]] = None) -> Dict:
+    """
+    Backtest de toutes les valeurs cotées (ou d'une sélection d'ISIN)
+    """
+    from .data_service import DataService
+    from .history_store import get_history_store
+
+    universe = universe_key(isins)
+    if universe == 'market':
+        isins = [s['isin'] for s in DataService().snapshot() if s.get('isin')]
+    histories = get_history_store().get_many(isins)
+    report = run_backtest(histories, horizon=horizon, workers=workers, use_rsi=use_rsi)
+    report['universe'] = universe
+    return report
@@ -2,11 +2,16 @@
 Service pour récupérer les données de l'API BVMT
 """
 import requests
+import hashlib
 import os
-from datetime import datetime, timedelta
-from typing import Dict, List, Optional
+import re
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
 import logging
 
+from . import metrics, rate_limiter, tracing, warm_start
+from .cache import get_cache, sizeof
 
 logger = logging.getLogger(__name__)
 
@@ -14,22 +19,89 @@ logger = logging.getLogger(__name__)
 TUNINDEX_ISIN = "TN0009050014"
 TUNINDEX20_ISIN = "TN0009050287"
 
+DEFAULT_BVMT_BASE_URL = 'https://www.bvmt.com.tn/rest_api/rest'
+DEFAULT_IRBE7_BASE_URL = 'https://data.irbe7.com'
+
+_ISIN_RE = re.compile(r'^[A-Z]{2}[A-Z0-9]{9}[0-9]$')
+
+
+def get_bvmt_base_url() -> str:
+    """
+    URL de base de l'API BVMT (surchargeable via BVMT_BASE_URL, ex: serveur de substitution local)
+    """
+    return os.getenv('BVMT_BASE_URL', DEFAULT_BVMT_BASE_URL).rstrip('/')
+
+
+def get_irbe7_base_url() -> str:
+    """
+    URL de base de l'API data.irbe7.com (surchargeable via IRBE7_BASE_URL)
+    """
+    return os.getenv('IRBE7_BASE_URL', DEFAULT_IRBE7_BASE_URL).rstrip('/')
+
+
+def is_isin(value: str) -> bool:
+    return bool(_ISIN_RE.match(value or ''))
+
+
+def endpoint_template(endpoint: str) -> str:
+    """
+    Ramène un endpoint concret à son modèle (ex: 'history/TN0001100254' -> 'history/{isin}')
+    """
+    parts = endpoint.strip('/').split('?')[0].split('/')
+    if len(parts) >= 3 and parts[0] == 'market' and parts[1] == 'groups':
+        return 'market/groups/{groups}'
+    return '/'.join('{isin}' if _ISIN_RE.match(p) else p for p in parts)
+
+
+# Dernière réponse de chaque endpoint : (empreinte du corps, ETag, Last-Modified, objet analysé).
+# Une réponse inchangée renvoie le même objet : les appelants ne doivent pas le modifier.
+_payloads = get_cache('bvmt_payloads', weight=2)
+# Résultats calculés à partir de réponses amont : (réponses sources, résultat)
+_derived = get_cache('bvmt_derived', weight=1, max_entries=512)
+# Dernière ligne normalisée par ISIN : (empreinte de la ligne brute, ligne normalisée)
+_rows = get_cache('normalized_rows', weight=0.5)
+
+# Champs bruts lus par normalize_stock_data (ligne, puis référentiel) : ils forment l'empreinte d'une ligne
+_ROW_FIELDS = ('isin', 'last', 'close', 'open', 'high', 'low', 'volume', 'change', 'ychange', 'caps', 'seance',
+               'arabSeance', 'status', 'time', 'trading', 'min', 'max')
+_REFERENTIEL_FIELDS = ('ticker', 'stockName', 'arabName', 'valGroup')
+
+
+def derive(stage: str, key: Any, sources: tuple, build: Callable[[], Any]) -> Any:
+    """
+    Retourne `build()`, calculé une seule fois tant que les réponses `sources` sont les mêmes objets
+    (réponses amont inchangées). Le résultat est partagé : il ne doit pas être modifié.
+    """
+    entry = _derived.get((stage, key))
+    if entry is not None and len(entry[0]) == len(sources) and all(a is b for a, b in zip(entry[0], sources)):
+        metrics.count_skipped(stage, endpoint_template(str(key)))
+        return entry[1]
+    result = build()
+    # Les réponses sources sont déjà comptées dans bvmt_payloads
+    _derived.set((stage, key), (sources, result), size=sizeof(result))
+    return result
+
+
+def stamped(row: Dict, updated_at: Optional[float] = None) -> Dict:
+    """
+    Copie d'une ligne normalisée partagée datée de son instantané (`updated_at` en secondes epoch, maintenant
+    par défaut) : last_updated est celui de l'instantané, pas celui de la première normalisation de la ligne
+    """
+    return {**row, 'last_updated': datetime.utcfromtimestamp(updated_at) if updated_at else datetime.utcnow()}
+
+
 class BVMTService:
     """
     Service pour interagir avec l'API BVMT
     """
     
     def __init__(self):
-        self.base_url = os.getenv('BVMT_BASE_URL', 'https://www.bvmt.com.tn/rest_api/rest')
+        self.base_url = get_bvmt_base_url()
         self.session = requests.Session()
         self.session.headers.update({
             'User-Agent': 'Carthago-Market/1.0',
             'Accept': 'application/json'
         })
-        # Cache pour les indices avec un timestamp d'expiration
-        self._indices_cache = None
-        self._indices_cache_timestamp = None
-        self._indices_cache_ttl = 5 * 60  # 5 minutes en secondes
         # Référence à la collection MongoDB pour les indices
         
 
@@ -37,17 +109,60 @@ class BVMTService:
         """
         Effectue une requête vers l'API BVMT
         """
-        try:
-            url = f"{self.base_url}/{endpoint}"
-            response = self.session.get(url, timeout=10)
-            response.raise_for_status()
-            return response.json()
-        except requests.exceptions.RequestException as e:
-            logger.error(f"Erreur lors de la requête vers {endpoint}: {e}")
-            return None
-        except ValueError as e:
-            logger.error(f"Erreur de parsing JSON pour {endpoint}: {e}")
-            return None
+        started = time.perf_counter()
+        outcome = 'ok'
+        template = endpoint_template(endpoint)
+        with tracing.span('bvmt.request', endpoint=endpoint):
+            try:
+                url = f"{self.base_url}/{endpoint}"
+                cached = _payloads.get(endpoint)
+                headers = {}
+                if cached is not None:
+                    # Requête conditionnelle lorsque l'amont a fourni un validateur
+                    if cached[1]:
+                        headers['If-None-Match'] = cached[1]
+                    if cached[2]:
+                        headers['If-Modified-Since'] = cached[2]
+                with rate_limiter.limited('bvmt'):
+                    started = time.perf_counter()
+                    response = self.session.get(url, timeout=10, headers=headers)
+                if response.status_code == 304 and cached is not None:
+                    outcome = 'not_modified'
+                    metrics.count_skipped('not_modified', template)
+                    return cached[3]
+                response.raise_for_status()
+                body = response.content
+                digest = hashlib.blake2b(body, digest_size=16).digest()
+                etag, last_modified = response.headers.get('ETag'), response.headers.get('Last-Modified')
+                if cached is not None and cached[0] == digest:
+                    # Corps identique octet pour octet : l'objet déjà analysé est réutilisé
+                    metrics.count_skipped('parse', template)
+                    if (etag, last_modified) != cached[1:3]:
+                        _payloads.set(endpoint, (digest, etag, last_modified, cached[3]), size=len(body) * 4)
+                    return cached[3]
+                with tracing.span('bvmt.parse'):
+                    payload = response.json()
+                # Un objet JSON analysé occupe environ 4 fois la taille de son texte
+                _payloads.set(endpoint, (digest, etag, last_modified, payload), size=len(body) * 4)
+                return payload
+            except rate_limiter.RateLimited as e:
+                outcome = 'rate_limited'
+                logger.warning(f"Requête vers {endpoint} abandonnée: {e}")
+                return None
+            except requests.exceptions.HTTPError as e:
+                outcome = 'http_error'
+                logger.error(f"Erreur lors de la requête vers {endpoint}: {e}")
+                return None
+            except requests.exceptions.RequestException as e:
+                outcome = 'network_error'
+                logger.error(f"Erreur lors de la requête vers {endpoint}: {e}")
+                return None
+            except ValueError as e:
+                outcome = 'parse_error'
+                logger.error(f"Erreur de parsing JSON pour {endpoint}: {e}")
+                return None
+            finally:
+                metrics.observe_upstream(f"bvmt:{template}", time.perf_counter() - started, outcome)
     
     def get_all_stocks_status(self) -> Optional[Dict]:
         """
@@ -148,7 +263,48 @@ class BVMTService:
         }
         
         return {k: v for k, v in normalized.items() if v is not None}
+
+    def normalize_rows(self, rows: List[Dict], endpoint: str = '') -> List[Dict]:
+        """
+        Normalise des lignes brutes ; une ligne dont les champs n'ont pas changé depuis la précédente
+        normalisation de son ISIN reprend la même ligne normalisée (partagée : ne pas la modifier).
+        Les lignes n'ont pas de last_updated : il est ajouté aux copies servies (stamped)
+        """
+        normalized_rows = []
+        reused = 0
+        for row in rows:
+            if not row:
+                continue
+            isin = row.get('isin')
+            fingerprint = (tuple(map(row.get, _ROW_FIELDS)),
+                           tuple(map((row.get('referentiel') or {}).get, _REFERENTIEL_FIELDS)))
+            entry = _rows.get(isin) if isin else None
+            if entry is not None and entry[0] == fingerprint:
+                normalized_rows.append(entry[1])
+                reused += 1
+                continue
+            normalized = self.normalize_stock_data(row)
+            # Ligne mémorisée : sa date de mise à jour est celle de chaque instantané (voir stamped)
+            normalized.pop('last_updated', None)
+            if isin:
+                _rows.set(isin, (fingerprint, normalized))
+            normalized_rows.append(normalized)
+        if reused:
+            metrics.count_skipped('normalize_row', endpoint_template(endpoint), reused)
+        return normalized_rows
+
+    def normalize_markets(self, payload: Optional[Dict], endpoint: str) -> List[Dict]:
+        """
+        Normalise la liste 'markets' d'une réponse ; recalculée seulement si la réponse de `endpoint` a changé,
+        et alors seulement pour les lignes modifiées
+        """
+        if not payload or 'markets' not in payload:
+            return []
+        with tracing.span('bvmt.normalize', endpoint=endpoint):
+            return derive('normalize', endpoint, (payload,),
+                          lambda: self.normalize_rows(payload['markets'], endpoint))
     
+    @tracing.traced('bvmt.get_market_summary')
     def get_market_summary(self) -> Dict:
         """
         Récupère un résumé complet du marché
@@ -163,26 +319,23 @@ class BVMTService:
         
         # Récupérer les hausses
         rises_data = self.get_market_rises()
-        if rises_data and 'markets' in rises_data:
-            summary['rises'] = [self.normalize_stock_data(stock) for stock in rises_data['markets'][:10]]
+        summary['rises'] = [stamped(r) for r in self.normalize_markets(rises_data, 'market/hausses')[:10]]
         
         # Récupérer les baisses
         falls_data = self.get_market_falls()
-        if falls_data and 'markets' in falls_data:
-            summary['falls'] = [self.normalize_stock_data(stock) for stock in falls_data['markets'][:10]]
+        summary['falls'] = [stamped(r) for r in self.normalize_markets(falls_data, 'market/baisses')[:10]]
         
         # Récupérer les volumes
         volumes_data = self.get_market_volumes()
-        if volumes_data and 'markets' in volumes_data:
-            summary['volumes'] = [self.normalize_stock_data(stock) for stock in volumes_data['markets'][:10]]
+        summary['volumes'] = [stamped(r) for r in self.normalize_markets(volumes_data, 'market/volumes')[:10]]
         
         # Récupérer les quantités
         quantities_data = self.get_market_quantities()
-        if quantities_data and 'markets' in quantities_data:
-            summary['quantities'] = [self.normalize_stock_data(stock) for stock in quantities_data['markets'][:10]]
+        summary['quantities'] = [stamped(r) for r in self.normalize_markets(quantities_data, 'market/groups/11,12,51,52,99')[:10]]
         
         return summary
     
+    @tracing.traced('bvmt.search_stock_by_ticker')
     def search_stock_by_ticker(self, ticker: str) -> Optional[Dict]:
         """
         Recherche une action par son ticker
@@ -199,6 +352,7 @@ class BVMTService:
         
         return None
     
+    @tracing.traced('bvmt.get_stock_detailed_info')
     def get_stock_detailed_info(self, isin: str) -> Dict:
         """
         Récupère toutes les informations détaillées d'une action
@@ -228,18 +382,27 @@ class BVMTService:
         
         return result
 
+    @tracing.traced('bvmt.get_indices')
     def get_indices(self) -> Optional[Dict]:
         """
-        Récupère les indices TUNINDEX et TUNINDEX20
+        Récupère les indices TUNINDEX et TUNINDEX20 (cache partagé par le processus, 5 minutes)
         """
-        current_time = datetime.utcnow()
+        indices_data = indices_snapshot.get()
+        if indices_data:
+            return indices_data
 
-        # Vérifier si le cache est valide
-        if (self._indices_cache is not None and self._indices_cache_timestamp is not None and
-            current_time - self._indices_cache_timestamp < timedelta(seconds=self._indices_cache_ttl)):
-            logger.debug("Récupération des indices depuis le cache")
-            return self._indices_cache
+        # Si toujours pas de données, retourner un dictionnaire vide
+        logger.warning("Impossible de récupérer les indices")
+        return {
+            'indices': [],
+            'timestamp': datetime.utcnow().isoformat()
+        }
 
+    @tracing.traced('bvmt.fetch_indices')
+    def fetch_indices(self) -> Optional[Dict]:
+        """
+        Interroge l'API BVMT pour les indices TUNINDEX et TUNINDEX20
+        """
         logger.debug("Récupération des indices depuis l'API BVMT")
 
         # Récupérer les données TUNINDEX (market data)
@@ -252,6 +415,16 @@ class BVMTService:
         tunindex_history = self._make_request(f'history/{TUNINDEX_ISIN}')
         tunindex20_history = self._make_request(f'history/{TUNINDEX20_ISIN}')
 
+        # Réponses inchangées : les indices déjà formatés sont réutilisés
+        sources = (tunindex_data, tunindex20_data, tunindex_history, tunindex20_history)
+        return derive('indices', 'indices', sources, lambda: self._format_indices(*sources))
+
+    @staticmethod
+    def _format_indices(tunindex_data: Optional[Dict], tunindex20_data: Optional[Dict],
+                        tunindex_history: Optional[Dict], tunindex20_history: Optional[Dict]) -> Optional[Dict]:
+        """
+        Formate les réponses TUNINDEX / TUNINDEX20 pour notre API
+        """
         # Formater les données pour notre API
         indices_data = {
             'indices': [],
@@ -301,24 +474,7 @@ class BVMTService:
                     index['history'] = tunindex20_history['indexHistorys'][:30]  # Limiter à 30 entrées
                     break
 
-        if indices_data['indices']:
-            # Mise à jour du cache
-            self._indices_cache = indices_data
-            self._indices_cache_timestamp = current_time
-
-            return indices_data
-
-        # En cas d'échec, retourner le cache s'il existe
-        if self._indices_cache:
-            logger.debug("Récupération des indices depuis le cache (fallback)")
-            return self._indices_cache
-
-        # Si toujours pas de données, retourner un dictionnaire vide
-        logger.warning("Impossible de récupérer les indices")
-        return {
-            'indices': [],
-            'timestamp': datetime.utcnow().isoformat()
-        }
+        return indices_data if indices_data['indices'] else None
 
     def get_index_history(self, isin: str) -> Optional[Dict]:
         """
@@ -334,7 +490,18 @@ class BVMTService:
 
     def get_order_book(self, isin: str) -> Optional[Dict]:
         """
-        Récupère le carnet d'ordre pour une action donnée via son ISIN
+        Récupère le carnet d'ordre pour une action donnée via son ISIN (relevé pour l'archive de séance)
         """
+        from .session_archive import get_session_recorder
+        recorder = get_session_recorder()
+        if recorder.replayed_books is not None:
+            # Rejeu d'une séance archivée : carnet rejoué le plus récent
+            return recorder.replayed_books.get(isin)
         endpoint = f"limits/{isin}"
-        return self._make_request(endpoint)
+        book = self._make_request(endpoint)
+        recorder.record_order_book(isin, book)
+        return book
+
+
+# Indices partagés par le processus (en cas d'échec, la dernière valeur reste servie)
+indices_snapshot = warm_start.register('indices', lambda: BVMTService().fetch_indices(), ttl=5 * 60)
@@ -0,0 +1,218 @@
+"""
+Caches LRU bornés en mémoire, partageant un budget global
+
+Chaque cache nommé reçoit une part du budget CACHE_MEMORY_MB proportionnelle à son poids. La taille
+de chaque entrée est estimée en octets à l'insertion ; au-delà de sa part (ou de `max_entries`),
+un cache évince ses entrées les moins récemment utilisées. Les entrées expirées (`ttl`) comptent
+comme absentes mais restent disponibles via `get_stale` jusqu'à leur éviction.
+"""
+import logging
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+_caches: Dict[str, 'LRUCache'] = {}
+_caches_lock = threading.Lock()
+
+_MISSING = object()
+
+
+def memory_budget() -> int:
+    return int(float(os.getenv('CACHE_MEMORY_MB', 256)) * 1024 * 1024)
+
+
+def sizeof(value: Any, _depth: int = 0) -> int:
+    """
+    Estimation de l'empreinte mémoire d'une valeur (tableaux NumPy, conteneurs et objets parcourus)
+    """
+    if isinstance(value, (str, bytes, bytearray, int, float, bool)) or value is None:
+        return sys.getsizeof(value)
+    # Tableaux NumPy et objets qui déclarent leur taille (sans importer NumPy au démarrage)
+    nbytes = getattr(value, 'nbytes', None)
+    if isinstance(nbytes, int):
+        return nbytes + 112
+    if _depth > 6:
+        return sys.getsizeof(value)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(sizeof(k, _depth + 1) + sizeof(v, _depth + 1) for k, v in value.items())
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return sys.getsizeof(value) + sum(sizeof(v, _depth + 1) for v in value)
+    if hasattr(value, '__dict__'):
+        return sys.getsizeof(value) + sizeof(vars(value), _depth + 1)
+    return sys.getsizeof(value)
+
+
+class LRUCache:
+    """
+    Cache LRU thread-safe avec comptage des octets, expiration et statistiques
+    """
+
+    def __init__(self, name: str, weight: float = 1.0, ttl: Optional[float] = None,
+                 max_entries: Optional[int] = None, sizer: Callable[[Any], int] = sizeof):
+        self.name = name
+        self.weight = weight
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = 0
+        self.sizer = sizer
+        self._entries: OrderedDict = OrderedDict()  # clé -> (valeur, octets, instant d'insertion)
+        self._lock = threading.RLock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def _expired(self, inserted_at: float, ttl: Optional[float]) -> bool:
+        ttl = self.ttl if ttl is None else ttl
+        return ttl is not None and time.monotonic() - inserted_at >= ttl
+
+    def get(self, key: Hashable, default: Any = None, ttl: Optional[float] = None) -> Any:
+        """
+        Valeur en cache non expirée (`ttl` remplace celui du cache pour cette lecture)
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if not self._expired(entry[2], ttl):
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[0]
+                self.expirations += 1
+            self.misses += 1
+            return default
+
+    def get_stale(self, key: Hashable, default: Any = None) -> Any:
+        """
+        Valeur en cache même expirée (repli quand la source est indisponible) ; sans effet sur les statistiques
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry[0] if entry is not None else default
+
+    def age(self, key: Hashable) -> Optional[float]:
+        with self._lock:
+            entry = self._entries.get(key)
+            return time.monotonic() - entry[2] if entry is not None else None
+
+    def set(self, key: Hashable, value: Any, size: Optional[int] = None) -> bool:
+        """
+        Insère une valeur ; retourne False si elle dépasse à elle seule la part du cache
+        """
+        size = size if size is not None else self.sizer(value)
+        with self._lock:
+            self._discard(key)
+            if self.max_bytes and size > self.max_bytes:
+                return False
+            self._entries[key] = (value, size, time.monotonic())
+            self.bytes += size
+            self._evict()
+            return True
+
+    def reweigh(self, key: Hashable) -> None:
+        """
+        Recalcule la taille d'une entrée dont la valeur a grossi depuis son insertion (mémos construits à la
+        demande), sans changer sa date d'insertion ni sa place LRU
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return
+            size = self.sizer(entry[0])
+            if size != entry[1]:
+                self._entries[key] = (entry[0], size, entry[2])
+                self.bytes += size - entry[1]
+                self._evict()
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            self._discard(key)
+            return entry[0] if entry is not None else default
+
+    def _discard(self, key: Hashable) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.bytes -= entry[1]
+
+    def _evict(self) -> None:
+        while self._entries and ((self.max_bytes and self.bytes > self.max_bytes)
+                                 or (self.max_entries and len(self._entries) > self.max_entries)):
+            _, (_, size, _) = self._entries.popitem(last=False)
+            self.bytes -= size
+            self.evictions += 1
+
+    def resize(self, max_bytes: int) -> None:
+        with self._lock:
+            self.max_bytes = max_bytes
+            self._evict()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def keys(self) -> list:
+        with self._lock:
+            return list(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self.get_stale(key, _MISSING) is not _MISSING
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'bytes': self.bytes,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': round(self.hits / lookups, 4) if lookups else None,
+            'evictions': self.evictions,
+            'expirations': self.expirations
+        }
+
+
+def _rebalance() -> None:
+    """Répartit le budget global entre les caches au prorata de leur poids"""
+    total_weight = sum(c.weight for c in _caches.values()) or 1.0
+    budget = memory_budget()
+    for cache in _caches.values():
+        cache.resize(int(budget * cache.weight / total_weight))
+
+
+def get_cache(name: str, weight: float = 1.0, ttl: Optional[float] = None,
+              max_entries: Optional[int] = None, sizer: Callable[[Any], int] = sizeof) -> LRUCache:
+    """
+    Crée un cache nommé rattaché au budget global (un nouveau cache du même nom remplace le précédent)
+    """
+    cache = LRUCache(name, weight=weight, ttl=ttl, max_entries=max_entries, sizer=sizer)
+    with _caches_lock:
+        _caches[name] = cache
+        _rebalance()
+    metrics.register_cache(name, cache.stats)
+    return cache
+
+
+def report() -> Dict:
+    """
+    Statistiques de tous les caches du processus et occupation du budget global
+    """
+    with _caches_lock:
+        caches = dict(_caches)
+    stats = {name: cache.stats() for name, cache in sorted(caches.items())}
+    return {
+        'budget_bytes': memory_budget(),
+        'used_bytes': sum(s['bytes'] for s in stats.values()),
+        'caches': stats
+    }
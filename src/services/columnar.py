@@ -0,0 +1,107 @@
+"""
+Format binaire en colonnes des séries de graphiques (alternative au JSON, par négociation de contenu)
+
+Disposition (little-endian, toutes les colonnes alignées sur 4 octets) :
+
+    en-tête   magic 'ATLC' | version u8 | nombre de colonnes u8 | taille des métadonnées u16 | lignes u32
+    méta      JSON UTF-8 (isin, période, résumé...), complété par des espaces jusqu'à un multiple de 4
+    colonnes  pour chacune : type u8 ('f' float32, 'i' int32) | longueur du nom u8 | nom, complété à 4 octets
+    données   les colonnes l'une après l'autre, `lignes` valeurs de 4 octets chacune
+
+Les tampons NumPy sont recopiés tels quels dans le corps de la réponse (aucune conversion valeur par
+valeur) ; côté navigateur chaque colonne se lit directement comme Float32Array / Int32Array.
+"""
+import json
+import struct
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+MIMETYPE = 'application/vnd.atlas.columnar'
+MAGIC = b'ATLC'
+VERSION = 1
+
+_HEADER = struct.Struct('<4sBBHI')
+_DTYPES = {'f': np.dtype('<f4'), 'i': np.dtype('<i4')}
+
+
+def _pad(data: bytes, fill: bytes = b'\0') -> bytes:
+    return data + fill * (-len(data) % 4)
+
+
+def as_column(values, kind: str = 'f') -> np.ndarray:
+    """
+    Colonne float32 ('f') ou int32 ('i') little-endian contiguë (sans copie si c'est déjà le cas)
+    """
+    return np.ascontiguousarray(values, dtype=_DTYPES[kind])
+
+
+def encode(columns: Dict[str, np.ndarray], meta: Optional[Dict] = None) -> bytes:
+    """
+    Sérialise des colonnes de même longueur (déjà float32/int32, sinon converties) et leurs métadonnées
+    """
+    arrays = []
+    for name, values in columns.items():
+        kind = 'i' if np.asarray(values).dtype.kind in 'iu' else 'f'
+        arrays.append((name.encode('utf-8'), kind, as_column(values, kind)))
+    rows = len(arrays[0][2]) if arrays else 0
+    if any(len(a) != rows for _, _, a in arrays):
+        raise ValueError("Les colonnes doivent avoir la même longueur")
+    meta_bytes = _pad(json.dumps(meta or {}, separators=(',', ':'), ensure_ascii=False).encode('utf-8'), b' ')
+    if len(meta_bytes) > 0xFFFF:
+        raise ValueError("Métadonnées trop volumineuses")
+    parts = [_HEADER.pack(MAGIC, VERSION, len(arrays), len(meta_bytes), rows), meta_bytes]
+    parts.extend(_pad(bytes((ord(kind), len(name))) + name) for name, kind, _ in arrays)
+    # Les tampons des tableaux sont joints directement au corps
+    parts.extend(memoryview(a) for _, _, a in arrays)
+    return b''.join(parts)
+
+
+def decode(data: bytes) -> Tuple[Dict, Dict[str, np.ndarray]]:
+    """
+    (métadonnées, colonnes) d'un corps binaire ; les colonnes sont des vues sur `data`
+    """
+    magic, version, count, meta_len, rows = _HEADER.unpack_from(data, 0)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("Format en colonnes non reconnu")
+    offset = _HEADER.size
+    meta = json.loads(bytes(data[offset:offset + meta_len]).decode('utf-8') or '{}')
+    offset += meta_len
+    descriptors = []
+    for _ in range(count):
+        kind, name_len = chr(data[offset]), data[offset + 1]
+        descriptors.append((bytes(data[offset + 2:offset + 2 + name_len]).decode('utf-8'), kind))
+        offset += 2 + name_len + (-(2 + name_len) % 4)
+    columns = {}
+    for name, kind in descriptors:
+        columns[name] = np.frombuffer(data, dtype=_DTYPES[kind], count=rows, offset=offset)
+        offset += rows * 4
+    return meta, columns
+
+
+def epoch_days(timestamps: np.ndarray) -> np.ndarray:
+    """
+    Jours depuis le 1970-01-01 (int32) de timestamps en secondes epoch UTC
+    """
+    return (np.asarray(timestamps, dtype=np.int64) // 86400).astype('<i4')
+
+
+def wants_columnar(request) -> bool:
+    """
+    Vrai si la requête Flask demande le format en colonnes (format=columnar ou en-tête Accept) ;
+    JSON reste le format par défaut, y compris pour Accept: */*
+    """
+    requested = (request.args.get('format') or '').lower()
+    if requested:
+        return requested in ('columnar', 'binary')
+    return request.accept_mimetypes.best_match(['application/json', MIMETYPE]) == MIMETYPE
+
+
+def response(body: bytes):
+    """
+    Réponse Flask d'un corps en colonnes
+    """
+    from flask import Response
+    resp = Response(body, mimetype=MIMETYPE)
+    resp.headers['Vary'] = 'Accept'
+    return resp
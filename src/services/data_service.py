@@ -1,14 +1,37 @@
 """
 Service pour la gestion des données en base MongoDB
 """
-from datetime import datetime, timedelta
-from typing import Dict, List, Optional
+import contextvars
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Iterable, List, Optional, Tuple
 
-from .bvmt_service import BVMTService
+from .bvmt_service import BVMTService, stamped
+from . import market_feed, rate_limiter, tracing, warm_start
+from .market_breadth import get_market_breadth
+from .anomalies import get_anomaly_detector
+from .snapshot_history import get_snapshot_history, iso_utc
+from .stock_index import DEFAULT_SORT, StockIndex, get_stock_index
 import logging
 
 logger = logging.getLogger(__name__)
 
+
+def _fetch_all_stocks() -> Optional[list]:
+    bvmt_service = BVMTService()
+    quantities_data = bvmt_service.get_market_quantities()
+    if not quantities_data or 'markets' not in quantities_data:
+        return None
+    # Réponse inchangée : la même liste est retournée et le snapshot n'est pas republié
+    return bvmt_service.normalize_markets(quantities_data, 'market/groups/11,12,51,52,99')
+
+
+# Snapshot du marché : frais 15 s par défaut, puis servi pendant son rafraîchissement
+market_snapshot = warm_start.register('market_snapshot', _fetch_all_stocks,
+                                      ttl=float(os.getenv('SNAPSHOT_TTL', 15)),
+                                      on_update=market_feed.publish)
+
 class DataService:
     """
     Service pour gérer les données en mémoire depuis l'API BVMT
@@ -16,47 +39,219 @@ class DataService:
     def __init__(self):
         self.bvmt_service = BVMTService()
 
+    def snapshot(self) -> list:
+        """
+        Snapshot partagé du marché, en lecture seule : les lignes inchangées d'un rafraîchissement
+        à l'autre sont les mêmes objets
+        """
+        return market_snapshot.get() or []
+
+    def snapshot_as_of(self, as_of: float) -> Tuple[float, list]:
+        """
+        (date de la version, lignes) du snapshot du marché en vigueur à `as_of` (secondes epoch), reconstruit
+        depuis l'historique des instantanés ; LookupError si cette date précède la fenêtre de rétention
+        """
+        # Le snapshot courant est enregistré avant d'interroger l'historique
+        self.snapshot()
+        found = get_snapshot_history().as_of(as_of)
+        if found is None:
+            raise LookupError(f"Aucun instantané conservé à {iso_utc(as_of)}")
+        return found
+
+    @tracing.traced('data.get_all_stocks')
     def get_all_stocks(self) -> list:
         """
-        Récupère toutes les actions depuis l'API BVMT
+        Récupère toutes les actions depuis l'API BVMT (snapshot partagé, rafraîchi en arrière-plan)
         """
-        quantities_data = self.bvmt_service.get_market_quantities()
-        if not quantities_data or 'markets' not in quantities_data:
-            return []
-        return [self.bvmt_service.normalize_stock_data(stock) for stock in quantities_data['markets']]
+        # Copies : les routes complètent les dictionnaires retournés
+        stocks = self.snapshot()
+        updated_at = market_snapshot.updated_at
+        return [stamped(stock, updated_at) for stock in stocks]
+
+    @tracing.traced('data.query_stocks')
+    def query_stocks(self, sort: str = DEFAULT_SORT, order: str = 'asc', limit: int = 20,
+                     cursor: Optional[str] = None, page: Optional[int] = None,
+                     filters: Optional[dict] = None, as_of: Optional[float] = None) -> dict:
+        """
+        Page d'actions triée et filtrée via les index du snapshot courant, ou du snapshot en vigueur
+        à `as_of` (ValueError si un paramètre est invalide, LookupError si as_of précède la rétention)
+        """
+        if as_of is None:
+            index, updated_at = get_stock_index(self.snapshot()), market_snapshot.updated_at
+        else:
+            updated_at, stocks = self.snapshot_as_of(as_of)
+            index = StockIndex(stocks)
+        result = index.page(sort, order, limit, cursor=cursor, page=page, filters=filters)
+        # Seules les lignes de la page sont copiées
+        page_data = {'data': [stamped(stock, updated_at) for stock in result['rows']],
+                     'pagination': result['pagination']}
+        if as_of is not None:
+            page_data['snapshot_at'] = iso_utc(updated_at)
+        return page_data
+
+    @tracing.traced('data.get_stocks_batch')
+    def get_stocks_batch(self, tickers: List[str], include: Iterable[str] = (),
+                         max_workers: Optional[int] = None, max_upstream: Optional[int] = None) -> dict:
+        """
+        Cotations de plusieurs actions résolues sur un même snapshot, avec leur historique et/ou leurs données
+        intraday (include) servis depuis les caches. Les absents sont récupérés en parallèle en priorité
+        poller (au plus BATCH_MAX_WORKERS appels simultanés), dans la limite de BATCH_MAX_UPSTREAM appels amont
+        par requête ; au-delà, la dernière valeur connue (ou None) est servie et l'entrée listée dans `deferred`.
+        """
+        include = set(include)
+        by_ticker = {(s.get('ticker') or '').upper(): s for s in self.snapshot()}
+        stocks, not_found = [], []
+        for ticker in dict.fromkeys(t.strip().upper() for t in tickers if t.strip()):
+            stock = by_ticker.get(ticker)
+            if stock is None:
+                not_found.append(ticker)
+            else:
+                stocks.append(stamped(stock, market_snapshot.updated_at))
+
+        misses = []
+        for stock in stocks:
+            for name in ('history', 'intraday'):
+                if name in include and stock.get('isin'):
+                    stock[name] = self._cached(name, stock['isin'])
+                    if stock[name] is None:
+                        misses.append((stock, name))
+
+        max_upstream = max_upstream if max_upstream is not None else int(os.getenv('BATCH_MAX_UPSTREAM', 10))
+        fetched, deferred = misses[:max_upstream], misses[max_upstream:]
+        if fetched:
+            fetchers = {'history': self._get_history, 'intraday': self._get_intraday}
+            max_workers = max_workers or int(os.getenv('BATCH_MAX_WORKERS', 8))
+            # Priorité poller : les requêtes d'une seule action passent avant le remplissage d'une liste de suivi.
+            # Chaque tâche reçoit une copie du contexte (priorité du limiteur, comptage des appels amont)
+            with rate_limiter.priority('poller'), \
+                    ThreadPoolExecutor(max_workers=min(max_workers, len(fetched))) as pool:
+                futures = [pool.submit(contextvars.copy_context().run, fetchers[name], stock['isin'])
+                           for stock, name in fetched]
+                for (stock, name), future in zip(fetched, futures):
+                    try:
+                        stock[name] = future.result()
+                    except Exception as e:
+                        logger.error(f"Erreur lors de la récupération de {name} pour {stock['isin']}: {e}")
+                        stock[name] = None
+        for stock, name in deferred:
+            stock[name] = self._cached(name, stock['isin'], stale=True)
+        return {'stocks': stocks, 'not_found': not_found,
+                'deferred': [{'ticker': stock.get('ticker'), 'include': name} for stock, name in deferred]}
+
+    @staticmethod
+    def _cached(name: str, isin: str, stale: bool = False) -> Optional[dict]:
+        """Historique ou données intraday d'un ISIN depuis les caches, sans appel amont (None si absents)"""
+        if name == 'history':
+            from .history_store import get_history_store
+            history = get_history_store().cached(isin, stale=stale)
+            return history.source if history is not None else None
+        from .intraday import get_intraday_store
+        buffer = get_intraday_store().cached(isin, stale=stale)
+        if buffer is None:
+            return None
+        with buffer.lock:
+            return {**buffer.summary(), 'intradays': buffer.point_list()}
+
+    def _get_history(self, isin: str) -> Optional[dict]:
+        from .history_store import get_history_store
+        history = get_history_store().get(isin)
+        return history.source if history is not None else None
+
+    def _get_intraday(self, isin: str) -> Optional[dict]:
+        from .intraday import get_intraday_store
+        buffer = get_intraday_store().get(isin)
+        if buffer is None:
+            return None
+        with buffer.lock:
+            return {**buffer.summary(), 'intradays': buffer.point_list()}
 
+    @tracing.traced('data.get_stock_by_ticker')
     def get_stock_by_ticker(self, ticker: str) -> Optional[dict]:
         """
         Récupère une action par son ticker depuis l'API BVMT
         """
-        for stock in self.get_all_stocks():
+        for stock in self.snapshot():
             if stock.get('ticker', '').upper() == ticker.upper():
-                return stock
+                return stamped(stock, market_snapshot.updated_at)
         return None
 
+    @tracing.traced('data.get_stock_by_isin')
     def get_stock_by_isin(self, isin: str) -> Optional[dict]:
         """
         Récupère une action par son ISIN depuis l'API BVMT
         """
-        for stock in self.get_all_stocks():
+        for stock in self.snapshot():
             if stock.get('isin', '') == isin:
-                return stock
+                return stamped(stock, market_snapshot.updated_at)
         return None
 
+    @tracing.traced('data.search_stocks')
     def search_stocks(self, query: str, limit: int = 20) -> list:
         """
         Recherche des actions par nom ou ticker
         """
         query = query.lower()
-        results = [s for s in self.get_all_stocks() if query in s.get('ticker', '').lower() or query in s.get('stock_name', '').lower() or query in s.get('arab_name', '').lower()]
-        return results[:limit]
+        results = [s for s in self.snapshot() if query in s.get('ticker', '').lower() or query in s.get('stock_name', '').lower() or query in s.get('arab_name', '').lower()]
+        return [stamped(s, market_snapshot.updated_at) for s in results[:limit]]
 
-    def get_market_summary(self) -> dict:
+    @tracing.traced('data.get_market_movers')
+    def get_market_movers(self, kind: str, as_of: float) -> Tuple[float, list]:
         """
-        Récupère un résumé du marché depuis l'API BVMT
+        (date de la version, lignes) des hausses, baisses ou volumes (kind: rises, falls, volumes) du snapshot
+        en vigueur à `as_of`
         """
+        snapshot_at, stocks = self.snapshot_as_of(as_of)
+        if kind == 'rises':
+            selected = sorted((s for s in stocks if (s.get('change_percent') or 0) > 0),
+                              key=lambda s: s.get('change_percent') or 0, reverse=True)
+        elif kind == 'falls':
+            selected = sorted((s for s in stocks if (s.get('change_percent') or 0) < 0),
+                              key=lambda s: s.get('change_percent') or 0)
+        else:
+            selected = sorted((s for s in stocks if (s.get('volume') or 0) > 0),
+                              key=lambda s: s.get('volume') or 0, reverse=True)
+        return snapshot_at, [stamped(s, snapshot_at) for s in selected]
+
+    def _market_summary_as_of(self, as_of: float) -> dict:
+        snapshot_at, all_stocks = self.snapshot_as_of(as_of)
+        gainers = sum(1 for s in all_stocks if (s.get('change') or 0) > 0)
+        losers = sum(1 for s in all_stocks if (s.get('change') or 0) < 0)
+        traded = sum(1 for s in all_stocks if (s.get('volume') or 0) > 0)
+        return {
+            # Date de la version servie, antérieure ou égale à la date demandée
+            'timestamp': datetime.fromtimestamp(snapshot_at, tz=timezone.utc),
+            'as_of': iso_utc(as_of),
+            'snapshot_at': iso_utc(snapshot_at),
+            'statistics': {
+                'total_stocks': len(all_stocks),
+                'gainers': gainers,
+                'losers': losers,
+                'unchanged': len(all_stocks) - gainers - losers,
+                'active_stocks': traded
+            },
+            **self._top_lists(all_stocks, snapshot_at)
+        }
+
+    @staticmethod
+    def _top_lists(all_stocks: list, updated_at: float) -> dict:
+        # Top 10 pour l'affichage
+        copy = lambda s: stamped(s, updated_at)
+        return {
+            'top_gainers': [copy(s) for s in sorted([s for s in all_stocks if s.get('change', 0) > 0], key=lambda x: x.get('change', 0), reverse=True)[:10]],
+            'top_losers': [copy(s) for s in sorted([s for s in all_stocks if s.get('change', 0) < 0], key=lambda x: x.get('change', 0))[:10]],
+            'most_active': [copy(s) for s in sorted([s for s in all_stocks if s.get('volume', 0) > 0], key=lambda x: x.get('volume', 0), reverse=True)[:10]]
+        }
+
+    @tracing.traced('data.get_market_summary')
+    def get_market_summary(self, as_of: Optional[float] = None) -> dict:
+        """
+        Récupère un résumé du marché depuis l'API BVMT, ou depuis le snapshot en vigueur à `as_of`
+        (LookupError si cette date précède la rétention)
+        """
+        if as_of is not None:
+            return self._market_summary_as_of(as_of)
         try:
-            all_stocks = self.get_all_stocks()
+            all_stocks = self.snapshot()
 
             # Récupérer les données de market/qtys pour le ratio ET pour calculer les inchangées
             qtys_data = self.bvmt_service.get_market_qtys_only()
@@ -88,11 +283,6 @@ class DataService:
             # Total stocks depuis groups
             total_stocks = len(all_stocks)
 
-            # Top 10 pour l'affichage
-            top_gainers = sorted([s for s in all_stocks if s.get('change', 0) > 0], key=lambda x: x.get('change', 0), reverse=True)[:10]
-            top_losers = sorted([s for s in all_stocks if s.get('change', 0) < 0], key=lambda x: x.get('change', 0))[:10]
-            most_active = sorted([s for s in all_stocks if s.get('volume', 0) > 0], key=lambda x: x.get('volume', 0), reverse=True)[:10]
-
             return {
                 'timestamp': datetime.utcnow(),
                 'statistics': {
@@ -103,14 +293,48 @@ class DataService:
                     'active_stocks_qtys': qtys_count,
                     'active_stocks_groups': groups_count
                 },
-                'top_gainers': top_gainers,
-                'top_losers': top_losers,
-                'most_active': most_active
+                **self._top_lists(all_stocks, market_snapshot.updated_at)
             }
         except Exception as e:
             logger.error(f"Erreur lors de la récupération du résumé de marché: {e}")
             return {}
 
+    @tracing.traced('data.get_market_breadth')
+    def get_market_breadth(self) -> dict:
+        """
+        Récupère les agrégats du marché par groupe de cotation
+        """
+        try:
+            self.snapshot()
+            return get_market_breadth().summary()
+        except Exception as e:
+            logger.error(f"Erreur lors du calcul des agrégats par groupe: {e}")
+            return {}
+
+    @tracing.traced('data.get_anomalies')
+    def get_anomalies(self, since: int = 0, anomaly_type: Optional[str] = None, limit: int = 50) -> dict:
+        """
+        Récupère les dernières anomalies de volume et de cours détectées sur les instantanés
+        """
+        try:
+            self.snapshot()
+            return get_anomaly_detector().summary(since, anomaly_type, limit)
+        except Exception as e:
+            logger.error(f"Erreur lors de la récupération des anomalies: {e}")
+            return {}
+
+    @tracing.traced('data.get_stock_history_window')
+    def get_stock_history_window(self, isin: str, period: Optional[str] = None, date_from: Optional[str] = None,
+                                 date_to: Optional[str] = None, days: Optional[int] = None,
+                                 columnar: bool = False) -> Optional[dict]:
+        """
+        Fenêtre de l'historique d'une action découpée dans l'historique en cache (None si indisponible,
+        ValueError si un paramètre est invalide)
+        """
+        from .history_store import get_history_store
+        return get_history_store().select(isin, period, date_from, date_to, days, columnar=columnar)
+
+    @tracing.traced('data.get_stock_history')
     def get_stock_history(self, isin: str, days: int = 30) -> dict:
         """
         Récupère l'historique d'une action depuis l'API BVMT
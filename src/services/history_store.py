@@ -0,0 +1,358 @@
+"""
+Stockage en mémoire des historiques de séances sous forme de colonnes NumPy
+"""
+import contextvars
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+from . import metrics
+from .bvmt_service import BVMTService
+from .cache import get_cache, sizeof
+
+logger = logging.getLogger(__name__)
+
+_SEANCE_FORMATS = ('%Y-%m-%d', '%d/%m/%Y', '%Y-%m-%dT%H:%M:%S', '%Y-%m-%d %H:%M:%S', '%d-%m-%Y')
+
+
+# Mois abrégés des dates BVMT en français ("26 sept. 2025", "3 févr. 25")
+_FRENCH_MONTHS = (('janv', 1), ('févr', 2), ('fevr', 2), ('mars', 3), ('avr', 4), ('mai', 5), ('juin', 6),
+                  ('juil', 7), ('août', 8), ('aout', 8), ('sept', 9), ('oct', 10), ('nov', 11), ('déc', 12),
+                  ('dec', 12))
+
+# Durée des périodes acceptées par les endpoints d'historique (ytd et all sont traités à part)
+PERIOD_DAYS = {'1d': 1, '1w': 7, '1m': 31, '3m': 92, '6m': 183, '1y': 366, '2y': 731, '3y': 1096, '5y': 1827, '10y': 3653}
+
+
+def _parse_french_date(value: str) -> Optional[int]:
+    parts = value.split()
+    if len(parts) != 3 or not parts[0].isdigit() or not parts[2].isdigit():
+        return None
+    month_text = parts[1].lower()
+    month = next((number for prefix, number in _FRENCH_MONTHS if month_text.startswith(prefix)), None)
+    if month is None:
+        return None
+    year = int(parts[2])
+    year = year + 2000 if year < 100 else year
+    try:
+        return int(datetime(year, month, int(parts[0]), tzinfo=timezone.utc).timestamp())
+    except ValueError:
+        return None
+
+
+@lru_cache(maxsize=16384)
+def _parse_seance_str(value: str) -> Optional[int]:
+    for fmt in _SEANCE_FORMATS:
+        try:
+            return int(datetime.strptime(value[:19], fmt).replace(tzinfo=timezone.utc).timestamp())
+        except ValueError:
+            continue
+    french = _parse_french_date(value)
+    if french is not None:
+        return french
+    try:
+        from dateutil import parser
+        parsed = parser.parse(value)
+        if parsed.tzinfo is None:
+            parsed = parsed.replace(tzinfo=timezone.utc)
+        return int(parsed.timestamp())
+    except (ValueError, OverflowError, ImportError):
+        return None
+
+
+def parse_seance(value) -> Optional[int]:
+    """
+    Convertit une date de séance BVMT (chaîne ou timestamp) en secondes epoch UTC
+    """
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        # Les timestamps en millisecondes sont ramenés en secondes
+        return int(value / 1000) if value > 1e11 else int(value)
+    return _parse_seance_str(str(value))
+
+
+def period_start(period: Optional[str], end: int) -> Optional[int]:
+    """
+    Début inclus (secondes epoch UTC) d'une période ('1d', '1m', '1y', 'ytd', ... ou 'all') se terminant à
+    `end` ; None pour 'all'. Lève ValueError pour une période inconnue.
+    """
+    if not period or period == 'all':
+        return None
+    if period == 'ytd':
+        year = datetime.fromtimestamp(end, tz=timezone.utc).year
+        return int(datetime(year, 1, 1, tzinfo=timezone.utc).timestamp())
+    days = PERIOD_DAYS.get(period)
+    if days is None:
+        raise ValueError(f"Période non supportée: {period} (valeurs possibles: {', '.join(PERIOD_DAYS)}, ytd, all)")
+    # Borne exclusive : '1d' ne retient que la séance de `end`, pas celle de la veille (séances à minuit)
+    return end - days * 86400 + 1
+
+
+def _iso_date(ts) -> str:
+    return datetime.fromtimestamp(int(ts), tz=timezone.utc).strftime('%Y-%m-%d')
+
+
+def _num(value) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+class StockHistory:
+    """
+    Historique d'une valeur trié par date, une colonne NumPy par champ
+    """
+
+    FIELDS = ('open', 'high', 'low', 'close', 'volume')
+
+    def __init__(self, isin: str, timestamps: np.ndarray, columns: Dict[str, np.ndarray], records: list):
+        self.isin = isin
+        self.timestamps = timestamps
+        self.columns = columns
+        self.records = records
+        self._records_bytes = None
+        self._memo_bytes = 0
+        self._json_columns = None
+        self._wire_columns = None
+        # Réponse amont d'origine (la même tant que l'amont renvoie un corps identique)
+        self.source = None
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    @property
+    def close(self) -> np.ndarray:
+        return self.columns['close']
+
+    @property
+    def nbytes(self) -> int:
+        # Les lignes brutes dominent l'empreinte : estimées une fois
+        if self._records_bytes is None:
+            self._records_bytes = sizeof(self.records)
+        return (self.timestamps.nbytes + sum(c.nbytes for c in self.columns.values()) + self._records_bytes
+                + self._memo_bytes)
+
+    def window(self, start: Optional[int] = None, end: Optional[int] = None) -> slice:
+        """
+        Positions des séances comprises entre `start` et `end` inclus (secondes epoch), par dichotomie
+        """
+        lo = int(np.searchsorted(self.timestamps, start, side='left')) if start is not None else 0
+        hi = int(np.searchsorted(self.timestamps, end, side='right')) if end is not None else len(self)
+        return slice(lo, max(lo, hi))
+
+    def _columns_for_json(self) -> List[list]:
+        # Dates et colonnes converties une seule fois en listes Python (NaN -> None), puis découpées
+        if self._json_columns is None:
+            dates = [_iso_date(ts) for ts in self.timestamps]
+            self._json_columns = [dates] + [[None if v != v else v for v in self.columns[f].tolist()]
+                                            for f in self.FIELDS]
+            self._memo_bytes += sizeof(self._json_columns)
+        return self._json_columns
+
+    def rows(self, window: slice = slice(None)) -> List[Dict]:
+        """
+        Lignes {date, open, high, low, close, volume} de la fenêtre, construites depuis les colonnes
+        """
+        keys = ('date',) + self.FIELDS
+        return [dict(zip(keys, values)) for values in zip(*(c[window] for c in self._columns_for_json()))]
+
+    def wire_columns(self, window: slice = slice(None)) -> Dict[str, np.ndarray]:
+        """
+        Colonnes de la fenêtre au format binaire (jours epoch int32, cours et volume float32) : vues sur
+        des colonnes converties une seule fois
+        """
+        if self._wire_columns is None:
+            from .columnar import as_column, epoch_days
+            self._wire_columns = {'date': epoch_days(self.timestamps),
+                                  **{f: as_column(self.columns[f]) for f in self.FIELDS}}
+            self._memo_bytes += sum(c.nbytes for c in self._wire_columns.values())
+        return {name: column[window] for name, column in self._wire_columns.items()}
+
+    def select(self, period: Optional[str] = None, date_from=None, date_to=None,
+               days: Optional[int] = None, columnar: bool = False) -> Dict:
+        """
+        Fenêtre de l'historique par période (relative à la dernière séance), nombre de jours ou bornes
+        from/to (dates incluses) ; les bornes explicites l'emportent. Lève ValueError si un paramètre est invalide.
+        Avec `columnar`, les séances sont retournées en colonnes NumPy (clé columns) au lieu de lignes (history).
+        """
+        last = int(self.timestamps[-1]) if len(self) else 0
+        end = None
+        if date_to:
+            end = parse_seance(date_to)
+            if end is None:
+                raise ValueError(f"Date to invalide: {date_to}")
+            end += 86400 - 1
+        start = None
+        if date_from:
+            start = parse_seance(date_from)
+            if start is None:
+                raise ValueError(f"Date from invalide: {date_from}")
+        elif days is not None:
+            if days < 1:
+                raise ValueError(f"Paramètre days invalide: {days}")
+            start = (end if end is not None else last) - days * 86400 + 1
+        else:
+            start = period_start(period, end if end is not None else last)
+        if start is not None and end is not None and start > end:
+            raise ValueError("La date from doit précéder la date to")
+        window = self.window(start, end)
+        count = window.stop - window.start
+        selection = {
+            'isin': self.isin,
+            'period': 'custom' if date_from or days is not None else (period or 'all'),
+            'from': _iso_date(self.timestamps[window.start]) if count else None,
+            'to': _iso_date(self.timestamps[window.stop - 1]) if count else None,
+            'count': count
+        }
+        if columnar:
+            return {**selection, 'columns': self.wire_columns(window)}
+        return {**selection, 'history': self.rows(window)}
+
+    @classmethod
+    def from_payload(cls, isin: str, payload: Optional[Dict]) -> 'StockHistory':
+        rows = (payload or {}).get('history') or []
+        parsed = []
+        for row in rows:
+            ts = parse_seance(row.get('seance'))
+            if ts is None:
+                continue
+            close = row.get('close')
+            if close in (None, 0):
+                close = row.get('last')
+            parsed.append((ts, row.get('open'), row.get('high'), row.get('low'), close,
+                           row.get('volume', row.get('qty')), row))
+
+        parsed.sort(key=lambda r: r[0])
+        # Une seule ligne par séance (la dernière reçue l'emporte)
+        dedup = {}
+        for r in parsed:
+            dedup[r[0]] = r
+        parsed = [dedup[k] for k in sorted(dedup)]
+
+        timestamps = np.fromiter((r[0] for r in parsed), dtype=np.int64, count=len(parsed))
+        columns = {
+            field: np.fromiter((_num(r[i + 1]) for r in parsed), dtype=np.float64, count=len(parsed))
+            for i, field in enumerate(cls.FIELDS)
+        }
+        # Les séances sans cours d'ouverture/plus haut/plus bas reprennent la clôture
+        close = columns['close']
+        for field in ('open', 'high', 'low'):
+            col = columns[field]
+            missing = np.isnan(col) | (col == 0)
+            col[missing] = close[missing]
+        history = cls(isin, timestamps, columns, [r[6] for r in parsed])
+        history.source = payload
+        return history
+
+
+class HistoryStore:
+    """
+    Cache des historiques par ISIN avec expiration, borné par sa part du budget mémoire des caches
+    """
+
+    def __init__(self, bvmt_service: Optional[BVMTService] = None, ttl: Optional[int] = None,
+                 max_workers: int = 8):
+        self.bvmt_service = bvmt_service or BVMTService()
+        self.ttl = ttl if ttl is not None else int(os.getenv('HISTORY_CACHE_TTL', 15 * 60))
+        self.max_workers = max_workers
+        self._cache = get_cache('history', weight=4, ttl=self.ttl)
+
+    def get(self, isin: str) -> Optional[StockHistory]:
+        """
+        Retourne l'historique d'un ISIN, depuis le cache si possible
+        """
+        history = self._cache.get(isin)
+        if history is not None:
+            return history
+        return self._fetch(isin)
+
+    def cached(self, isin: str, stale: bool = False) -> Optional[StockHistory]:
+        """
+        Historique en cache d'un ISIN sans appel amont (frais uniquement, ou même expiré avec `stale`)
+        """
+        return self._cache.get_stale(isin) if stale else self._cache.get(isin)
+
+    def get_many(self, isins: Iterable[str]) -> Dict[str, StockHistory]:
+        """
+        Retourne les historiques de plusieurs ISIN, les absents du cache sont récupérés en parallèle
+        """
+        isins = list(dict.fromkeys(isins))
+        result = {}
+        missing = []
+        for isin in isins:
+            history = self._cache.get(isin)
+            if history is not None:
+                result[isin] = history
+            else:
+                missing.append(isin)
+        if missing:
+            # Chaque tâche reçoit une copie du contexte (comptage des appels amont par requête)
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, len(missing))) as pool:
+                futures = [pool.submit(contextvars.copy_context().run, self._fetch, isin) for isin in missing]
+                for isin, future in zip(missing, futures):
+                    history = future.result()
+                    if history is not None:
+                        result[isin] = history
+        return result
+
+    def _fetch(self, isin: str) -> Optional[StockHistory]:
+        payload = self.bvmt_service.get_stock_history(isin)
+        if payload is None:
+            # En cas d'échec on préfère servir une donnée expirée
+            return self._cache.get_stale(isin)
+        previous = self._cache.get_stale(isin)
+        if previous is not None and previous.source is payload:
+            # Réponse amont inchangée : l'historique déjà converti redevient frais
+            metrics.count_skipped('history_parse', 'history/{isin}')
+            history = previous
+        else:
+            history = StockHistory.from_payload(isin, payload)
+        self._cache.set(isin, history)
+        return history
+
+    def select(self, isin: str, *args, **kwargs) -> Optional[Dict]:
+        """
+        StockHistory.select sur l'historique en cache d'un ISIN (None s'il est indisponible) ; la taille de
+        l'entrée est réévaluée, les conversions mémorisées par la sélection comptant dans le budget du cache
+        """
+        history = self.get(isin)
+        if history is None:
+            return None
+        selection = history.select(*args, **kwargs)
+        self._cache.reweigh(isin)
+        return selection
+
+    def invalidate(self, isin: Optional[str] = None) -> None:
+        if isin is None:
+            self._cache.clear()
+        else:
+            self._cache.pop(isin)
+
+    def stats(self) -> Dict:
+        return self._cache.stats()
+
+    def __len__(self) -> int:
+        return len(self._cache)
+
+
+_history_store = None
+_history_store_lock = threading.Lock()
+
+
+def get_history_store() -> HistoryStore:
+    """
+    Retourne le cache d'historiques partagé par le processus
+    """
+    global _history_store
+    with _history_store_lock:
+        if _history_store is None:
+            _history_store = HistoryStore()
+        return _history_store
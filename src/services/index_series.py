@@ -0,0 +1,239 @@
+"""
+Séries des indices (historique des séances et intraday) servies aux graphiques du frontend
+
+Les réponses BVMT history/{isin} et intraday/{isin} sont converties en colonnes NumPy et mises en
+cache pour tous les clients (au plus un appel amont par série et par durée de validité). Les séries
+longues sont réduites au nombre de points affichables par l'algorithme LTTB (Largest-Triangle-
+Three-Buckets), qui conserve la forme de la courbe ; chaque réduction est mémorisée avec la série.
+"""
+import logging
+import os
+import threading
+from datetime import datetime, timezone
+from typing import Callable, Dict, Optional
+
+import numpy as np
+
+from . import metrics
+from .bvmt_service import BVMTService
+from .cache import get_cache
+from .history_store import parse_seance, period_start
+from .intraday import format_clock, parse_points
+
+logger = logging.getLogger(__name__)
+
+MAX_POINTS = 2000
+
+
+def _num(value) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def lttb(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """
+    Indices des `threshold` points retenus par Largest-Triangle-Three-Buckets (premier et dernier inclus)
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    x = x.astype(np.float64)
+    # Seaux intermédiaires de taille égale entre le premier et le dernier point
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    previous = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        # Point moyen du seau suivant (le dernier point pour le dernier seau)
+        next_end = edges[i + 2] if i + 2 < len(edges) else n
+        next_start = end if end < next_end else next_end - 1
+        avg_x, avg_y = x[next_start:next_end].mean(), y[next_start:next_end].mean()
+        # Aire du triangle (point retenu précédent, candidat, moyenne du seau suivant)
+        area = np.abs((x[previous] - avg_x) * (y[start:end] - y[previous])
+                      - (x[previous] - x[start:end]) * (avg_y - y[previous]))
+        previous = start + int(np.argmax(area)) if end > start else start
+        selected[i + 1] = previous
+    return selected
+
+
+class IndexSeries:
+    """
+    Série d'un indice : horodatages triés (secondes epoch pour l'historique, secondes depuis minuit
+    pour l'intraday), valeurs et colonnes annexes
+    """
+
+    def __init__(self, isin: str, kind: str, times: np.ndarray, values: np.ndarray,
+                 extra: Optional[Dict[str, np.ndarray]] = None, info: Optional[Dict] = None):
+        self.isin = isin
+        self.kind = kind
+        self.times = times
+        self.values = values
+        self.extra = extra or {}
+        self.info = info or {}
+        self.source = None
+        self._rendered: Dict[tuple, Dict] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.times)
+
+    @property
+    def nbytes(self) -> int:
+        return self.times.nbytes + self.values.nbytes + sum(c.nbytes for c in self.extra.values()) + 1024
+
+    @classmethod
+    def from_history(cls, isin: str, payload: Optional[Dict]) -> 'IndexSeries':
+        rows = (payload or {}).get('indexHistorys') or (payload or {}).get('history') or []
+        parsed = {}
+        for row in rows:
+            ts = parse_seance(row.get('sEANCE') or row.get('seance'))
+            value = _num(row.get('lAST', row.get('last', row.get('close'))))
+            if ts is None or not value > 0:
+                continue
+            # Une seule ligne par séance (la dernière reçue l'emporte)
+            parsed[ts] = (value, _num(row.get('oPEN', row.get('open'))), _num(row.get('hIGH', row.get('high'))),
+                          _num(row.get('lOW', row.get('low'))))
+        times = np.fromiter(sorted(parsed), dtype=np.int64, count=len(parsed))
+        columns = np.array([parsed[t] for t in times], dtype=np.float64).reshape(-1, 4)
+        return cls(isin, 'history', times, columns[:, 0].copy(),
+                   {'open': columns[:, 1].copy(), 'high': columns[:, 2].copy(), 'low': columns[:, 3].copy()})
+
+    @classmethod
+    def from_intraday(cls, isin: str, payload: Optional[Dict]) -> 'IndexSeries':
+        times, values, _ = parse_points(payload)
+        rows = (payload or {}).get('intradayDatas') or (payload or {}).get('intradays') or []
+        prev_close = next((_num(r.get('pREV_CLOSE', r.get('prev_close'))) for r in reversed(rows)
+                           if r.get('pREV_CLOSE', r.get('prev_close')) is not None), np.nan)
+        return cls(isin, 'intraday', times.astype(np.int64), values,
+                   info={'prev_close': None if np.isnan(prev_close) else prev_close})
+
+    def _window(self, start: Optional[int]) -> slice:
+        return slice(int(np.searchsorted(self.times, start, side='left')) if start is not None else 0, len(self.times))
+
+    def render(self, points: int, period: Optional[str] = None, columnar: bool = False):
+        """
+        Série réduite à `points` points au plus (mémorisée par période, nombre de points et format) :
+        dictionnaire JSON, ou corps binaire en colonnes si `columnar`
+        """
+        key = (points, period, columnar)
+        with self._lock:
+            rendered = self._rendered.get(key)
+            if rendered is not None:
+                return rendered
+        start = period_start(period, int(self.times[-1])) if self.kind == 'history' and len(self) else None
+        window = self._window(start)
+        times, values = self.times[window], self.values[window]
+        selected = lttb(times, values, points)
+        extra = {name: column[window][selected] for name, column in self.extra.items()}
+        times, values = times[selected], values[selected]
+        header = {'isin': self.isin, 'count': len(times), 'source_count': int(window.stop - window.start),
+                  **self.summary()}
+
+        if columnar:
+            from .columnar import encode, epoch_days
+            first = {'date': epoch_days(times)} if self.kind == 'history' else {'time': times.astype('<i4')}
+            rendered = encode({**first, 'value': values, **extra}, header)
+        elif self.kind == 'history':
+            dates = [datetime.fromtimestamp(int(t), tz=timezone.utc).strftime('%Y-%m-%d') for t in times]
+            series = [{'date': d, 'value': float(v), **{k: (None if np.isnan(c[i]) else float(c[i]))
+                                                        for k, c in extra.items()}}
+                      for i, (d, v) in enumerate(zip(dates, values))]
+            rendered = {**header, 'points': series}
+        else:
+            series = [{'time': format_clock(int(t)), 'value': float(v)} for t, v in zip(times, values)]
+            rendered = {**header, 'points': series}
+        with self._lock:
+            if len(self._rendered) >= 32:
+                self._rendered.clear()
+            self._rendered[key] = rendered
+        return rendered
+
+    def summary(self) -> Dict:
+        if not len(self):
+            return {}
+        last = float(self.values[-1])
+        if self.kind == 'history':
+            previous = float(self.values[-2]) if len(self) > 1 else None
+            return {'first_date': datetime.fromtimestamp(int(self.times[0]), tz=timezone.utc).strftime('%Y-%m-%d'),
+                    'last_date': datetime.fromtimestamp(int(self.times[-1]), tz=timezone.utc).strftime('%Y-%m-%d'),
+                    'last': last,
+                    'change_percent': round((last / previous - 1) * 100, 4) if previous else None}
+        prev_close = self.info.get('prev_close')
+        return {'last': last, 'last_time': format_clock(int(self.times[-1])), 'prev_close': prev_close,
+                'open': float(self.values[0]), 'high': float(self.values.max()), 'low': float(self.values.min()),
+                'change': round(last - prev_close, 4) if prev_close else None,
+                'change_percent': round((last / prev_close - 1) * 100, 4) if prev_close else None}
+
+
+class IndexSeriesStore:
+    """
+    Séries d'indices partagées par le processus : historique frais INDEX_HISTORY_TTL secondes,
+    intraday INTRADAY_POLL_INTERVAL secondes ; la dernière série connue reste servie si l'amont échoue
+    """
+
+    def __init__(self, bvmt_service: Optional[BVMTService] = None, history_ttl: Optional[float] = None,
+                 intraday_ttl: Optional[float] = None):
+        self.bvmt_service = bvmt_service or BVMTService()
+        self.ttls = {
+            'history': history_ttl if history_ttl is not None else float(os.getenv('INDEX_HISTORY_TTL', 15 * 60)),
+            'intraday': intraday_ttl if intraday_ttl is not None else float(os.getenv('INTRADAY_POLL_INTERVAL', 10))
+        }
+        self._cache = get_cache('index_series', weight=0.5, sizer=lambda s: s.nbytes)
+        self._locks: Dict[tuple, threading.Lock] = {}
+        self._locks_lock = threading.Lock()
+
+    def _lock_for(self, key: tuple) -> threading.Lock:
+        with self._locks_lock:
+            return self._locks.setdefault(key, threading.Lock())
+
+    def _get(self, kind: str, isin: str, fetch: Callable[[str], Optional[Dict]],
+             build: Callable[[str, Optional[Dict]], IndexSeries]) -> Optional[IndexSeries]:
+        key = (kind, isin)
+        series = self._cache.get(key, ttl=self.ttls[kind])
+        if series is not None:
+            return series
+        # Un seul appel amont par série, même si plusieurs clients la demandent en même temps
+        with self._lock_for(key):
+            series = self._cache.get(key, ttl=self.ttls[kind])
+            if series is not None:
+                return series
+            previous = self._cache.get_stale(key)
+            payload = fetch(isin)
+            if payload is None:
+                return previous
+            if previous is not None and previous.source is payload:
+                # Réponse amont inchangée : la série et ses réductions sont conservées
+                metrics.count_skipped('index_series', f'{kind}/{{isin}}')
+                series = previous
+            else:
+                series = build(isin, payload)
+                series.source = payload
+            self._cache.set(key, series)
+            return series
+
+    def history(self, isin: str) -> Optional[IndexSeries]:
+        return self._get('history', isin, self.bvmt_service.get_index_history, IndexSeries.from_history)
+
+    def intraday(self, isin: str) -> Optional[IndexSeries]:
+        return self._get('intraday', isin, self.bvmt_service.get_index_intraday, IndexSeries.from_intraday)
+
+    def stats(self) -> Dict:
+        return self._cache.stats()
+
+
+_index_series_store = None
+_index_series_store_lock = threading.Lock()
+
+
+def get_index_series_store() -> IndexSeriesStore:
+    """
+    Retourne les séries d'indices partagées par le processus
+    """
+    global _index_series_store
+    with _index_series_store_lock:
+        if _index_series_store is None:
+            _index_series_store = IndexSeriesStore()
+        return _index_series_store
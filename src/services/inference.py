@@ -0,0 +1,432 @@
+"""
+Service d'inférence CPU : micro-batchs dynamiques, cache par empreinte du contenu et backends
+interchangeables (HuggingFace quantifié int8, ou petit modèle NumPy local)
+
+Les requêtes sont placées dans une file ; un thread par tâche forme des lots d'au plus
+`max_batch_size` textes en attendant au plus `max_wait_ms` après le premier, puis exécute le
+modèle une seule fois pour tout le lot.
+"""
+import hashlib
+import importlib.util
+import logging
+import os
+import queue
+import re
+import threading
+import time
+import unicodedata
+import zlib
+from concurrent.futures import Future
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from . import tracing
+from .cache import get_cache
+
+logger = logging.getLogger(__name__)
+
+SENTIMENT_LABELS = ('negative', 'neutral', 'positive')
+
+_TOKEN_RE = re.compile(r"[a-z0-9؀-ۿ]+")
+_SENTENCE_RE = re.compile(r'(?<=[.!?؟])\s+')
+
+
+def _tokens(text: str) -> List[str]:
+    text = unicodedata.normalize('NFKD', text.lower())
+    text = ''.join(c for c in text if not unicodedata.combining(c))
+    return _TOKEN_RE.findall(text)
+
+
+def content_hash(model: str, text: str) -> str:
+    return hashlib.sha256(f"{model}\x00{text}".encode('utf-8')).hexdigest()
+
+
+class ModelBackend:
+    """
+    Interface des backends : `predict` traite un lot de textes et retourne un résultat par texte
+    """
+    name = 'backend'
+    task = None
+
+    def load(self) -> None:
+        """Charge le modèle (appelé une fois, au premier lot)"""
+
+    def predict(self, texts: Sequence[str]) -> List[Dict]:
+        raise NotImplementedError
+
+
+# Backends locaux (sans dépendance lourde)
+
+_POSITIVE_WORDS = (
+    'hausse', 'progression', 'progresse', 'croissance', 'benefice', 'benefices', 'gain', 'gains', 'record',
+    'amelioration', 'solide', 'performance', 'positif', 'positive', 'rebond', 'dividende', 'excedent',
+    'augmentation', 'augmente', 'optimisme', 'favorable', 'succes', 'rise', 'gain', 'growth', 'profit',
+    'strong', 'beat', 'upgrade', 'surge', 'rally', 'bullish', 'record'
+)
+_NEGATIVE_WORDS = (
+    'baisse', 'recul', 'recule', 'chute', 'perte', 'pertes', 'deficit', 'degradation', 'faible', 'negatif',
+    'negative', 'crise', 'risque', 'inquietude', 'ralentissement', 'diminution', 'diminue', 'endettement',
+    'defaut', 'suspension', 'sanction', 'fall', 'loss', 'decline', 'weak', 'downgrade', 'drop', 'bearish',
+    'crash', 'default'
+)
+_STOPWORDS = frozenset((
+    'le', 'la', 'les', 'de', 'des', 'du', 'un', 'une', 'et', 'en', 'a', 'au', 'aux', 'pour', 'par', 'sur',
+    'dans', 'que', 'qui', 'est', 'sont', 'avec', 'ce', 'cette', 'il', 'elle', 'se', 'sa', 'son', 'ses',
+    'the', 'of', 'and', 'to', 'in', 'is', 'for', 'on', 'with', 'as'
+))
+
+
+class LocalSentimentBackend(ModelBackend):
+    """
+    Petit modèle construit localement : plongements de mots hachés, moyenne, couche cachée et softmax.
+    Les poids sont déterministes et orientés par un lexique financier (français/anglais).
+    """
+    name = 'local-sentiment'
+    task = 'sentiment'
+
+    def __init__(self, buckets: int = 32749, dim: int = 32, hidden: int = 32, seed: int = 7):
+        rng = np.random.default_rng(seed)
+        self.buckets = buckets
+        self.embeddings = (rng.standard_normal((buckets, dim)) * 0.05).astype(np.float32)
+        # Composante 0 = polarité, nulle hors lexique
+        self.embeddings[:, 0] = 0.0
+        for word in _POSITIVE_WORDS:
+            self.embeddings[self._bucket(word), 0] += 1.0
+        for word in _NEGATIVE_WORDS:
+            self.embeddings[self._bucket(word), 0] -= 1.0
+        # Couche cachée : la première composante (polarité) est conservée, le reste est du bruit faible
+        self.w_hidden = (rng.standard_normal((dim, hidden)) * 0.05).astype(np.float32)
+        self.w_hidden[:, 0] = 0.0
+        self.w_hidden[0, 0] = 1.0
+        self.w_out = np.zeros((hidden, 3), dtype=np.float32)
+        self.w_out[0] = (-12.0, 0.0, 12.0)
+        self.b_out = np.array((0.0, 1.0, 0.0), dtype=np.float32)
+
+    def _bucket(self, token: str) -> int:
+        return zlib.crc32(token.encode('utf-8')) % self.buckets
+
+    def predict(self, texts: Sequence[str]) -> List[Dict]:
+        ids, offsets = [], []
+        for text in texts:
+            offsets.append(len(ids))
+            ids.extend(self._bucket(t) for t in _tokens(text) if t not in _STOPWORDS)
+        counts = np.diff(np.append(offsets, len(ids))).astype(np.float32)
+        # Ligne nulle finale : les textes vides (y compris en fin de lot) restent des indices valides
+        vectors = np.vstack((self.embeddings[np.asarray(ids, dtype=np.int64)],
+                             np.zeros((1, self.embeddings.shape[1]), dtype=np.float32)))
+        pooled = np.add.reduceat(vectors, np.asarray(offsets), axis=0)
+        pooled[counts == 0] = 0.0
+        pooled /= np.maximum(counts, 1.0)[:, None]
+        hidden = np.tanh(pooled @ self.w_hidden)
+        logits = hidden @ self.w_out + self.b_out
+        logits -= logits.max(axis=1, keepdims=True)
+        probs = np.exp(logits)
+        probs /= probs.sum(axis=1, keepdims=True)
+        return [_sentiment_result(row) for row in probs]
+
+
+class LocalSummarizerBackend(ModelBackend):
+    """
+    Résumé extractif : phrases les mieux notées selon la fréquence de leurs mots
+    """
+    name = 'local-summarizer'
+    task = 'summarization'
+
+    def __init__(self, max_sentences: int = 2):
+        self.max_sentences = max_sentences
+
+    def predict(self, texts: Sequence[str]) -> List[Dict]:
+        results = []
+        for text in texts:
+            sentences = [s.strip() for s in _SENTENCE_RE.split(text.strip()) if s.strip()]
+            if len(sentences) <= self.max_sentences:
+                results.append({'summary': ' '.join(sentences)})
+                continue
+            frequencies: Dict[str, int] = {}
+            tokenized = []
+            for sentence in sentences:
+                words = [w for w in _tokens(sentence) if w not in _STOPWORDS]
+                tokenized.append(words)
+                for w in words:
+                    frequencies[w] = frequencies.get(w, 0) + 1
+            scores = np.array([sum(frequencies[w] for w in words) / (len(words) or 1) for words in tokenized])
+            keep = np.sort(np.argsort(-scores, kind='stable')[:self.max_sentences])
+            results.append({'summary': ' '.join(sentences[i] for i in keep)})
+        return results
+
+
+# Backends HuggingFace (torch et transformers importés au chargement du modèle)
+
+class HFSentimentBackend(ModelBackend):
+    """
+    Classifieur de séquences HuggingFace, quantifié dynamiquement en int8 pour le CPU
+    """
+    task = 'sentiment'
+
+    def __init__(self, model_name: str, quantize: bool = True, max_length: int = 256,
+                 cache_dir: Optional[str] = None):
+        self.name = model_name
+        self.quantize = quantize
+        self.max_length = max_length
+        self.cache_dir = cache_dir
+        self.model = None
+        self.tokenizer = None
+
+    def load(self) -> None:
+        import torch
+        from transformers import AutoModelForSequenceClassification, AutoTokenizer
+        self.torch = torch
+        self.tokenizer = AutoTokenizer.from_pretrained(self.name, cache_dir=self.cache_dir)
+        model = AutoModelForSequenceClassification.from_pretrained(self.name, cache_dir=self.cache_dir).eval()
+        if self.quantize:
+            model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        self.model = model
+        self.labels = [model.config.id2label[i] for i in range(model.config.num_labels)]
+
+    def predict(self, texts: Sequence[str]) -> List[Dict]:
+        torch = self.torch
+        encoded = self.tokenizer(list(texts), padding=True, truncation=True,
+                                 max_length=self.max_length, return_tensors='pt')
+        with torch.inference_mode():
+            probs = torch.softmax(self.model(**encoded).logits, dim=-1).numpy()
+        return [_sentiment_result(_to_three_classes(self.labels, row)) for row in probs]
+
+
+class HFSummarizerBackend(ModelBackend):
+    """
+    Modèle seq2seq HuggingFace (BART...), quantifié dynamiquement en int8 pour le CPU
+    """
+    task = 'summarization'
+
+    def __init__(self, model_name: str, quantize: bool = True, max_input_length: int = 1024,
+                 max_length: int = 130, min_length: int = 30, num_beams: int = 2,
+                 cache_dir: Optional[str] = None):
+        self.name = model_name
+        self.quantize = quantize
+        self.max_input_length = max_input_length
+        self.max_length = max_length
+        self.min_length = min_length
+        self.num_beams = num_beams
+        self.cache_dir = cache_dir
+        self.model = None
+        self.tokenizer = None
+
+    def load(self) -> None:
+        import torch
+        from transformers import AutoModelForSeq2SeqLM, AutoTokenizer
+        self.torch = torch
+        self.tokenizer = AutoTokenizer.from_pretrained(self.name, cache_dir=self.cache_dir)
+        model = AutoModelForSeq2SeqLM.from_pretrained(self.name, cache_dir=self.cache_dir).eval()
+        if self.quantize:
+            model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        self.model = model
+
+    def predict(self, texts: Sequence[str]) -> List[Dict]:
+        encoded = self.tokenizer(list(texts), padding=True, truncation=True,
+                                 max_length=self.max_input_length, return_tensors='pt')
+        with self.torch.inference_mode():
+            output = self.model.generate(**encoded, max_length=self.max_length, min_length=self.min_length,
+                                         num_beams=self.num_beams, early_stopping=True)
+        return [{'summary': s.strip()} for s in self.tokenizer.batch_decode(output, skip_special_tokens=True)]
+
+
+def _to_three_classes(labels: List[str], probs: np.ndarray) -> np.ndarray:
+    """
+    Ramène les étiquettes du modèle (negative/neutral/positive, LABEL_0..2 ou 1 à 5 étoiles) à trois classes
+    """
+    out = np.zeros(3)
+    for label, p in zip(labels, probs):
+        name = label.lower()
+        stars = re.match(r'^(\d)\s*star', name)
+        if stars:
+            n = int(stars.group(1))
+            out[0 if n <= 2 else (1 if n == 3 else 2)] += p
+        elif 'neg' in name or name == 'label_0':
+            out[0] += p
+        elif 'pos' in name or name == 'label_2':
+            out[2] += p
+        else:
+            out[1] += p
+    return out
+
+
+def _sentiment_result(probs: np.ndarray) -> Dict:
+    best = int(np.argmax(probs))
+    return {
+        'sentiment': SENTIMENT_LABELS[best],
+        'confidence': round(float(probs[best]), 4),
+        'scores': {label: round(float(p), 4) for label, p in zip(SENTIMENT_LABELS, probs)}
+    }
+
+
+# Micro-batching
+
+class MicroBatcher:
+    """
+    File de requêtes servie par un thread qui regroupe les textes en lots
+    """
+
+    def __init__(self, backend: ModelBackend, max_batch_size: int = 16, max_wait_ms: float = 10.0):
+        self.backend = backend
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue: queue.Queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread_pid = None
+        self._loaded = False
+        self.batches = 0
+        self.items = 0
+
+    def _ensure_thread(self) -> None:
+        # Un thread par processus (y compris après un fork gunicorn)
+        if self._thread_pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread_pid != os.getpid():
+                self._queue = queue.Queue()
+                threading.Thread(target=self._run, name=f'inference-{self.backend.task}', daemon=True).start()
+                self._thread_pid = os.getpid()
+
+    def submit(self, text: str) -> Future:
+        self._ensure_thread()
+        future: Future = Future()
+        self._queue.put((text, future))
+        return future
+
+    def _next_batch(self) -> list:
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._next_batch()
+            try:
+                if not self._loaded:
+                    started = time.perf_counter()
+                    self.backend.load()
+                    self._loaded = True
+                    logger.info(f"Modèle {self.backend.name} chargé en {time.perf_counter() - started:.1f} s")
+                results = self.backend.predict([text for text, _ in batch])
+                for (_, future), result in zip(batch, results):
+                    future.set_result(result)
+            except Exception as e:
+                logger.error(f"Erreur d'inférence ({self.backend.name}): {e}")
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+            self.batches += 1
+            self.items += len(batch)
+
+
+class InferenceService:
+    """
+    Point d'entrée des tâches d'inférence : cache par empreinte, dédoublonnage des requêtes en cours
+    et micro-batching par tâche
+    """
+
+    def __init__(self, backends: Dict[str, ModelBackend], max_batch_size: int = 16,
+                 max_wait_ms: float = 10.0, cache_size: int = 4096, timeout: float = 120.0):
+        self.batchers = {task: MicroBatcher(b, max_batch_size, max_wait_ms) for task, b in backends.items()}
+        self.cache_size = cache_size
+        self.timeout = timeout
+        self._cache = get_cache('inference', max_entries=cache_size)
+        self._inflight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def run(self, task: str, texts: Sequence[str]) -> List[Dict]:
+        """
+        Résultats pour une liste de textes (ordre conservé) ; les textes déjà vus sont servis depuis le cache
+        """
+        batcher = self.batchers[task]
+        results: List[Optional[Dict]] = [None] * len(texts)
+        waiting = []
+        with tracing.span(f'inference.{task}', texts=len(texts)):
+            with self._lock:
+                for i, text in enumerate(texts):
+                    key = content_hash(batcher.backend.name, text)
+                    cached = self._cache.get(key)
+                    if cached is not None:
+                        results[i] = cached
+                        continue
+                    future = self._inflight.get(key)
+                    if future is None:
+                        future = self._inflight[key] = batcher.submit(text)
+                    waiting.append((i, key, future))
+
+            for i, key, future in waiting:
+                try:
+                    results[i] = future.result(timeout=self.timeout)
+                finally:
+                    with self._lock:
+                        self._inflight.pop(key, None)
+                if self.cache_size:
+                    self._cache.set(key, results[i])
+        return results
+
+    def sentiment(self, texts: Sequence[str]) -> List[Dict]:
+        return self.run('sentiment', texts)
+
+    def summarize(self, texts: Sequence[str]) -> List[Dict]:
+        return self.run('summarization', texts)
+
+    def stats(self) -> Dict:
+        return {
+            **self._cache.stats(),
+            'backends': {task: b.backend.name for task, b in self.batchers.items()},
+            'batches': {task: b.batches for task, b in self.batchers.items()},
+            'mean_batch_size': {task: round(b.items / b.batches, 2) if b.batches else 0.0
+                                for task, b in self.batchers.items()}
+        }
+
+
+def hf_available() -> bool:
+    return importlib.util.find_spec('torch') is not None and importlib.util.find_spec('transformers') is not None
+
+
+def build_backends(models: Dict[str, str], backend: Optional[str] = None) -> Dict[str, ModelBackend]:
+    """
+    INFERENCE_BACKEND: 'hf' (modèles HuggingFace), 'local' (modèles NumPy) ou 'auto' (hf si installé)
+    """
+    backend = (backend or os.getenv('INFERENCE_BACKEND', 'auto')).lower()
+    if backend == 'auto':
+        backend = 'hf' if hf_available() else 'local'
+    if backend == 'local':
+        return {'sentiment': LocalSentimentBackend(), 'summarization': LocalSummarizerBackend()}
+
+    quantize = os.getenv('INFERENCE_QUANTIZE', 'true').lower() != 'false'
+    cache_dir = os.getenv('CACHE_DIR', './models_cache')
+    return {
+        'sentiment': HFSentimentBackend(models['sentiment'], quantize=quantize, cache_dir=cache_dir),
+        'summarization': HFSummarizerBackend(models['summarizer'], quantize=quantize, cache_dir=cache_dir)
+    }
+
+
+_inference_service = None
+_inference_service_lock = threading.Lock()
+
+
+def get_inference_service(models: Optional[Dict[str, str]] = None) -> InferenceService:
+    """
+    Retourne le service d'inférence partagé par le processus
+    """
+    global _inference_service
+    with _inference_service_lock:
+        if _inference_service is None:
+            if models is None:
+                from .ai_service import AI_MODELS
+                models = AI_MODELS
+            _inference_service = InferenceService(
+                build_backends(models),
+                max_batch_size=int(os.getenv('INFERENCE_MAX_BATCH', 16)),
+                max_wait_ms=float(os.getenv('INFERENCE_MAX_WAIT_MS', 10)),
+                cache_size=int(os.getenv('INFERENCE_CACHE_SIZE', 4096))
+            )
+        return _inference_service
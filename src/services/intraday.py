@@ -0,0 +1,322 @@
+"""
+Pipeline intraday : les points intraday interrogés auprès de la BVMT sont intégrés dans des
+tampons circulaires NumPy de taille fixe par ISIN
+
+Chaque tampon maintient de manière incrémentale les barres OHLC d'une minute, le volume cumulé et
+le VWAP de la séance. Seuls les points nouveaux depuis la dernière interrogation sont intégrés ;
+la mémoire reste bornée quelle que soit la durée de la séance (les plus anciens points et barres
+sont écrasés, les cumuls de séance restent exacts).
+"""
+import logging
+import os
+import threading
+import time
+from datetime import date
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from . import metrics
+from .bvmt_service import BVMTService
+from .cache import get_cache
+
+logger = logging.getLogger(__name__)
+
+BAR_SECONDS = 60
+BAR_INTERVALS = (1, 5, 15, 30, 60)
+
+
+def _seconds(value) -> Optional[int]:
+    """Heure d'un point intraday ('HH:MM[:SS]' ou date et heure) en secondes depuis minuit"""
+    if value is None:
+        return None
+    text = str(value).strip()
+    if len(text) > 8 and (text[10:11] in ('T', ' ')):
+        text = text[11:19]
+    parts = text.split(':')
+    try:
+        hours, minutes = int(parts[0]), int(parts[1])
+        seconds = int(float(parts[2])) if len(parts) > 2 else 0
+    except (ValueError, IndexError):
+        return None
+    return hours * 3600 + minutes * 60 + seconds
+
+
+def format_clock(seconds: int) -> str:
+    return f"{seconds // 3600:02d}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+
+
+def _num(value) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def parse_points(payload: Optional[Dict]) -> tuple:
+    """
+    Extrait (heures, cours, quantités) triés par heure d'une réponse intraday BVMT
+    """
+    rows = (payload or {}).get('intradays') or (payload or {}).get('intradayDatas') or []
+    parsed = []
+    for row in rows:
+        ts = _seconds(row.get('time') or row.get('seance') or row.get('sEANCE'))
+        price = _num(row.get('last', row.get('lAST')))
+        if ts is None or not price > 0:
+            continue
+        volume = _num(row.get('volume', row.get('qty')))
+        parsed.append((ts, price, 0.0 if np.isnan(volume) else volume))
+    # Tri stable : l'ordre de réception départage les points d'une même seconde
+    parsed.sort(key=lambda r: r[0])
+    n = len(parsed)
+    return (np.fromiter((r[0] for r in parsed), dtype=np.int32, count=n),
+            np.fromiter((r[1] for r in parsed), dtype=np.float64, count=n),
+            np.fromiter((r[2] for r in parsed), dtype=np.float64, count=n))
+
+
+class _Ring:
+    """
+    Colonnes NumPy de taille fixe écrites en boucle
+    """
+
+    def __init__(self, capacity: int, dtypes: Dict[str, type]):
+        self.capacity = capacity
+        self.columns = {name: np.zeros(capacity, dtype=dtype) for name, dtype in dtypes.items()}
+        self.count = 0  # nombre total de lignes écrites depuis le début de la séance
+
+    def __len__(self) -> int:
+        return min(self.count, self.capacity)
+
+    def append(self, **values: np.ndarray) -> None:
+        n = len(next(iter(values.values())))
+        if n == 0:
+            return
+        # Au-delà de la capacité, seules les dernières lignes comptent
+        skip = max(0, n - self.capacity)
+        idx = (self.count + skip + np.arange(n - skip)) % self.capacity
+        for name, column in values.items():
+            self.columns[name][idx] = column[skip:]
+        self.count += n
+
+    def last_index(self) -> int:
+        return (self.count - 1) % self.capacity
+
+    def ordered(self, name: str) -> np.ndarray:
+        column = self.columns[name]
+        if self.count <= self.capacity:
+            return column[:self.count].copy()
+        start = self.count % self.capacity
+        return np.concatenate([column[start:], column[:start]])
+
+    def clear(self) -> None:
+        self.count = 0
+
+
+class IntradayBuffer:
+    """
+    Points, barres d'une minute et cumuls de séance d'un ISIN
+    """
+
+    def __init__(self, isin: str, capacity: int = 2048, max_bars: int = 512):
+        self.isin = isin
+        self.points = _Ring(capacity, {'time': np.int32, 'price': np.float64, 'volume': np.float64})
+        self.bars = _Ring(max_bars, {'start': np.int32, 'open': np.float64, 'high': np.float64,
+                                     'low': np.float64, 'close': np.float64, 'volume': np.float64,
+                                     'pv': np.float64})
+        self.lock = threading.Lock()
+        self.polled_at = 0.0
+        # Dernière réponse intégrée (réutilisée telle quelle par le client BVMT si elle n'a pas changé)
+        self.source = None
+        self._reset(None)
+
+    def _reset(self, session) -> None:
+        self.session = session
+        self.points.clear()
+        self.bars.clear()
+        self.last_time = -1
+        self.open = self.high = self.low = self.last = None
+        self.cum_volume = 0.0
+        self.cum_pv = 0.0
+
+    def ingest(self, times: np.ndarray, prices: np.ndarray, volumes: np.ndarray, session=None) -> int:
+        """
+        Intègre la liste complète des points de la séance renvoyée par l'amont ; retourne le nombre de points nouveaux
+        """
+        session = session or date.today().isoformat()
+        known = self.points.count
+        if session != self.session or len(times) < known:
+            self._reset(session)
+            known = 0
+        # La liste amont ne fait que s'allonger : les `known` premiers points sont déjà intégrés,
+        # sauf si elle a été réécrite (on repart alors de la dernière heure connue)
+        if known and times[known - 1] == self.last_time:
+            start = known
+        else:
+            start = int(np.searchsorted(times, self.last_time, side='right'))
+        times, prices, volumes = times[start:], prices[start:], volumes[start:]
+        if len(times) == 0:
+            return 0
+
+        self.points.append(time=times, price=prices, volume=volumes)
+        self._update_bars(times, prices, volumes)
+
+        if self.open is None:
+            self.open, self.high, self.low = float(prices[0]), float(prices.max()), float(prices.min())
+        else:
+            self.high, self.low = max(self.high, float(prices.max())), min(self.low, float(prices.min()))
+        self.last = float(prices[-1])
+        self.cum_volume += float(volumes.sum())
+        self.cum_pv += float(prices @ volumes)
+        self.last_time = int(times[-1])
+        return len(times)
+
+    def _update_bars(self, times: np.ndarray, prices: np.ndarray, volumes: np.ndarray) -> None:
+        buckets = times // BAR_SECONDS * BAR_SECONDS
+        starts = np.flatnonzero(np.diff(buckets, prepend=buckets[0] - 1))
+        ends = np.append(starts[1:], len(buckets)) - 1
+        bar_open = prices[starts]
+        bar_high = np.maximum.reduceat(prices, starts)
+        bar_low = np.minimum.reduceat(prices, starts)
+        bar_volume = np.add.reduceat(volumes, starts)
+        bar_pv = np.add.reduceat(prices * volumes, starts)
+        bar_start = buckets[starts]
+
+        bars = self.bars
+        if len(bars) and bars.columns['start'][bars.last_index()] == bar_start[0]:
+            # La première barre prolonge la barre en cours
+            i = bars.last_index()
+            columns = bars.columns
+            columns['high'][i] = max(columns['high'][i], bar_high[0])
+            columns['low'][i] = min(columns['low'][i], bar_low[0])
+            columns['close'][i] = prices[ends[0]]
+            columns['volume'][i] += bar_volume[0]
+            columns['pv'][i] += bar_pv[0]
+            first = 1
+        else:
+            first = 0
+        bars.append(start=bar_start[first:], open=bar_open[first:], high=bar_high[first:], low=bar_low[first:],
+                    close=prices[ends[first:]], volume=bar_volume[first:], pv=bar_pv[first:])
+
+    @property
+    def nbytes(self) -> int:
+        return sum(c.nbytes for ring in (self.points, self.bars) for c in ring.columns.values())
+
+    @property
+    def vwap(self) -> Optional[float]:
+        return self.cum_pv / self.cum_volume if self.cum_volume > 0 else self.last
+
+    def point_list(self) -> List[Dict]:
+        times, prices, volumes = (self.points.ordered(c) for c in ('time', 'price', 'volume'))
+        return [{'time': format_clock(int(t)), 'last': float(p), 'volume': float(v)}
+                for t, p, v in zip(times, prices, volumes)]
+
+    def bar_list(self, minutes: int = 1) -> List[Dict]:
+        """
+        Barres OHLC avec volume et VWAP, regroupées par `minutes` minutes
+        """
+        cols = {c: self.bars.ordered(c) for c in ('start', 'open', 'high', 'low', 'close', 'volume', 'pv')}
+        if len(cols['start']) and minutes > 1:
+            buckets = cols['start'] // (minutes * 60) * (minutes * 60)
+            starts = np.flatnonzero(np.diff(buckets, prepend=buckets[0] - 1))
+            ends = np.append(starts[1:], len(buckets)) - 1
+            cols = {
+                'start': buckets[starts], 'open': cols['open'][starts], 'close': cols['close'][ends],
+                'high': np.maximum.reduceat(cols['high'], starts), 'low': np.minimum.reduceat(cols['low'], starts),
+                'volume': np.add.reduceat(cols['volume'], starts), 'pv': np.add.reduceat(cols['pv'], starts)
+            }
+        with np.errstate(invalid='ignore', divide='ignore'):
+            vwap = np.where(cols['volume'] > 0, cols['pv'] / cols['volume'], cols['close'])
+        return [{'time': format_clock(int(cols['start'][i])), 'open': float(cols['open'][i]), 'high': float(cols['high'][i]),
+                 'low': float(cols['low'][i]), 'close': float(cols['close'][i]),
+                 'volume': float(cols['volume'][i]), 'vwap': round(float(vwap[i]), 4)}
+                for i in range(len(cols['start']))]
+
+    def summary(self) -> Dict:
+        return {
+            'isin': self.isin,
+            'session': self.session,
+            'open': self.open,
+            'high': self.high,
+            'low': self.low,
+            'last': self.last,
+            'volume': self.cum_volume,
+            'vwap': round(self.vwap, 4) if self.vwap is not None else None,
+            'points': self.points.count,
+            'last_time': format_clock(self.last_time) if self.last_time >= 0 else None
+        }
+
+
+class IntradayStore:
+    """
+    Tampons intraday par ISIN, réalimentés depuis l'API BVMT au plus toutes les `poll_interval` secondes
+    """
+
+    def __init__(self, bvmt_service: Optional[BVMTService] = None, poll_interval: Optional[float] = None,
+                 capacity: Optional[int] = None):
+        self.bvmt_service = bvmt_service or BVMTService()
+        self.poll_interval = poll_interval if poll_interval is not None else float(os.getenv('INTRADAY_POLL_INTERVAL', 10))
+        self.capacity = capacity or int(os.getenv('INTRADAY_CAPACITY', 2048))
+        # Tampons de taille fixe : seuls les ISIN les moins consultés sont évincés
+        self._buffers = get_cache('intraday', weight=1, sizer=lambda b: b.nbytes)
+        self._lock = threading.Lock()
+        self.polls = 0
+
+    def buffer(self, isin: str) -> IntradayBuffer:
+        with self._lock:
+            buffer = self._buffers.get(isin)
+            if buffer is None:
+                buffer = IntradayBuffer(isin, capacity=self.capacity)
+                self._buffers.set(isin, buffer)
+            return buffer
+
+    def cached(self, isin: str, stale: bool = False) -> Optional[IntradayBuffer]:
+        """
+        Tampon d'un ISIN sans appel amont : interrogé depuis moins de `poll_interval` secondes, ou simplement
+        non vide avec `stale` (None sinon)
+        """
+        buffer = self._buffers.get_stale(isin)
+        if buffer is None or not buffer.points.count:
+            return None
+        if not stale and time.monotonic() - buffer.polled_at >= self.poll_interval:
+            return None
+        return buffer
+
+    def get(self, isin: str) -> Optional[IntradayBuffer]:
+        """
+        Retourne le tampon d'un ISIN après intégration des nouveaux points si le dernier appel amont est ancien
+        """
+        buffer = self.buffer(isin)
+        with buffer.lock:
+            if time.monotonic() - buffer.polled_at < self.poll_interval:
+                return buffer
+            self.polls += 1
+            payload = self.bvmt_service.get_stock_intraday(isin)
+            if payload is None:
+                # En cas d'échec on sert les points déjà intégrés
+                return buffer if buffer.points.count else None
+            if payload is buffer.source:
+                # Réponse amont inchangée : aucun point nouveau à intégrer
+                metrics.count_skipped('intraday_ingest', 'intraday/{isin}')
+            else:
+                buffer.ingest(*parse_points(payload))
+                buffer.source = payload
+            buffer.polled_at = time.monotonic()
+            return buffer
+
+    def stats(self) -> Dict:
+        return {**self._buffers.stats(), 'polls': self.polls}
+
+
+_intraday_store = None
+_intraday_store_lock = threading.Lock()
+
+
+def get_intraday_store() -> IntradayStore:
+    """
+    Retourne les tampons intraday partagés par le processus
+    """
+    global _intraday_store
+    with _intraday_store_lock:
+        if _intraday_store is None:
+            _intraday_store = IntradayStore()
+        return _intraday_store
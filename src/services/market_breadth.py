@@ -0,0 +1,176 @@
+"""
+Agrégats de marché par groupe de cotation (val_group)
+Les agrégats sont maintenus de manière incrémentale : seules les lignes modifiées
+depuis le dernier instantané sont retirées puis réintégrées dans les cumuls.
+"""
+import logging
+import threading
+from datetime import datetime
+from typing import Dict, List
+
+import numpy as np
+
+from . import market_feed
+
+logger = logging.getLogger(__name__)
+
+# Colonnes numériques suivies par ligne (une ligne = un ISIN)
+_FIELDS = ('change', 'change_percent', 'volume', 'market_cap')
+
+
+def _to_float(value) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+class MarketBreadth:
+    """
+    Calcule hausses/baisses/inchangées, variation pondérée par la capitalisation,
+    volume total et capitalisation totale pour chaque groupe de cotation
+    """
+
+    def __init__(self, rebuild_every: int = 500):
+        self._lock = threading.Lock()
+        self._slots: Dict[str, int] = {}
+        self._group_ids: Dict[str, int] = {}
+        self._group_labels: List[str] = []
+        # Colonnes par ligne
+        self._group = np.zeros(0, dtype=np.int32)
+        self._values = np.zeros((0, len(_FIELDS)), dtype=np.float64)
+        self._active = np.zeros(0, dtype=bool)
+        # Cumuls par groupe : compte, hausses, baisses, inchangées, volume, caps, caps * variation %
+        self._totals = np.zeros((0, 7), dtype=np.float64)
+        self._updates = 0
+        self._rebuild_every = rebuild_every
+        self.timestamp = None
+
+    def _group_id(self, label) -> int:
+        label = str(label) if label is not None else 'N/A'
+        gid = self._group_ids.get(label)
+        if gid is None:
+            gid = len(self._group_labels)
+            self._group_ids[label] = gid
+            self._group_labels.append(label)
+            self._totals = np.vstack([self._totals, np.zeros((1, 7))])
+        return gid
+
+    def _slot(self, isin: str) -> int:
+        slot = self._slots.get(isin)
+        if slot is None:
+            slot = len(self._slots)
+            self._slots[isin] = slot
+        return slot
+
+    def _grow(self, size: int) -> None:
+        missing = size - len(self._group)
+        if missing > 0:
+            self._group = np.concatenate([self._group, np.zeros(missing, dtype=np.int32)])
+            self._values = np.vstack([self._values, np.zeros((missing, len(_FIELDS)))])
+            self._active = np.concatenate([self._active, np.zeros(missing, dtype=bool)])
+
+    @staticmethod
+    def _contributions(values: np.ndarray) -> np.ndarray:
+        """Contribution de chaque ligne aux cumuls de son groupe"""
+        change = values[:, 0]
+        contrib = np.empty((len(values), 7), dtype=np.float64)
+        contrib[:, 0] = 1.0
+        contrib[:, 1] = change > 0
+        contrib[:, 2] = change < 0
+        contrib[:, 3] = change == 0
+        contrib[:, 4] = values[:, 2]
+        contrib[:, 5] = values[:, 3]
+        contrib[:, 6] = values[:, 3] * values[:, 1]
+        return contrib
+
+    def _accumulate(self, rows: np.ndarray, sign: float) -> None:
+        if len(rows) == 0:
+            return
+        contrib = self._contributions(self._values[rows]) * sign
+        np.add.at(self._totals, self._group[rows], contrib)
+
+    def _rebuild(self) -> None:
+        self._totals[:] = 0.0
+        self._accumulate(np.flatnonzero(self._active), 1.0)
+
+    def update(self, stocks: list) -> int:
+        """
+        Intègre un nouvel instantané d'actions normalisées.
+        Retourne le nombre de lignes effectivement recalculées.
+        """
+        rows = [s for s in stocks if s.get('isin')]
+        with self._lock:
+            slots = np.fromiter((self._slot(s['isin']) for s in rows), dtype=np.int64, count=len(rows))
+            groups = np.fromiter((self._group_id(s.get('val_group')) for s in rows), dtype=np.int32, count=len(rows))
+            values = np.array([[_to_float(s.get(f)) for f in _FIELDS] for s in rows],
+                              dtype=np.float64).reshape(len(rows), len(_FIELDS))
+            self._grow(len(self._slots))
+
+            # Lignes disparues de l'instantané
+            seen = np.zeros(len(self._active), dtype=bool)
+            seen[slots] = True
+            removed = np.flatnonzero(self._active & ~seen)
+
+            # Lignes nouvelles ou modifiées
+            was_active = self._active[slots]
+            changed = ~was_active | (self._group[slots] != groups) | np.any(self._values[slots] != values, axis=1)
+            changed_slots = slots[changed]
+            stale = changed_slots[was_active[changed]]
+
+            self._accumulate(np.concatenate([removed, stale]), -1.0)
+            self._active[removed] = False
+            self._group[changed_slots] = groups[changed]
+            self._values[changed_slots] = values[changed]
+            self._active[changed_slots] = True
+
+            self._updates += 1
+            if self._updates % self._rebuild_every == 0:
+                # Recalcul complet périodique pour éliminer la dérive des flottants
+                self._rebuild()
+            else:
+                self._accumulate(changed_slots, 1.0)
+
+            self.timestamp = datetime.utcnow()
+            return int(len(changed_slots) + len(removed))
+
+    @staticmethod
+    def _format(label: str, totals: np.ndarray) -> Dict:
+        caps = totals[5]
+        return {
+            'group': label,
+            'total': int(totals[0]),
+            'advancers': int(totals[1]),
+            'decliners': int(totals[2]),
+            'unchanged': int(totals[3]),
+            'total_volume': float(totals[4]),
+            'total_market_cap': float(caps),
+            'cap_weighted_change_percent': round(float(totals[6] / caps), 4) if caps > 0 else None
+        }
+
+    def summary(self) -> Dict:
+        """
+        Retourne les agrégats par groupe et pour l'ensemble du marché
+        """
+        with self._lock:
+            totals = self._totals.copy()
+            labels = list(self._group_labels)
+            timestamp = self.timestamp
+        groups = [self._format(label, totals[i]) for i, label in enumerate(labels) if totals[i, 0] > 0]
+        groups.sort(key=lambda g: g['group'])
+        return {
+            'timestamp': timestamp,
+            'groups': groups,
+            'market': self._format('ALL', totals.sum(axis=0) if len(totals) else np.zeros(7))
+        }
+
+
+_market_breadth = MarketBreadth()
+market_feed.subscribe(_market_breadth.update)
+
+
+def get_market_breadth() -> MarketBreadth:
+    """
+    Retourne l'instance partagée (par processus) des agrégats de marché
+    """
+    return _market_breadth
@@ -0,0 +1,42 @@
+"""
+Point de diffusion des instantanés de marché vers les consommateurs internes
+"""
+import logging
+import threading
+from typing import Callable, List
+
+logger = logging.getLogger(__name__)
+
+_subscribers: List[Callable[[list], None]] = []
+_lock = threading.Lock()
+
+
+def subscribe(callback: Callable[[list], None]) -> None:
+    """
+    Enregistre un consommateur appelé à chaque nouvel instantané normalisé
+    """
+    with _lock:
+        if callback not in _subscribers:
+            _subscribers.append(callback)
+
+
+def unsubscribe(callback: Callable[[list], None]) -> None:
+    """
+    Retire un consommateur précédemment enregistré
+    """
+    with _lock:
+        if callback in _subscribers:
+            _subscribers.remove(callback)
+
+
+def publish(stocks: list) -> None:
+    """
+    Diffuse un instantané (liste d'actions normalisées) à tous les consommateurs
+    """
+    with _lock:
+        subscribers = list(_subscribers)
+    for callback in subscribers:
+        try:
+            callback(stocks)
+        except Exception as e:
+            logger.error(f"Erreur dans le consommateur d'instantané {callback}: {e}")
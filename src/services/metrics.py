@@ -0,0 +1,388 @@
+"""
+Métriques au format texte Prometheus
+
+Chaque processus (worker gunicorn) tient ses compteurs en mémoire et les recopie régulièrement
+dans un fichier de METRICS_DIR ; /metrics additionne les fichiers de tous les workers, de sorte
+que le résultat est correct quel que soit le worker qui répond.
+"""
+import contextvars
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+CALLS_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+# Nom -> (type, aide, noms des labels)
+_DEFINITIONS = {
+    'atlas_http_requests_total': ('counter', "Requêtes HTTP traitées", ('endpoint', 'method', 'status')),
+    'atlas_http_request_duration_seconds': ('histogram', "Durée des requêtes HTTP par endpoint", ('endpoint', 'method')),
+    'atlas_http_requests_in_flight': ('gauge', "Requêtes HTTP en cours de traitement", ()),
+    'atlas_upstream_requests_total': ('counter', "Appels aux API amont par modèle d'endpoint", ('endpoint', 'outcome')),
+    'atlas_upstream_request_duration_seconds': ('histogram', "Durée des appels aux API amont", ('endpoint',)),
+    'atlas_upstream_calls_per_request': ('histogram', "Nombre d'appels amont déclenchés par requête HTTP", ('endpoint',)),
+    'atlas_upstream_skipped_total': ('counter', "Traitements évités car la réponse amont est inchangée, par étape", ('stage', 'endpoint')),
+    'atlas_rate_limit_wait_seconds': ('histogram', "Attente d'un jeton avant un appel amont", ('upstream', 'priority')),
+    'atlas_rate_limit_requests_total': ('counter', "Demandes de jeton par classe de priorité (ok ou rejected)", ('upstream', 'priority', 'outcome')),
+    'atlas_cache_hits_total': ('counter', "Accès cache servis depuis le cache", ('cache',)),
+    'atlas_cache_misses_total': ('counter', "Accès cache non trouvés", ('cache',)),
+    'atlas_cache_entries': ('gauge', "Nombre d'entrées en cache", ('cache',)),
+    'atlas_cache_bytes': ('gauge', "Octets occupés par le cache (estimation)", ('cache',)),
+    'atlas_cache_max_bytes': ('gauge', "Part du budget mémoire allouée au cache", ('cache',)),
+    'atlas_cache_evictions_total': ('counter', "Entrées évincées faute de place", ('cache',)),
+}
+
+
+class _Registry:
+    """
+    Métriques du processus courant
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters: Dict[str, Dict[Tuple, float]] = {}
+        self.gauges: Dict[str, Dict[Tuple, float]] = {}
+        self.histograms: Dict[str, Dict[Tuple, list]] = {}
+        self.buckets: Dict[str, tuple] = {}
+
+    def inc(self, name: str, labels: Tuple = (), value: float = 1.0) -> None:
+        with self.lock:
+            series = self.counters.setdefault(name, {})
+            series[labels] = series.get(labels, 0.0) + value
+
+    def add_gauge(self, name: str, labels: Tuple = (), value: float = 1.0) -> None:
+        with self.lock:
+            series = self.gauges.setdefault(name, {})
+            series[labels] = series.get(labels, 0.0) + value
+
+    def observe(self, name: str, labels: Tuple, value: float, buckets: tuple = DEFAULT_BUCKETS) -> None:
+        with self.lock:
+            self.buckets.setdefault(name, buckets)
+            series = self.histograms.setdefault(name, {})
+            entry = series.get(labels)
+            if entry is None:
+                entry = series[labels] = [[0] * (len(buckets) + 1), 0.0, 0]
+            entry[0][bisect_left(buckets, value)] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def dump(self) -> Dict:
+        with self.lock:
+            return {
+                'pid': os.getpid(),
+                'counters': {n: [[list(k), v] for k, v in s.items()] for n, s in self.counters.items()},
+                'gauges': {n: [[list(k), v] for k, v in s.items()] for n, s in self.gauges.items()},
+                'histograms': {n: [[list(k), e[0], e[1], e[2]] for k, e in s.items()] for n, s in self.histograms.items()},
+                'buckets': {n: list(b) for n, b in self.buckets.items()}
+            }
+
+
+_registry = _Registry()
+_collectors: Dict[str, Callable[[], Dict[str, Dict]]] = {}
+_upstream_calls = contextvars.ContextVar('atlas_upstream_calls', default=None)
+_dirty = False
+_flusher_pid = None
+_flush_lock = threading.Lock()
+_write_lock = threading.Lock()
+
+
+def enabled() -> bool:
+    return os.getenv('METRICS_ENABLED', 'true').lower() != 'false'
+
+
+def metrics_dir() -> str:
+    return os.getenv('METRICS_DIR', os.path.join(tempfile.gettempdir(), 'atlas_view_metrics'))
+
+
+def clear_metrics_dir() -> None:
+    """
+    Supprime les fichiers des workers précédents (à appeler au démarrage du maître gunicorn)
+    """
+    directory = metrics_dir()
+    if os.path.isdir(directory):
+        for name in os.listdir(directory):
+            if name.endswith('.json'):
+                try:
+                    os.remove(os.path.join(directory, name))
+                except OSError:
+                    pass
+
+
+# Instrumentation
+
+def register_cache(name: str, stats: Callable[[], Dict]) -> None:
+    """
+    Enregistre un cache ; `stats()` doit retourner {'hits', 'misses', 'entries'} et éventuellement
+    {'bytes', 'max_bytes', 'evictions'}. Un nouvel enregistrement sous le même nom remplace le précédent.
+    """
+    def collect():
+        s = stats()
+        series = {
+            'atlas_cache_hits_total': {(name,): s.get('hits', 0)},
+            'atlas_cache_misses_total': {(name,): s.get('misses', 0)},
+            'atlas_cache_entries': {(name,): s.get('entries', 0)},
+        }
+        for key, metric in (('bytes', 'atlas_cache_bytes'), ('max_bytes', 'atlas_cache_max_bytes'),
+                            ('evictions', 'atlas_cache_evictions_total')):
+            if s.get(key) is not None:
+                series[metric] = {(name,): s[key]}
+        return series
+    _collectors[name] = collect
+
+
+def observe_upstream(endpoint: str, seconds: float, outcome: str = 'ok') -> None:
+    """
+    Comptabilise un appel amont (outcome: ok, not_modified, rate_limited, http_error, network_error, parse_error)
+    """
+    if not enabled():
+        return
+    _registry.inc('atlas_upstream_requests_total', (endpoint, outcome))
+    _registry.observe('atlas_upstream_request_duration_seconds', (endpoint,), seconds)
+    calls = _upstream_calls.get()
+    if calls is not None:
+        calls[0] += 1
+
+
+def count_skipped(stage: str, endpoint: str = '', count: int = 1) -> None:
+    """
+    Comptabilise `count` traitements évités parce que les données amont dont ils dépendent n'ont pas changé
+    """
+    if not enabled():
+        return
+    _registry.inc('atlas_upstream_skipped_total', (stage, endpoint), count)
+
+
+def observe_rate_limit(upstream: str, priority: str, seconds: float, outcome: str = 'ok') -> None:
+    """
+    Comptabilise l'attente d'un jeton du limiteur de débit sortant
+    """
+    if not enabled():
+        return
+    _registry.inc('atlas_rate_limit_requests_total', (upstream, priority, outcome))
+    _registry.observe('atlas_rate_limit_wait_seconds', (upstream, priority), seconds)
+
+
+class _UpstreamCall:
+    def __init__(self):
+        self.outcome = 'ok'
+
+
+@contextmanager
+def upstream_call(endpoint: str) -> Iterator[_UpstreamCall]:
+    """
+    Chronomètre un appel amont effectué directement avec `requests`.
+    Positionner `call.outcome` si la réponse est en erreur.
+    """
+    call = _UpstreamCall()
+    started = time.perf_counter()
+    try:
+        yield call
+    except Exception:
+        call.outcome = 'network_error'
+        raise
+    finally:
+        observe_upstream(endpoint, time.perf_counter() - started, call.outcome)
+
+
+def request_started() -> None:
+    if not enabled():
+        return
+    _upstream_calls.set([0])
+    _registry.add_gauge('atlas_http_requests_in_flight', (), 1)
+
+
+def request_finished(endpoint: str, method: str, status: int, seconds: float) -> None:
+    global _dirty
+    if not enabled():
+        return
+    _registry.add_gauge('atlas_http_requests_in_flight', (), -1)
+    _registry.inc('atlas_http_requests_total', (endpoint, method, str(status)))
+    _registry.observe('atlas_http_request_duration_seconds', (endpoint, method), seconds)
+    calls = _upstream_calls.get()
+    if calls is not None:
+        _registry.observe('atlas_upstream_calls_per_request', (endpoint,), calls[0], CALLS_BUCKETS)
+        _upstream_calls.set(None)
+    _dirty = True
+    _ensure_flusher()
+
+
+# Persistance et agrégation multi-processus
+
+def flush() -> None:
+    state = _registry.dump()
+    for collect in list(_collectors.values()):
+        try:
+            for name, series in collect().items():
+                target = 'gauges' if _DEFINITIONS[name][0] == 'gauge' else 'counters'
+                state[target].setdefault(name, []).extend([list(k), v] for k, v in series.items())
+        except Exception as e:
+            logger.error(f"Erreur lors de la collecte des métriques de cache: {e}")
+
+    directory = metrics_dir()
+    try:
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{os.getpid()}.json")
+        tmp = f"{path}.tmp"
+        with _write_lock:
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump(state, f)
+            os.replace(tmp, path)
+    except OSError as e:
+        logger.error(f"Impossible d'écrire les métriques dans {directory}: {e}")
+
+
+def _flush_loop(interval: float) -> None:
+    global _dirty
+    while True:
+        time.sleep(interval)
+        if _dirty:
+            _dirty = False
+            flush()
+
+
+def _ensure_flusher() -> None:
+    """
+    Démarre (une fois par processus, y compris après un fork) le thread qui recopie les métriques sur disque
+    """
+    global _flusher_pid
+    if _flusher_pid == os.getpid():
+        return
+    with _flush_lock:
+        if _flusher_pid != os.getpid():
+            interval = float(os.getenv('METRICS_FLUSH_INTERVAL', 1.0))
+            threading.Thread(target=_flush_loop, args=(interval,), name='metrics-flush', daemon=True).start()
+            _flusher_pid = os.getpid()
+
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+        return True
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+
+
+def collect_all() -> Dict:
+    """
+    Additionne les métriques de tous les processus (les jauges des processus terminés sont ignorées)
+    """
+    flush()
+    counters: Dict[str, Dict[Tuple, float]] = {}
+    gauges: Dict[str, Dict[Tuple, float]] = {}
+    histograms: Dict[str, Dict[Tuple, list]] = {}
+    buckets: Dict[str, list] = {}
+
+    directory = metrics_dir()
+    for name in os.listdir(directory) if os.path.isdir(directory) else []:
+        if not name.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(directory, name), 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            continue
+        alive = _alive(state.get('pid', 0))
+        for metric, series in state.get('counters', {}).items():
+            target = counters.setdefault(metric, {})
+            for labels, value in series:
+                target[tuple(labels)] = target.get(tuple(labels), 0.0) + value
+        if alive:
+            for metric, series in state.get('gauges', {}).items():
+                target = gauges.setdefault(metric, {})
+                for labels, value in series:
+                    target[tuple(labels)] = target.get(tuple(labels), 0.0) + value
+        for metric, series in state.get('histograms', {}).items():
+            buckets.setdefault(metric, state['buckets'][metric])
+            target = histograms.setdefault(metric, {})
+            for labels, counts, total, count in series:
+                entry = target.setdefault(tuple(labels), [[0] * len(counts), 0.0, 0])
+                entry[0] = [a + b for a, b in zip(entry[0], counts)]
+                entry[1] += total
+                entry[2] += count
+    return {'counters': counters, 'gauges': gauges, 'histograms': histograms, 'buckets': buckets}
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names: tuple, values: tuple, extra: str = '') -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+def _number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def render() -> str:
+    """
+    Exporte les métriques agrégées au format texte Prometheus 0.0.4
+    """
+    data = collect_all()
+    lines = []
+    for name, (kind, help_text, label_names) in _DEFINITIONS.items():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        if kind == 'histogram':
+            bounds = data['buckets'].get(name, [])
+            for labels, (counts, total, count) in sorted(data['histograms'].get(name, {}).items()):
+                cumulative = 0
+                for bound, c in zip(bounds, counts):
+                    cumulative += c
+                    le = 'le="%s"' % _number(bound)
+                    lines.append(f"{name}_bucket{_labels(label_names, labels, le)} {cumulative}")
+                le = 'le="+Inf"'
+                lines.append(f"{name}_bucket{_labels(label_names, labels, le)} {count}")
+                lines.append(f"{name}_sum{_labels(label_names, labels)} {_number(total)}")
+                lines.append(f"{name}_count{_labels(label_names, labels)} {count}")
+        else:
+            source = data['gauges'] if kind == 'gauge' else data['counters']
+            series = source.get(name, {})
+            if not series and not label_names:
+                series = {(): 0}
+            for labels, value in sorted(series.items()):
+                lines.append(f"{name}{_labels(label_names, labels)} {_number(value)}")
+    return '\n'.join(lines) + '\n'
+
+
+def init_app(app) -> None:
+    """
+    Instrumente une application Flask et expose /metrics
+    """
+    from flask import Response, g, request
+
+    @app.before_request
+    def _metrics_before_request():
+        g._metrics_started = time.perf_counter()
+        request_started()
+
+    @app.teardown_request
+    def _metrics_teardown_request(exc):
+        started = g.pop('_metrics_started', None)
+        if started is None:
+            return
+        status = getattr(g, '_metrics_status', 500 if exc else 200)
+        request_finished(request.endpoint or 'unmatched', request.method, status,
+                         time.perf_counter() - started)
+
+    @app.after_request
+    def _metrics_after_request(response):
+        g._metrics_status = response.status_code
+        return response
+
+    @app.route('/metrics', methods=['GET'])
+    def metrics():
+        return Response(render(), mimetype='text/plain; version=0.0.4; charset=utf-8')
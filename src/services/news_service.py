@@ -0,0 +1,74 @@
+"""
+Service des actualités : stockage en mémoire et enrichissement (sentiment, résumé) par lots
+"""
+import hashlib
+import logging
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from .ai_service import AIService
+
+logger = logging.getLogger(__name__)
+
+_articles: Dict[str, Dict] = {}
+_articles_lock = threading.Lock()
+
+
+class NewsService:
+    """
+    Service pour gérer les actualités financières
+    """
+
+    def __init__(self):
+        self.ai_service = AIService()
+
+    @staticmethod
+    def _article_id(article: Dict) -> str:
+        key = article.get('url') or f"{article.get('title', '')}\x00{article.get('date', '')}"
+        return hashlib.sha1(key.encode('utf-8')).hexdigest()[:24]
+
+    def enrich(self, articles: List[Dict]) -> List[Dict]:
+        """
+        Ajoute sentiment et résumé à une liste d'articles en un seul passage par modèle
+        """
+        texts = [f"{a.get('title', '')}. {a.get('content') or a.get('summary') or ''}".strip() for a in articles]
+        sentiments = self.ai_service.analyze_sentiments(texts)
+        to_summarize = [i for i, a in enumerate(articles) if a.get('content') and not a.get('summary')]
+        summaries = self.ai_service.summarize_many([texts[i] for i in to_summarize]) if to_summarize else []
+
+        enriched = [{**a, 'sentiment': s} for a, s in zip(articles, sentiments)]
+        for i, summary in zip(to_summarize, summaries):
+            enriched[i]['summary'] = summary['summary']
+        return enriched
+
+    def add_articles(self, articles: List[Dict]) -> List[Dict]:
+        """
+        Enrichit et enregistre des articles (dédoublonnés par URL ou titre et date)
+        """
+        enriched = self.enrich(articles)
+        with _articles_lock:
+            for article in enriched:
+                article['_id'] = self._article_id(article)
+                article.setdefault('date', datetime.utcnow().isoformat())
+                _articles[article['_id']] = article
+        return enriched
+
+    def get_news(self, limit: int = 20, category: Optional[str] = None) -> List[Dict]:
+        with _articles_lock:
+            articles = list(_articles.values())
+        if category:
+            articles = [a for a in articles if a.get('category') == category]
+        articles.sort(key=lambda a: a.get('date', ''), reverse=True)
+        return articles[:limit]
+
+    def get_latest(self, limit: int = 10) -> List[Dict]:
+        return self.get_news(limit)
+
+    def search(self, query: str, limit: int = 20) -> List[Dict]:
+        query = query.lower()
+        with _articles_lock:
+            articles = list(_articles.values())
+        results = [a for a in articles
+                   if query in a.get('title', '').lower() or query in (a.get('content') or '').lower()]
+        return results[:limit]
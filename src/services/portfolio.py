@@ -0,0 +1,178 @@
+"""
+Valorisation et mesures de risque de portefeuilles
+Toutes les positions de tous les portefeuilles d'une requête sont traitées en un seul passage vectorisé.
+"""
+import logging
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from .analytics import CorrelationEngine, ReturnsPanel, get_correlation_engine
+
+logger = logging.getLogger(__name__)
+
+TRADING_DAYS = 252
+
+
+def _price(stock: Dict) -> float:
+    for key in ('last_price', 'close_price'):
+        value = stock.get(key)
+        if value:
+            try:
+                return float(value)
+            except (TypeError, ValueError):
+                continue
+    return np.nan
+
+
+def _num(value, default=np.nan) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return default
+
+
+class PortfolioEngine:
+    """
+    Valorise des listes de positions (ticker, quantité, coût unitaire) contre l'instantané courant
+    et calcule VaR historique, volatilité et drawdown sur l'historique local
+    """
+
+    def __init__(self, correlation_engine: Optional[CorrelationEngine] = None):
+        self.correlation_engine = correlation_engine or get_correlation_engine()
+
+    def evaluate(self, portfolios: List[Dict], stocks: List[Dict], window: int = 250,
+                 confidence: float = 0.95, panel: Optional[ReturnsPanel] = None) -> List[Dict]:
+        """
+        Args:
+            portfolios: liste de {'id': ..., 'positions': [{'ticker', 'qty', 'cost'}]}
+            stocks: instantané normalisé du marché
+            window: nombre de séances pour les mesures de risque
+            confidence: niveau de confiance de la VaR
+
+        Returns:
+            Une évaluation par portefeuille, dans l'ordre reçu
+        """
+        # Instantané : ticker -> prix
+        snapshot_index = {}
+        for i, s in enumerate(stocks):
+            if s.get('ticker'):
+                snapshot_index[s['ticker'].upper()] = i
+            if s.get('isin'):
+                snapshot_index.setdefault(s['isin'], i)
+        snapshot_prices = np.array([_price(s) for s in stocks] + [np.nan], dtype=np.float64)
+        snapshot_tickers = [s.get('ticker') for s in stocks] + [None]
+
+        # Aplatissement de toutes les positions
+        pids, tickers, qtys, costs = [], [], [], []
+        for pid, portfolio in enumerate(portfolios):
+            for position in portfolio.get('positions') or []:
+                pids.append(pid)
+                tickers.append(str(position.get('ticker') or '').strip())
+                qtys.append(_num(position.get('qty'), 0.0))
+                costs.append(_num(position.get('cost')))
+
+        n_portfolios = len(portfolios)
+        pid = np.array(pids, dtype=np.int64)
+        qty = np.array(qtys, dtype=np.float64)
+        cost = np.array(costs, dtype=np.float64)
+        rows = np.array([snapshot_index.get(t.upper(), snapshot_index.get(t, -1)) for t in tickers], dtype=np.int64)
+        known = rows >= 0
+        rows[~known] = len(stocks)
+
+        price = snapshot_prices[rows]
+        value = np.nan_to_num(qty * price)
+        # Sans coût fourni, la position est valorisée à son prix courant ; une valeur inconnue est ignorée
+        basis = np.where(known, np.where(np.isnan(cost), value, qty * cost), 0.0)
+        pnl = value - basis
+        with np.errstate(divide='ignore', invalid='ignore'):
+            pnl_pct = np.where(basis != 0, pnl / np.abs(basis) * 100, 0.0)
+
+        total_value = np.bincount(pid, weights=value, minlength=n_portfolios)
+        total_basis = np.bincount(pid, weights=basis, minlength=n_portfolios)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            weight = np.where(total_value[pid] != 0, value / total_value[pid], 0.0)
+
+        risk = self._risk(pid, rows, qty, value, total_value, snapshot_tickers, window, confidence, panel)
+
+        # Mise en forme, position par position puis par portefeuille
+        positions_out: List[List[Dict]] = [[] for _ in range(n_portfolios)]
+        for k, (p, t, q, pr, v, b, pl, plp, w, ok) in enumerate(zip(
+                pid.tolist(), tickers, qty.tolist(), price.tolist(), value.tolist(), basis.tolist(),
+                pnl.tolist(), pnl_pct.tolist(), weight.tolist(), known.tolist())):
+            positions_out[p].append({
+                'ticker': t,
+                'qty': q,
+                'price': pr if ok and pr == pr else None,
+                'market_value': round(v, 3),
+                'cost_basis': round(b, 3),
+                'pnl': round(pl, 3),
+                'pnl_percent': round(plp, 4),
+                'weight': round(w, 6),
+                'found': ok
+            })
+
+        results = []
+        for p, portfolio in enumerate(portfolios):
+            tv, tb = float(total_value[p]), float(total_basis[p])
+            results.append({
+                'id': portfolio.get('id', p),
+                'market_value': round(tv, 3),
+                'cost_basis': round(tb, 3),
+                'pnl': round(tv - tb, 3),
+                'pnl_percent': round((tv - tb) / abs(tb) * 100, 4) if tb else 0.0,
+                'positions': positions_out[p],
+                'risk': risk[p] if risk else None
+            })
+        return results
+
+    def _risk(self, pid: np.ndarray, rows: np.ndarray, qty: np.ndarray, value: np.ndarray,
+              total_value: np.ndarray, snapshot_tickers: List, window: int, confidence: float,
+              panel: Optional[ReturnsPanel]) -> Optional[List[Dict]]:
+        if panel is None:
+            panel = self.correlation_engine.panel()
+        if panel is None or panel.size == 0 or len(panel.returns) < 2:
+            return None
+
+        n_portfolios = len(total_value)
+        columns = np.array([
+            panel.ticker_index.get((snapshot_tickers[r] or '').upper(), -1) for r in rows.tolist()
+        ], dtype=np.int64)
+        covered = columns >= 0
+
+        # Matrices (valeurs x portefeuilles) des montants et des quantités détenus
+        exposure = np.zeros((panel.size, n_portfolios))
+        shares = np.zeros((panel.size, n_portfolios))
+        np.add.at(exposure, (columns[covered], pid[covered]), value[covered])
+        np.add.at(shares, (columns[covered], pid[covered]), qty[covered])
+
+        returns = np.expm1(panel.returns[-window:])
+        pnl = returns @ exposure
+        with np.errstate(divide='ignore', invalid='ignore'):
+            port_returns = np.where(total_value > 0, pnl / total_value, 0.0)
+
+        var_returns = -np.quantile(port_returns, 1 - confidence, axis=0)
+        volatility = port_returns.std(axis=0, ddof=1) * np.sqrt(TRADING_DAYS)
+
+        # Trajectoire de valeur des quantités actuelles sur la fenêtre
+        prices = np.nan_to_num(panel.prices[-(window + 1):])
+        path = prices @ shares
+        peaks = np.maximum.accumulate(path, axis=0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            drawdown = np.where(peaks > 0, 1 - path / peaks, 0.0)
+        max_drawdown = drawdown.max(axis=0)
+
+        coverage = np.bincount(pid[covered], weights=value[covered], minlength=n_portfolios)
+        as_of = datetime.utcfromtimestamp(int(panel.dates[-1])).strftime('%Y-%m-%d')
+        return [{
+            'window': int(len(returns)),
+            'confidence': confidence,
+            'as_of': as_of,
+            'var_percent': round(float(var_returns[p]) * 100, 4),
+            'var_amount': round(float(var_returns[p] * total_value[p]), 3),
+            'volatility_annualized_percent': round(float(volatility[p]) * 100, 4),
+            'max_drawdown_percent': round(float(max_drawdown[p]) * 100, 4),
+            'current_drawdown_percent': round(float(drawdown[-1, p]) * 100, 4),
+            'history_coverage': round(float(coverage[p] / total_value[p]), 4) if total_value[p] else 0.0
+        } for p in range(n_portfolios)]
@@ -0,0 +1,192 @@
+"""
+Limitation du débit des appels sortants (seau à jetons partagé entre processus)
+
+L'état du seau (jetons, dernier remplissage, demandeurs en attente) est conservé dans un fichier de
+RATE_LIMIT_DIR protégé par un verrou fcntl : les workers gunicorn, les scripts de src/scripts et les
+tâches de fond consomment le même débit. Trois classes de priorité se partagent les jetons :
+
+- interactive : requêtes déclenchées par un utilisateur (par défaut)
+- poller : rafraîchissements de fond (snapshot, indices)
+- backfill : imports et backtests
+
+Une classe ne prend un jeton que si aucune demande de classe supérieure n'attend ; backfill laisse
+en outre une réserve de jetons aux autres classes.
+"""
+import contextvars
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows : limitation au seul processus courant
+    fcntl = None
+
+from . import metrics, tracing
+
+logger = logging.getLogger(__name__)
+
+PRIORITIES = ('interactive', 'poller', 'backfill')
+_RANK = {name: rank for rank, name in enumerate(PRIORITIES)}
+
+# Un demandeur qui n'a pas renouvelé sa présence depuis ce délai est considéré parti
+_WAITER_TTL = 2.0
+
+_priority = contextvars.ContextVar('atlas_rate_limit_priority', default='interactive')
+
+
+class RateLimited(Exception):
+    """Aucun jeton obtenu dans le délai imparti"""
+
+
+@contextmanager
+def priority(name: str) -> Iterator[None]:
+    """
+    Classe de priorité des appels sortants effectués dans ce bloc (et les tâches qui copient le contexte)
+    """
+    if name not in _RANK:
+        raise ValueError(f"Priorité inconnue: {name}")
+    token = _priority.set(name)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def current_priority() -> str:
+    return _priority.get()
+
+
+def enabled() -> bool:
+    return os.getenv('RATE_LIMIT_ENABLED', 'true').lower() != 'false'
+
+
+def rate_limit_dir() -> str:
+    return os.getenv('RATE_LIMIT_DIR', os.path.join(tempfile.gettempdir(), 'atlas_view_ratelimit'))
+
+
+class TokenBucket:
+    """
+    Seau à jetons `rate` jetons/s, capacité `burst`, dont l'état est partagé via `path`
+    """
+
+    def __init__(self, name: str, rate: float, burst: float, path: Optional[str] = None,
+                 backfill_reserve: Optional[float] = None, max_wait: Optional[Dict[str, float]] = None):
+        self.name = name
+        self.rate = rate
+        self.burst = max(burst, 1.0)
+        self.path = path or os.path.join(rate_limit_dir(), f'{name}.json')
+        self.backfill_reserve = backfill_reserve if backfill_reserve is not None else self.burst / 2
+        self.max_wait = max_wait or {}
+        self._local_lock = threading.Lock()
+
+    @contextmanager
+    def _locked_state(self) -> Iterator[Dict]:
+        with self._local_lock:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(self.path, 'a+', encoding='utf-8') as f:
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_EX)
+                try:
+                    f.seek(0)
+                    try:
+                        state = json.loads(f.read() or '{}')
+                    except ValueError:
+                        state = {}
+                    yield state
+                    f.seek(0)
+                    f.truncate()
+                    f.write(json.dumps(state, separators=(',', ':')))
+                    f.flush()
+                finally:
+                    if fcntl is not None:
+                        fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _try_take(self, state: Dict, waiter: str, rank: int, now: float) -> float:
+        """
+        Prend un jeton si la classe y a droit ; sinon inscrit le demandeur et retourne le délai conseillé
+        """
+        tokens = min(self.burst, state.get('tokens', self.burst) + (now - state.get('ts', now)) * self.rate)
+        state['tokens'], state['ts'] = tokens, now
+        waiters = {k: v for k, v in state.get('waiters', {}).items() if now - v[1] < _WAITER_TTL and k != waiter}
+        state['waiters'] = waiters
+
+        reserve = self.backfill_reserve if rank == _RANK['backfill'] else 0.0
+        blocked = any(v[0] < rank for v in waiters.values())
+        if not blocked and tokens >= 1 + reserve:
+            state['tokens'] = tokens - 1
+            return 0.0
+        waiters[waiter] = [rank, now]
+        return max(0.01, (1 + reserve - tokens) / self.rate) if not blocked else 1 / self.rate
+
+    def acquire(self, priority_name: Optional[str] = None, max_wait: Optional[float] = None) -> float:
+        """
+        Attend un jeton ; retourne l'attente en secondes. Lève RateLimited après `max_wait` secondes.
+        """
+        priority_name = priority_name or current_priority()
+        rank = _RANK[priority_name]
+        max_wait = max_wait if max_wait is not None else self.max_wait.get(priority_name)
+        waiter = f"{os.getpid()}-{threading.get_ident()}-{uuid.uuid4().hex[:6]}"
+        started = time.monotonic()
+        while True:
+            with self._locked_state() as state:
+                delay = self._try_take(state, waiter, rank, time.time())
+            waited = time.monotonic() - started
+            if delay == 0.0:
+                metrics.observe_rate_limit(self.name, priority_name, waited, 'ok')
+                return waited
+            if max_wait is not None and waited + delay > max_wait:
+                with self._locked_state() as state:
+                    state.get('waiters', {}).pop(waiter, None)
+                metrics.observe_rate_limit(self.name, priority_name, waited, 'rejected')
+                raise RateLimited(f"Débit {self.name} saturé ({priority_name}, {waited:.1f} s d'attente)")
+            # Réveils fréquents : la présence du demandeur doit être renouvelée avant _WAITER_TTL
+            time.sleep(min(delay, 0.25))
+
+    @contextmanager
+    def slot(self, priority_name: Optional[str] = None) -> Iterator[float]:
+        """
+        Bloc exécuté après obtention d'un jeton (l'attente apparaît comme span ratelimit.wait)
+        """
+        with tracing.span('ratelimit.wait', upstream=self.name):
+            waited = self.acquire(priority_name)
+        yield waited
+
+
+_buckets: Dict[str, TokenBucket] = {}
+_buckets_lock = threading.Lock()
+
+
+def get_rate_limiter(name: str = 'bvmt') -> TokenBucket:
+    """
+    Seau partagé d'un amont (BVMT_RATE_LIMIT jetons/s, BVMT_RATE_BURST de capacité pour 'bvmt')
+    """
+    with _buckets_lock:
+        bucket = _buckets.get(name)
+        if bucket is None:
+            prefix = name.upper()
+            bucket = _buckets[name] = TokenBucket(
+                name,
+                rate=float(os.getenv(f'{prefix}_RATE_LIMIT', 5)),
+                burst=float(os.getenv(f'{prefix}_RATE_BURST', 10)),
+                max_wait={'interactive': float(os.getenv('RATE_LIMIT_MAX_WAIT', 10))}
+            )
+        return bucket
+
+
+@contextmanager
+def limited(name: str = 'bvmt', priority_name: Optional[str] = None) -> Iterator[None]:
+    """
+    Exécute le bloc après obtention d'un jeton sur l'amont `name` (sans effet si RATE_LIMIT_ENABLED=false)
+    """
+    if not enabled():
+        yield
+        return
+    with get_rate_limiter(name).slot(priority_name):
+        yield
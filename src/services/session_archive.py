@@ -0,0 +1,367 @@
+"""
+Archive de fin de séance et rejeu accéléré
+
+En fin de séance, les instantanés de marché conservés (écarts de l'historique des snapshots), les points
+intraday complets de chaque valeur et les carnets d'ordres relevés pendant la séance sont écrits dans un
+seul fichier compressé par séance : SESSION_ARCHIVE_DIR/session-AAAA-MM-JJ.jsonl.gz (une ligne JSON par
+enregistrement, gzip). Les carnets sont relevés à chaque appel de BVMTService.get_order_book et, pour
+toutes les valeurs, toutes les SESSION_ORDERBOOK_INTERVAL secondes par le processus qui interroge le marché.
+
+Le rejeu republie l'archive par les mêmes chemins que le direct, `speed` fois plus vite : valeur partagée
+du snapshot (donc market_feed, anomalies, agrégats, historique des snapshots), tampons intraday et carnets
+d'ordres servis par get_order_book. Pendant le rejeu, ces valeurs ne sont plus rechargées depuis l'amont.
+"""
+import gzip
+import heapq
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from datetime import date, datetime
+from typing import Callable, Dict, Iterator, List, Optional
+
+import numpy as np
+
+from . import rate_limiter
+from .snapshot_history import get_snapshot_history
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+
+
+def archive_dir() -> str:
+    return os.getenv('SESSION_ARCHIVE_DIR', os.path.join(
+        os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'archives'))
+
+
+def archive_path(session: str) -> str:
+    return os.path.join(archive_dir(), f'session-{session}.jsonl.gz')
+
+
+def session_start(session: str) -> float:
+    """Minuit (heure locale) du jour de séance, en secondes epoch"""
+    return datetime.combine(date.fromisoformat(session), datetime.min.time()).timestamp()
+
+
+def _encode(value):
+    # Les snapshots normalisés contiennent des datetime (last_updated), comme dans warm_start
+    if isinstance(value, datetime):
+        return {'$datetime': value.isoformat()}
+    raise TypeError(f"Type non sérialisable: {type(value).__name__}")
+
+
+def _decode(obj: Dict):
+    if len(obj) == 1 and '$datetime' in obj:
+        return datetime.fromisoformat(obj['$datetime'])
+    return obj
+
+
+class SessionRecorder:
+    """
+    Relevé des carnets d'ordres de la séance et déclenchement de l'archive de fin de séance
+    """
+
+    def __init__(self, max_order_books: Optional[int] = None, order_book_interval: Optional[float] = None,
+                 open_at: Optional[str] = None, archive_at: Optional[str] = None):
+        max_order_books = max_order_books or int(os.getenv('SESSION_ORDERBOOK_MAX', 50000))
+        self.order_book_interval = (order_book_interval if order_book_interval is not None
+                                    else float(os.getenv('SESSION_ORDERBOOK_INTERVAL', 300)))
+        self.open_at = open_at if open_at is not None else os.getenv('SESSION_OPEN_AT', '09:00')
+        self.archive_at = archive_at if archive_at is not None else os.getenv('SESSION_ARCHIVE_AT', '14:30')
+        self._lock = threading.Lock()
+        self._order_books = deque(maxlen=max_order_books)  # (ts, isin, carnet)
+        self._last_book: Dict[str, object] = {}
+        self._last_capture = 0.0
+        self._archived: Optional[str] = None
+        self._busy = False
+        # Carnets servis à la place de l'amont pendant un rejeu
+        self.replayed_books: Optional[Dict[str, Dict]] = None
+
+    def record_order_book(self, isin: str, book: Optional[Dict], ts: Optional[float] = None) -> None:
+        """
+        Relève un carnet d'ordres (ignoré si c'est la même réponse amont que le relevé précédent)
+        """
+        if not book:
+            return
+        with self._lock:
+            if self._last_book.get(isin) is book:
+                return
+            self._last_book[isin] = book
+            self._order_books.append((time.time() if ts is None else ts, isin, book))
+
+    def order_books(self, start: float, end: float) -> List[tuple]:
+        with self._lock:
+            return [entry for entry in self._order_books if start <= entry[0] < end]
+
+    def capture_order_books(self, isins: List[str], bvmt_service=None) -> int:
+        """
+        Relève le carnet de chaque ISIN (priorité backfill : cède le débit aux utilisateurs)
+        """
+        from .bvmt_service import BVMTService
+        bvmt_service = bvmt_service or BVMTService()
+        captured = 0
+        with rate_limiter.priority('backfill'):
+            for isin in isins:
+                try:
+                    if bvmt_service.get_order_book(isin):
+                        captured += 1
+                except rate_limiter.RateLimited:
+                    break
+        return captured
+
+    def tick(self, stocks: list, now: Optional[datetime] = None) -> bool:
+        """
+        Appelé périodiquement par le processus qui interroge le marché : relève les carnets toutes les
+        `order_book_interval` secondes pendant la séance, puis écrit l'archive une fois par jour après
+        `archive_at` (sans remplacer une archive existante, écrite avant un redémarrage par exemple ; réessayé
+        à chaque appel tant que l'archive n'a pas pu être écrite).
+        Relevés et archivage s'exécutent dans un thread dédié ; retourne True si une tâche a été lancée.
+        """
+        now = now or datetime.now()
+        session = now.date().isoformat()
+        clock = now.strftime('%H:%M')
+        if self.archive_at and clock >= self.archive_at:
+            if self._archived == session:
+                return False
+            return self._start(self._archive, session)
+        if (clock >= self.open_at and self.order_book_interval > 0
+                and time.monotonic() - self._last_capture >= self.order_book_interval):
+            isins = [s['isin'] for s in stocks if s.get('isin')]
+            if self._start(self.capture_order_books, isins):
+                self._last_capture = time.monotonic()
+                return True
+        return False
+
+    def _start(self, target: Callable, *args) -> bool:
+        """Lance `target` dans un thread de fond, sauf si une tâche précédente est encore en cours"""
+        with self._lock:
+            if self._busy:
+                return False
+            self._busy = True
+
+        def run():
+            try:
+                target(*args)
+            except Exception as e:
+                logger.error(f"Erreur dans la tâche de séance {target.__name__}: {e}")
+            finally:
+                self._busy = False
+        threading.Thread(target=run, name='session-recorder', daemon=True).start()
+        return True
+
+    def _archive(self, session: str) -> Optional[Dict]:
+        """
+        Écrit l'archive de la séance ; la séance n'est marquée archivée qu'une fois le fichier présent,
+        sinon (aucun instantané, erreur d'écriture) le prochain appel à tick réessaie
+        """
+        if os.path.exists(archive_path(session)):
+            self._archived = session
+            return None
+        stats = write_archive(session)
+        if stats and stats.get('path'):
+            self._archived = session
+        return stats
+
+
+_session_recorder = SessionRecorder()
+
+
+def get_session_recorder() -> SessionRecorder:
+    """
+    Retourne le relevé de séance du processus
+    """
+    return _session_recorder
+
+
+def write_archive(session: Optional[str] = None, path: Optional[str] = None, bvmt_service=None) -> Optional[Dict]:
+    """
+    Écrit l'archive d'une séance (aujourd'hui par défaut) ; retourne ses statistiques, ou None sans rien
+    écrire si aucun instantané de la séance n'a été conservé (processus démarré après la clôture par exemple)
+    """
+    from .bvmt_service import BVMTService
+    from .intraday import parse_points
+
+    session = session or date.today().isoformat()
+    path = path or archive_path(session)
+    bvmt_service = bvmt_service or BVMTService()
+    start = session_start(session)
+    end = start + 86400
+
+    snapshots = get_snapshot_history().export(start, end)
+    if not snapshots:
+        logger.warning(f"Séance {session}: aucun instantané conservé, archive non écrite")
+        return None
+    order_books = get_session_recorder().order_books(start, end)
+    isins = []
+    for _, event in snapshots:
+        isins.extend(row['isin'] for row in event.get('rows', []) + event.get('added', []))
+    isins = list(dict.fromkeys(isins + [isin for _, isin, _ in order_books]))
+
+    # Points intraday complets de la séance, relus à l'amont (les tampons ne gardent que les plus récents)
+    intraday = {}
+    with rate_limiter.priority('backfill'):
+        for isin in isins:
+            try:
+                times, prices, volumes = parse_points(bvmt_service.get_stock_intraday(isin))
+            except rate_limiter.RateLimited:
+                logger.warning(f"Archive {session}: débit saturé, points intraday de {isin} omis")
+                continue
+            if len(times):
+                intraday[isin] = {'time': times.tolist(), 'price': prices.tolist(), 'volume': volumes.tolist()}
+
+    events = sorted([(ts, 'snapshot', None, event) for ts, event in snapshots]
+                    + [(ts, 'order_book', isin, book) for ts, isin, book in order_books],
+                    key=lambda e: e[0])
+    header = {
+        'type': 'session',
+        'version': FORMAT_VERSION,
+        'session': session,
+        'created_at': time.time(),
+        'snapshots': len(snapshots),
+        'order_books': len(order_books),
+        'intraday_isins': len(intraday),
+        'intraday_points': sum(len(p['time']) for p in intraday.values())
+    }
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    raw = 0
+    with gzip.open(tmp, 'wt', encoding='utf-8', compresslevel=6) as f:
+        def write(record: Dict) -> None:
+            nonlocal raw
+            line = json.dumps(record, separators=(',', ':'), ensure_ascii=False, default=_encode)
+            raw += len(line) + 1
+            f.write(line)
+            f.write('\n')
+        write(header)
+        for isin, points in intraday.items():
+            write({'type': 'intraday', 'isin': isin, **points})
+        for ts, kind, isin, payload in events:
+            if kind == 'snapshot':
+                write({'type': 'snapshot', 'ts': ts, **payload})
+            else:
+                write({'type': 'order_book', 'ts': ts, 'isin': isin, 'book': payload})
+    os.replace(tmp, path)
+    stats = {**header, 'path': path, 'bytes': os.path.getsize(path), 'raw_bytes': raw}
+    logger.info(f"Séance {session} archivée dans {path} ({stats['bytes']} octets, {raw} non compressés)")
+    return stats
+
+
+def read_archive(path: str) -> Iterator[Dict]:
+    """
+    Enregistrements d'une archive dans l'ordre du fichier (en-tête, points intraday, puis événements datés)
+    """
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line, object_hook=_decode)
+
+
+class SessionReplayer:
+    """
+    Rejoue une archive de séance à `speed` fois la vitesse réelle par les chemins d'ingestion du direct
+    """
+
+    def __init__(self, path: str, speed: float = 10.0, sleep: Callable[[float], None] = time.sleep):
+        self.path = path
+        self.speed = max(speed, 1e-6)
+        self.sleep = sleep
+        self._stop = threading.Event()
+        self.stats = {'snapshots': 0, 'order_books': 0, 'intraday_points': 0, 'lag_seconds': 0.0}
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def run(self, on_snapshot: Optional[Callable[[list], None]] = None) -> Dict:
+        from .data_service import market_snapshot
+        from .intraday import get_intraday_store
+
+        records = read_archive(self.path)
+        header = next(records, None)
+        if not header or header.get('type') != 'session' or header.get('version') != FORMAT_VERSION:
+            raise ValueError(f"Archive de séance non reconnue: {self.path}")
+        session = header['session']
+        midnight = session_start(session)
+
+        intraday, events = {}, []
+        for record in records:
+            if record['type'] == 'intraday':
+                intraday[record['isin']] = tuple(np.asarray(record[c], dtype=dtype) for c, dtype in
+                                                 (('time', np.int64), ('price', np.float64), ('volume', np.float64)))
+            else:
+                events.append(record)
+        # Chaque heure de point intraday devient un instant du rejeu, fusionné avec les événements datés
+        ticks = np.unique(np.concatenate([t for t, _, _ in intraday.values()])) + midnight if intraday else []
+        timeline = heapq.merge(((float(ts), 1, None) for ts in ticks),
+                               ((record['ts'], 0, record) for record in events), key=lambda e: (e[0], e[1]))
+
+        store = get_intraday_store()
+        recorder = get_session_recorder()
+        fed = dict.fromkeys(intraday, 0)
+        rows, order = {}, []
+        # Le direct est suspendu : les valeurs rejouées ne sont pas écrasées par l'amont
+        loader, poll_interval = market_snapshot.loader, store.poll_interval
+        market_snapshot.loader = lambda: market_snapshot.value
+        store.poll_interval = float('inf')
+        recorder.replayed_books = {}
+        started, first_ts = time.monotonic(), None
+        try:
+            for ts, _, record in timeline:
+                if self._stop.is_set():
+                    break
+                first_ts = ts if first_ts is None else first_ts
+                delay = (ts - first_ts) / self.speed - (time.monotonic() - started)
+                if delay > 0:
+                    self.sleep(delay)
+                else:
+                    self.stats['lag_seconds'] = max(self.stats['lag_seconds'], -delay)
+
+                if record is None:
+                    clock = ts - midnight
+                    for isin, (times, prices, volumes) in intraday.items():
+                        known = int(np.searchsorted(times, clock, side='right'))
+                        if known > fed[isin]:
+                            buffer = store.buffer(isin)
+                            with buffer.lock:
+                                self.stats['intraday_points'] += buffer.ingest(
+                                    times[:known], prices[:known], volumes[:known], session)
+                                buffer.polled_at = time.monotonic()
+                            fed[isin] = known
+                elif record['type'] == 'order_book':
+                    recorder.replayed_books[record['isin']] = record['book']
+                    self.stats['order_books'] += 1
+                else:
+                    order = self._apply(rows, order, record)
+                    snapshot = [rows[isin] for isin in order]
+                    market_snapshot.set(snapshot)
+                    self.stats['snapshots'] += 1
+                    if on_snapshot is not None:
+                        on_snapshot(snapshot)
+        finally:
+            market_snapshot.loader = loader
+            store.poll_interval = poll_interval
+            recorder.replayed_books = None
+        self.stats['elapsed_seconds'] = round(time.monotonic() - started, 3)
+        self.stats['lag_seconds'] = round(self.stats['lag_seconds'], 3)
+        return {'session': session, 'speed': self.speed, **self.stats}
+
+    @staticmethod
+    def _apply(rows: Dict[str, Dict], order: List[str], record: Dict) -> List[str]:
+        """Applique un enregistrement de snapshot (image complète ou écart) ; seules les lignes modifiées sont recréées"""
+        if 'rows' in record:
+            rows.clear()
+            rows.update((row['isin'], row) for row in record['rows'])
+            return list(rows)
+        for isin in record.get('removed', ()):
+            rows.pop(isin, None)
+        deleted = record.get('deleted', {})
+        for isin, changes in record.get('changes', {}).items():
+            row = {**rows[isin], **changes}
+            for field in deleted.get(isin, ()):
+                row.pop(field, None)
+            rows[isin] = row
+        rows.update((row['isin'], row) for row in record.get('added', ()))
+        return record['order'] if record.get('order') else order
@@ -0,0 +1,286 @@
+"""
+Historique versionné des instantanés de marché de la séance, interrogeable à une date donnée (as_of)
+
+Chaque instantané publié devient une version. Toutes les SNAPSHOT_KEYFRAME_EVERY versions, une image
+complète (keyframe) est conservée : la liste des lignes, partagées avec les versions précédentes tant
+qu'elles n'ont pas changé. Les autres versions ne stockent que leur écart à la précédente : pour chaque
+ISIN modifié, les seuls champs dont la valeur a changé, plus les lignes ajoutées et les ISIN retirés.
+Une version se reconstruit depuis la keyframe qui la précède en rejouant au plus
+SNAPSHOT_KEYFRAME_EVERY - 1 écarts ; les reconstructions récentes sont mémorisées.
+
+Les versions plus anciennes que SNAPSHOT_HISTORY_RETENTION secondes sont abandonnées : la plus ancienne
+version conservée est alors convertie en keyframe.
+"""
+import logging
+import os
+import sys
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+from . import market_feed
+from .cache import get_cache, sizeof
+
+logger = logging.getLogger(__name__)
+
+# Champ absent de la nouvelle ligne
+_DELETED = object()
+
+
+def parse_as_of(value) -> float:
+    """
+    Convertit un paramètre as_of en secondes epoch : timestamp (s ou ms), date-heure ISO
+    ("2025-09-26T11:00:00", heure locale si sans fuseau) ou heure du jour ("11:00", "11:00:30").
+    Lève ValueError si la valeur est illisible.
+    """
+    text = str(value).strip()
+    try:
+        number = float(text)
+        return number / 1000 if number > 1e11 else number
+    except ValueError:
+        pass
+    if len(text) <= 8 and ':' in text:
+        try:
+            clock = datetime.strptime(text, '%H:%M:%S' if text.count(':') == 2 else '%H:%M').time()
+        except ValueError:
+            raise ValueError(f"Paramètre as_of invalide: {value}")
+        return datetime.combine(datetime.now().date(), clock).timestamp()
+    try:
+        return datetime.fromisoformat(text.replace('Z', '+00:00')).timestamp()
+    except ValueError:
+        raise ValueError(f"Paramètre as_of invalide: {value}")
+
+
+def iso_utc(ts: float) -> str:
+    """Date ISO 8601 en UTC avec fuseau explicite, comme `timestamp` dans les réponses"""
+    return datetime.fromtimestamp(ts, tz=timezone.utc).isoformat()
+
+
+class _Version:
+    """
+    Une version : image complète (rows) ou écart à la version précédente
+    """
+
+    __slots__ = ('seq', 'ts', 'rows', 'changes', 'added', 'removed', 'order', 'nbytes')
+
+    def __init__(self, seq: int, ts: float):
+        self.seq = seq
+        self.ts = ts
+        self.rows: Optional[Tuple[Dict, ...]] = None
+        self.changes: Dict[str, Dict] = {}
+        self.added: Dict[str, Dict] = {}
+        self.removed: Tuple[str, ...] = ()
+        self.order: Optional[Tuple[str, ...]] = None
+        self.nbytes = 0
+
+    @property
+    def keyframe(self) -> bool:
+        return self.rows is not None
+
+
+def _diff(previous: Dict, row: Dict) -> Dict:
+    changes = {k: v for k, v in row.items() if k not in previous or previous[k] != v}
+    changes.update((k, _DELETED) for k in previous if k not in row)
+    return changes
+
+
+def _delta(previous: Dict[str, Dict], current: Dict[str, Dict]) -> Tuple[Dict, Dict, Tuple[str, ...]]:
+    """(champs modifiés par ISIN, lignes ajoutées, ISIN retirés) entre deux instantanés indexés par ISIN"""
+    changes, added = {}, {}
+    for isin, row in current.items():
+        before = previous.get(isin)
+        if before is row:
+            continue
+        if before is None:
+            added[isin] = row
+        else:
+            diff = _diff(before, row)
+            if diff:
+                changes[isin] = diff
+    return changes, added, tuple(isin for isin in previous if isin not in current)
+
+
+def _apply(row: Dict, changes: Dict) -> Dict:
+    updated = dict(row)
+    for key, value in changes.items():
+        if value is _DELETED:
+            updated.pop(key, None)
+        else:
+            updated[key] = value
+    return updated
+
+
+class SnapshotHistory:
+    """
+    Versions des instantanés de marché sur la fenêtre de rétention
+    """
+
+    def __init__(self, retention: Optional[float] = None, keyframe_every: Optional[int] = None):
+        self.retention = retention if retention is not None else float(os.getenv('SNAPSHOT_HISTORY_RETENTION', 8 * 3600))
+        self.keyframe_every = max(1, keyframe_every if keyframe_every is not None
+                                  else int(os.getenv('SNAPSHOT_KEYFRAME_EVERY', 32)))
+        self._lock = threading.Lock()
+        self._versions: List[_Version] = []
+        self._times: List[float] = []
+        self._seq = 0
+        self._since_keyframe = 0
+        # Dernier instantané enregistré (lignes du snapshot courant, partagées) et ordre de ses ISIN
+        self._last: Dict[str, Dict] = {}
+        self._last_order: Tuple[str, ...] = ()
+        self._changed_cells = 0
+        self._rebuilt = get_cache('snapshot_as_of', weight=0.5, max_entries=16)
+
+    @property
+    def enabled(self) -> bool:
+        return self.retention > 0
+
+    def record(self, stocks: list, ts: Optional[float] = None) -> None:
+        """
+        Enregistre un instantané (consommateur de market_feed) ; `ts` par défaut : maintenant
+        """
+        if not self.enabled:
+            return
+        ts = time.time() if ts is None else ts
+        current = {}
+        for stock in stocks:
+            isin = stock.get('isin')
+            if isin:
+                current[isin] = stock
+        order = tuple(current)
+        with self._lock:
+            if self._times and ts < self._times[-1]:
+                # Horloge revenue en arrière : la version reste datée après la précédente
+                ts = self._times[-1]
+            self._seq += 1
+            version = _Version(self._seq, ts)
+            if not self._versions or self._since_keyframe + 1 >= self.keyframe_every:
+                version.rows = tuple(current.values())
+                # Seules les lignes modifiées occupent de la mémoire en propre
+                version.nbytes = sys.getsizeof(version.rows) + sum(sizeof(row) for isin, row in current.items()
+                                                                if self._last.get(isin) is not row)
+                self._since_keyframe = 0
+            else:
+                version.changes, version.added, version.removed = _delta(self._last, current)
+                self._changed_cells += sum(len(c) for c in version.changes.values())
+                if order != self._last_order:
+                    version.order = order
+                version.nbytes = sizeof(version.changes) + sizeof(version.added) + sizeof(version.order)
+                self._since_keyframe += 1
+            self._versions.append(version)
+            self._times.append(ts)
+            self._last, self._last_order = current, order
+            self._prune(ts - self.retention)
+
+    def _rebuild(self, index: int) -> List[Dict]:
+        """Lignes de la version d'indice `index` (verrou détenu)"""
+        version = self._versions[index]
+        cached = self._rebuilt.get(version.seq)
+        if cached is not None:
+            return cached
+        start = index
+        while not self._versions[start].keyframe:
+            start -= 1
+        rows = {row['isin']: row for row in self._versions[start].rows}
+        order = list(rows)
+        for delta in self._versions[start + 1:index + 1]:
+            order = self._advance(rows, order, delta)
+        result = [rows[isin] for isin in order]
+        self._rebuilt.set(version.seq, result)
+        return result
+
+    @staticmethod
+    def _advance(rows: Dict[str, Dict], order, delta: _Version):
+        """Applique l'écart `delta` aux lignes indexées par ISIN ; retourne l'ordre résultant"""
+        for isin in delta.removed:
+            rows.pop(isin, None)
+        for isin, changes in delta.changes.items():
+            rows[isin] = _apply(rows[isin], changes)
+        rows.update(delta.added)
+        # Tout ajout ou retrait modifie l'ordre, toujours enregistré dans ce cas
+        return delta.order if delta.order is not None else order
+
+    def _prune(self, cutoff: float) -> None:
+        # La dernière version antérieure à la limite reste la base des requêtes juste après celle-ci
+        keep_from = bisect_right(self._times, cutoff) - 1
+        if keep_from <= 0:
+            return
+        base = self._versions[keep_from]
+        if not base.keyframe:
+            base.rows = tuple(self._rebuild(keep_from))
+            base.nbytes = sizeof(base.rows)
+            base.changes, base.added, base.removed, base.order = {}, {}, (), None
+        del self._versions[:keep_from]
+        del self._times[:keep_from]
+
+    def as_of(self, ts: float) -> Optional[Tuple[float, List[Dict]]]:
+        """
+        (date de la version, lignes) de l'instantané en vigueur à `ts` ; None si `ts` précède la rétention.
+        Les lignes sont partagées et en lecture seule.
+        """
+        with self._lock:
+            index = bisect_right(self._times, ts) - 1
+            if index < 0:
+                return None
+            return self._times[index], self._rebuild(index)
+
+    def export(self, start: Optional[float] = None, end: Optional[float] = None) -> List[Tuple[float, Dict]]:
+        """
+        Versions comprises entre `start` et `end` sous forme sérialisable (archivage) : la première en image
+        complète {'rows'}, les suivantes en écarts {'changes', 'deleted', 'added', 'removed', 'order'}
+        (clés vides omises), y compris les keyframes intermédiaires
+        """
+        with self._lock:
+            lo = bisect_left(self._times, start) if start is not None else 0
+            hi = bisect_right(self._times, end) if end is not None else len(self._times)
+            if lo >= hi:
+                return []
+            state = {row['isin']: row for row in self._rebuild(lo)}
+            order = tuple(state)
+            events = [(self._times[lo], {'rows': list(state.values())})]
+            for ts, version in zip(self._times[lo + 1:hi], self._versions[lo + 1:hi]):
+                if version.keyframe:
+                    current = {row['isin']: row for row in version.rows}
+                    changes, added, removed = _delta(state, current)
+                    new_order = tuple(current)
+                    state = current
+                else:
+                    changes, added, removed = version.changes, version.added, version.removed
+                    new_order = self._advance(state, order, version)
+                event = {
+                    'changes': {isin: {k: v for k, v in c.items() if v is not _DELETED} for isin, c in changes.items()},
+                    'deleted': {isin: [k for k, v in c.items() if v is _DELETED]
+                                for isin, c in changes.items() if any(v is _DELETED for v in c.values())},
+                    'added': list(added.values()),
+                    'removed': list(removed),
+                    'order': list(new_order) if tuple(new_order) != tuple(order) else None
+                }
+                events.append((ts, {k: v for k, v in event.items() if v}))
+                order = new_order
+            return events
+
+    def stats(self) -> Dict:
+        with self._lock:
+            versions = len(self._versions)
+            return {
+                'versions': versions,
+                'keyframes': sum(1 for v in self._versions if v.keyframe),
+                'oldest': iso_utc(self._times[0]) if versions else None,
+                'newest': iso_utc(self._times[-1]) if versions else None,
+                'retention_seconds': self.retention,
+                'keyframe_every': self.keyframe_every,
+                'changed_cells': self._changed_cells,
+                'approx_bytes': sum(v.nbytes for v in self._versions)
+            }
+
+
+_snapshot_history = SnapshotHistory()
+market_feed.subscribe(_snapshot_history.record)
+
+
+def get_snapshot_history() -> SnapshotHistory:
+    """
+    Retourne l'historique des instantanés du processus (alimenté par market_feed)
+    """
+    return _snapshot_history
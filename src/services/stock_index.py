@@ -0,0 +1,258 @@
+"""
+Index triés du snapshot de marché pour la pagination par curseur de /api/stocks/
+
+Pour chaque colonne triable, l'ordre des lignes est calculé une seule fois par snapshot (à la première
+demande). Une combinaison de filtres est évaluée une fois par snapshot et par tri. Une page se résout
+ensuite par recherche dichotomique de la position du curseur, puis lecture des `limit` lignes suivantes.
+Le curseur désigne la dernière ligne servie par sa valeur de tri et son ISIN : il reste valable
+d'un snapshot à l'autre.
+"""
+import base64
+import binascii
+import json
+import logging
+import math
+import threading
+from bisect import bisect_left, bisect_right
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Colonnes triables et nature de leur clé de tri
+SORT_FIELDS = {
+    'ticker': 'text',
+    'stock_name': 'text',
+    'val_group': 'text',
+    'last_price': 'number',
+    'open_price': 'number',
+    'high_price': 'number',
+    'low_price': 'number',
+    'close_price': 'number',
+    'change': 'number',
+    'change_percent': 'number',
+    'volume': 'number',
+    'market_cap': 'number'
+}
+NUMBER_FIELDS = tuple(f for f, kind in SORT_FIELDS.items() if kind == 'number')
+# Filtres par égalité (valeurs séparées par des virgules)
+EQUALITY_FILTERS = ('val_group', 'trading_status', 'status')
+DEFAULT_SORT = 'ticker'
+
+_MAX_VIEWS = 64
+
+
+def _sort_key(value, kind: str):
+    if value is None:
+        return None
+    if kind == 'number':
+        try:
+            number = float(value)
+        except (TypeError, ValueError):
+            return None
+        return None if math.isnan(number) else number
+    return str(value).casefold()
+
+
+def encode_cursor(sort: str, order: str, key: Tuple) -> str:
+    raw = json.dumps([sort, order, *key], separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Tuple[str, str, Tuple]:
+    """
+    Retourne (tri, ordre, clé) d'un curseur ; lève ValueError s'il est illisible
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        sort, order, is_null, value, isin = json.loads(raw.decode('utf-8'))
+    except (ValueError, TypeError, binascii.Error, UnicodeDecodeError):
+        raise ValueError("Curseur invalide")
+    if sort not in SORT_FIELDS or order not in ('asc', 'desc') or not isinstance(isin, str) \
+            or not isinstance(is_null, bool) or is_null != (value is None):
+        raise ValueError("Curseur invalide")
+    # La valeur est comparée aux clés de l'index : elle doit être du type de la colonne de tri
+    if not is_null:
+        if SORT_FIELDS[sort] == 'number':
+            if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value):
+                raise ValueError("Curseur invalide")
+            value = float(value)
+        elif not isinstance(value, str):
+            raise ValueError("Curseur invalide")
+    return sort, order, (is_null, value, isin)
+
+
+def parse_filters(args) -> Dict:
+    """
+    Extrait les filtres reconnus des paramètres de requête : search, val_group, trading_status, status
+    (listes séparées par des virgules) et min_<champ> / max_<champ> pour les colonnes numériques
+    """
+    filters = {}
+    search = (args.get('search') or '').strip()
+    if search:
+        filters['search'] = search.casefold()
+    for name in EQUALITY_FILTERS:
+        if args.get(name):
+            filters[name] = tuple(sorted(v.strip() for v in args[name].split(',') if v.strip()))
+    for field in NUMBER_FIELDS:
+        for bound in ('min', 'max'):
+            raw = args.get(f'{bound}_{field}')
+            if raw not in (None, ''):
+                try:
+                    filters[f'{bound}_{field}'] = float(raw)
+                except ValueError:
+                    raise ValueError(f"Paramètre {bound}_{field} invalide: {raw}")
+    return filters
+
+
+def _matcher(filters: Dict):
+    search = filters.get('search')
+    equalities = [(name, set(filters[name])) for name in EQUALITY_FILTERS if name in filters]
+    bounds = [(key[4:], key[:3], value) for key, value in filters.items() if key[:4] in ('min_', 'max_')]
+
+    def match(stock: Dict) -> bool:
+        if search and not any(search in str(stock.get(f) or '').casefold()
+                              for f in ('ticker', 'stock_name', 'arab_name')):
+            return False
+        for name, accepted in equalities:
+            if str(stock.get(name)) not in accepted:
+                return False
+        for field, bound, limit in bounds:
+            value = _sort_key(stock.get(field), 'number')
+            if value is None or (value < limit if bound == 'min' else value > limit):
+                return False
+        return True
+    return match
+
+
+class _View:
+    """
+    Lignes dans l'ordre d'une colonne : valeurs renseignées triées par (valeur, ISIN), puis lignes sans valeur
+    triées par ISIN (toujours en fin de liste, quel que soit l'ordre)
+    """
+
+    def __init__(self, keys: List[Tuple], positions: List[int], null_isins: List[str], null_positions: List[int]):
+        self.keys = keys
+        self.positions = positions
+        self.null_isins = null_isins
+        self.null_positions = null_positions
+
+    def __len__(self) -> int:
+        return len(self.positions) + len(self.null_positions)
+
+    def start_after(self, key: Tuple, descending: bool) -> int:
+        """Rang de la première ligne qui suit la clé de curseur `key`"""
+        is_null, value, isin = key
+        if is_null:
+            return len(self.keys) + bisect_right(self.null_isins, isin)
+        if descending:
+            return len(self.keys) - bisect_left(self.keys, (value, isin))
+        return bisect_right(self.keys, (value, isin))
+
+    def at(self, rank: int, descending: bool) -> Tuple[int, Tuple]:
+        """Position dans le snapshot et clé de curseur de la ligne de rang `rank`"""
+        n = len(self.keys)
+        if rank >= n:
+            i = rank - n
+            return self.null_positions[i], (True, None, self.null_isins[i])
+        i = n - 1 - rank if descending else rank
+        value, isin = self.keys[i]
+        return self.positions[i], (False, value, isin)
+
+    def filtered(self, accepted: set) -> '_View':
+        keep = [i for i, p in enumerate(self.positions) if p in accepted]
+        keep_null = [i for i, p in enumerate(self.null_positions) if p in accepted]
+        return _View([self.keys[i] for i in keep], [self.positions[i] for i in keep],
+                     [self.null_isins[i] for i in keep_null], [self.null_positions[i] for i in keep_null])
+
+
+class StockIndex:
+    """
+    Index d'un snapshot (liste d'actions normalisées, non modifiée) construits à la demande
+    """
+
+    def __init__(self, stocks: list):
+        self.stocks = stocks
+        self._views: Dict[Tuple, _View] = {}
+        self._lock = threading.Lock()
+
+    def _column(self, sort: str) -> _View:
+        kind = SORT_FIELDS[sort]
+        keyed, nulls = [], []
+        for position, stock in enumerate(self.stocks):
+            isin = str(stock.get('isin') or '')
+            value = _sort_key(stock.get(sort), kind)
+            if value is None:
+                nulls.append((isin, position))
+            else:
+                keyed.append(((value, isin), position))
+        keyed.sort()
+        nulls.sort()
+        return _View([k for k, _ in keyed], [p for _, p in keyed],
+                     [i for i, _ in nulls], [p for _, p in nulls])
+
+    def view(self, sort: str, filters: Optional[Dict] = None) -> _View:
+        filter_key = tuple(sorted((filters or {}).items()))
+        with self._lock:
+            view = self._views.get((sort, filter_key))
+            if view is None:
+                view = self._views.get((sort, ()))
+                if view is None:
+                    view = self._column(sort)
+                if filter_key:
+                    match = _matcher(filters)
+                    view = view.filtered({p for p, stock in enumerate(self.stocks) if match(stock)})
+                if len(self._views) >= _MAX_VIEWS:
+                    self._views.clear()
+                self._views[(sort, filter_key)] = view
+            return view
+
+    def page(self, sort: str = DEFAULT_SORT, order: str = 'asc', limit: int = 20, cursor: Optional[str] = None,
+             page: Optional[int] = None, filters: Optional[Dict] = None) -> Dict:
+        """
+        Une page de lignes (dictionnaires du snapshot, partagés) et ses informations de pagination
+        """
+        if sort not in SORT_FIELDS:
+            raise ValueError(f"Tri non supporté: {sort} (valeurs possibles: {', '.join(SORT_FIELDS)})")
+        if order not in ('asc', 'desc'):
+            raise ValueError(f"Ordre non supporté: {order} (asc ou desc)")
+        descending = order == 'desc'
+        view = self.view(sort, filters)
+        if cursor:
+            cursor_sort, cursor_order, key = decode_cursor(cursor)
+            if (cursor_sort, cursor_order) != (sort, order):
+                raise ValueError("Curseur obtenu avec un autre tri")
+            start = view.start_after(key, descending)
+        else:
+            start = (max(page or 1, 1) - 1) * limit
+        end = min(start + limit, len(view))
+
+        rows, last_key = [], None
+        for rank in range(start, end):
+            position, last_key = view.at(rank, descending)
+            rows.append(self.stocks[position])
+        pagination = {
+            'limit': limit,
+            'total': len(view),
+            'pages': (len(view) + limit - 1) // limit if limit else 0,
+            'sort': sort,
+            'order': order,
+            'next_cursor': encode_cursor(sort, order, last_key) if end < len(view) and last_key else None
+        }
+        if not cursor:
+            pagination['page'] = max(page or 1, 1)
+        return {'rows': rows, 'pagination': pagination}
+
+
+_index: Optional[StockIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_stock_index(stocks: list) -> StockIndex:
+    """
+    Retourne l'index du snapshot `stocks`, reconstruit seulement lorsque le snapshot change
+    """
+    global _index
+    with _index_lock:
+        if _index is None or _index.stocks is not stocks:
+            _index = StockIndex(stocks)
+        return _index
@@ -0,0 +1,214 @@
+"""
+Traçage par requête (spans imbriqués), en-tête Server-Timing, journal des requêtes lentes
+et profilage cProfile à la demande
+"""
+import contextvars
+import cProfile
+import functools
+import logging
+import os
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+_current = contextvars.ContextVar('atlas_current_span', default=None)
+_profile_lock = threading.Lock()
+_TOKEN_RE = re.compile(r'[^A-Za-z0-9_.-]')
+
+
+class Span:
+    """
+    Intervalle de temps nommé, avec ses attributs et ses spans enfants
+    """
+    __slots__ = ('name', 'attrs', 'start', 'end', 'children')
+
+    def __init__(self, name: str, attrs: Optional[Dict] = None):
+        self.name = name
+        self.attrs = attrs or {}
+        self.start = time.perf_counter()
+        self.end = None
+        self.children: List['Span'] = []
+
+    @property
+    def duration_ms(self) -> float:
+        end = self.end if self.end is not None else time.perf_counter()
+        return (end - self.start) * 1000
+
+    def format_tree(self, indent: int = 0) -> str:
+        attrs = ' '.join(f"{k}={v}" for k, v in self.attrs.items())
+        lines = [f"{'  ' * indent}{self.name} {self.duration_ms:.1f} ms{' ' + attrs if attrs else ''}"]
+        for child in self.children:
+            lines.append(child.format_tree(indent + 1))
+        return '\n'.join(lines)
+
+
+@contextmanager
+def span(name: str, **attrs) -> Iterator[Optional[Span]]:
+    """
+    Mesure un bloc de code ; sans trace active (hors requête HTTP) le coût est négligeable
+    """
+    parent = _current.get()
+    if parent is None:
+        yield None
+        return
+    current = Span(name, attrs)
+    parent.children.append(current)
+    token = _current.set(current)
+    try:
+        yield current
+    finally:
+        current.end = time.perf_counter()
+        _current.reset(token)
+
+
+def traced(name: str):
+    """
+    Décorateur : exécute la fonction dans un span
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _current.get() is None:
+                return func(*args, **kwargs)
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def start_trace(name: str) -> contextvars.Token:
+    return _current.set(Span(name))
+
+
+def current_trace() -> Optional[Span]:
+    return _current.get()
+
+
+def finish_trace(token: contextvars.Token) -> Optional[Span]:
+    root = _current.get()
+    _current.reset(token)
+    if root is not None:
+        root.end = time.perf_counter()
+    return root
+
+
+def server_timing(root: Span, limit: int = 20) -> str:
+    """
+    Construit l'en-tête Server-Timing : durée cumulée par nom de span, puis durée totale
+    """
+    totals: Dict[str, list] = {}
+    stack = list(root.children)
+    while stack:
+        node = stack.pop()
+        entry = totals.setdefault(node.name, [0.0, 0])
+        entry[0] += node.duration_ms
+        entry[1] += 1
+        stack.extend(node.children)
+    ordered = sorted(totals.items(), key=lambda item: item[1][0], reverse=True)[:limit]
+    parts = [f'{_TOKEN_RE.sub("_", name)};desc="{count}x";dur={total:.1f}' for name, (total, count) in ordered]
+    parts.append(f'total;dur={root.duration_ms:.1f}')
+    return ', '.join(parts)
+
+
+# Profilage
+
+def profile_dir() -> str:
+    return os.getenv('PROFILE_DIR', os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'profiles'))
+
+
+def profiling_requested(header_value: Optional[str]) -> bool:
+    """
+    Profilage si l'en-tête X-Profile est présent (autorisé par PROFILING_ENABLED=true)
+    ou par échantillonnage aléatoire (PROFILE_SAMPLE_RATE, entre 0 et 1)
+    """
+    if header_value and os.getenv('PROFILING_ENABLED', 'false').lower() == 'true':
+        return True
+    rate = float(os.getenv('PROFILE_SAMPLE_RATE', 0) or 0)
+    return rate > 0 and random.random() < rate
+
+
+def start_profile() -> Optional[cProfile.Profile]:
+    # Un seul profil à la fois par processus (cProfile ne supporte pas les profils concurrents)
+    if not _profile_lock.acquire(blocking=False):
+        return None
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        _profile_lock.release()
+        return None
+    return profiler
+
+
+def stop_profile(profiler: cProfile.Profile, label: str) -> Optional[str]:
+    """
+    Arrête le profil et l'écrit dans PROFILE_DIR (lisible avec pstats ou snakeviz)
+    """
+    try:
+        profiler.disable()
+        directory = profile_dir()
+        os.makedirs(directory, exist_ok=True)
+        filename = f"{datetime.utcnow().strftime('%Y%m%dT%H%M%S%f')}-{_TOKEN_RE.sub('_', label)}-{os.getpid()}.prof"
+        path = os.path.join(directory, filename)
+        profiler.dump_stats(path)
+        return path
+    except OSError as e:
+        logger.error(f"Impossible d'écrire le profil: {e}")
+        return None
+    finally:
+        _profile_lock.release()
+
+
+def init_app(app) -> None:
+    """
+    Trace chaque requête Flask : Server-Timing, journal des requêtes lentes (SLOW_REQUEST_MS)
+    et profilage à la demande
+    """
+    from flask import g, request
+    from flask.json.provider import DefaultJSONProvider
+
+    class TracedJSONProvider(DefaultJSONProvider):
+        def response(self, *args, **kwargs):
+            with span('json.encode'):
+                return super().response(*args, **kwargs)
+
+    app.json = TracedJSONProvider(app)
+    slow_ms = float(os.getenv('SLOW_REQUEST_MS', 1000))
+
+    @app.before_request
+    def _tracing_before_request():
+        g._trace_token = start_trace(request.endpoint or 'unmatched')
+        g._profiler = start_profile() if profiling_requested(request.headers.get('X-Profile')) else None
+
+    @app.after_request
+    def _tracing_after_request(response):
+        token = g.pop('_trace_token', None)
+        profiler = g.pop('_profiler', None)
+        if profiler is not None:
+            path = stop_profile(profiler, request.endpoint or 'unmatched')
+            if path:
+                logger.info(f"Profil de {request.path} écrit dans {path}")
+        if token is None:
+            return response
+        root = finish_trace(token)
+        response.headers['Server-Timing'] = server_timing(root)
+        if root.duration_ms >= slow_ms:
+            logger.warning(f"Requête lente {request.method} {request.full_path.rstrip('?')} "
+                           f"({response.status_code}):\n{root.format_tree()}")
+        return response
+
+    @app.teardown_request
+    def _tracing_teardown_request(exc):
+        # Requête interrompue par une exception : libérer le profileur et le contexte
+        profiler = g.pop('_profiler', None)
+        if profiler is not None:
+            stop_profile(profiler, request.endpoint or 'unmatched')
+        token = g.pop('_trace_token', None)
+        if token is not None:
+            finish_trace(token)
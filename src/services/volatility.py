@@ -0,0 +1,212 @@
+"""
+Statistiques de séance par valeur (ATR(14), volatilité réalisée, volume de la séance précédente)
+
+Calculées à partir de l'historique local en une seule passe vectorisée sur toutes les valeurs :
+les historiques sont alignés à droite dans un panneau (valeurs x séances) complété par des NaN.
+Le résultat est recalculé en arrière-plan à chaque nouvelle séance, jamais dans une requête.
+"""
+import logging
+import threading
+import warnings
+from typing import Dict, Optional
+
+import numpy as np
+from scipy.signal import lfilter
+
+from . import market_feed, metrics, rate_limiter
+
+logger = logging.getLogger(__name__)
+
+ATR_PERIOD = 14
+VOLATILITY_WINDOW = 20
+VOLUME_WINDOW = 20
+TRADING_DAYS = 252
+# Au-delà, le poids des séances dans la moyenne de Wilder est négligeable ((13/14)^260 ~ 4e-9)
+MAX_SESSIONS = 260
+
+
+def _true_range(high: np.ndarray, low: np.ndarray, close: np.ndarray) -> np.ndarray:
+    """True range sur le dernier axe ; la première séance se limite à plus haut - plus bas"""
+    prev_close = np.empty_like(close)
+    prev_close[..., 0] = np.nan
+    prev_close[..., 1:] = close[..., :-1]
+    # fmax ignore les NaN : sans clôture précédente il reste plus haut - plus bas
+    return np.fmax(high - low, np.fmax(np.abs(high - prev_close), np.abs(low - prev_close)))
+
+
+def wilder_atr(high: np.ndarray, low: np.ndarray, close: np.ndarray, period: int = ATR_PERIOD) -> np.ndarray:
+    """
+    ATR de Wilder séance par séance pour une valeur (lissage 1/period initialisé sur le premier true range)
+    """
+    tr = _true_range(high, low, close)
+    alpha = 1 / period
+    out, _ = lfilter([alpha], [1, -(1 - alpha)], tr, zi=[(1 - alpha) * tr[0]])
+    out[:period - 1] = np.nan
+    return out
+
+
+def _panel(histories: Dict, length: int) -> tuple:
+    """Aligne les dernières séances de chaque historique à droite d'un panneau (n, length)"""
+    isins = list(histories)
+    panel = {field: np.full((len(isins), length), np.nan) for field in ('high', 'low', 'close', 'volume')}
+    for row, isin in enumerate(isins):
+        history = histories[isin]
+        k = min(len(history), length)
+        for field, values in panel.items():
+            values[row, length - k:] = history.columns[field][-k:]
+    return isins, panel
+
+
+def compute_session_stats(histories: Dict, atr_period: int = ATR_PERIOD,
+                          volatility_window: int = VOLATILITY_WINDOW) -> Dict[str, Dict]:
+    """
+    Calcule les statistiques de la dernière séance de chaque historique (ISIN -> StockHistory)
+
+    L'ATR est la moyenne de Wilder des true ranges, pondérée exponentiellement depuis la dernière
+    séance et normalisée par les poids des séances disponibles (égale à la récurrence de Wilder
+    dès que l'historique couvre quelques dizaines de séances).
+    """
+    histories = {isin: h for isin, h in histories.items() if h is not None and len(h)}
+    if not histories:
+        return {}
+    length = min(MAX_SESSIONS, max(len(h) for h in histories.values()))
+    isins, panel = _panel(histories, length)
+    high, low, close, volume = panel['high'], panel['low'], panel['close'], panel['volume']
+
+    # ATR(14)
+    tr = _true_range(high, low, close)
+    valid_tr = ~np.isnan(tr)
+    weights = (1 - 1 / atr_period) ** np.arange(length - 1, -1, -1, dtype=np.float64)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        atr = (np.where(valid_tr, tr, 0.0) @ weights) / (valid_tr @ weights)
+    atr[valid_tr.sum(axis=1) < atr_period] = np.nan
+
+    # Volatilité réalisée : écart-type des rendements logarithmiques, annualisé
+    with np.errstate(invalid='ignore', divide='ignore'):
+        returns = np.diff(np.log(np.where(close > 0, close, np.nan)), axis=1)[:, -volatility_window:]
+    n_returns = (~np.isnan(returns)).sum(axis=1)
+    # Lignes entièrement vides (historique trop court) : NaN sans avertissement
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        daily_vol = np.nanstd(returns, axis=1, ddof=1)
+        avg_volume = np.nanmean(volume[:, -VOLUME_WINDOW:], axis=1)
+    daily_vol[n_returns < 2] = np.nan
+    annual_vol = daily_vol * np.sqrt(TRADING_DAYS)
+
+    last_close = close[:, -1]
+    stats = {}
+    for row, isin in enumerate(isins):
+        history = histories[isin]
+        stats[isin] = {
+            'session': int(history.timestamps[-1]),
+            'sessions': len(history),
+            'close': _round(last_close[row], 3),
+            'atr': _round(atr[row], 4),
+            'atr_percent': _round(atr[row] / last_close[row] * 100, 2) if last_close[row] > 0 else None,
+            'volatility': _round(annual_vol[row], 4),
+            'daily_volatility': _round(daily_vol[row], 5),
+            'volume': _round(volume[row, -1], 0),
+            'previous_volume': _round(volume[row, -2], 0) if length > 1 else None,
+            'avg_volume_20': _round(avg_volume[row], 0),
+        }
+    return stats
+
+
+def _round(value, digits: int) -> Optional[float]:
+    value = float(value)
+    return round(value, digits) if np.isfinite(value) else None
+
+
+class SessionStatsService:
+    """
+    Statistiques de séance de toutes les valeurs, recalculées en arrière-plan quand une nouvelle séance
+    apparaît dans les instantanés de marché ; get() ne sert que le dernier calcul
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict] = {}
+        self._session = None
+        self._refreshing = False
+        self.hits = 0
+        self.misses = 0
+        self.refreshes = 0
+
+    @staticmethod
+    def _session_key(stocks: list) -> Optional[tuple]:
+        seances = [s['seance'] for s in stocks if s.get('isin') and s.get('seance')]
+        return (max(seances), len(seances)) if seances else None
+
+    def update(self, stocks: list) -> None:
+        """
+        Consommateur de market_feed : lance le recalcul si l'instantané annonce une nouvelle séance
+        """
+        key = self._session_key(stocks)
+        if key is not None and key != self._session:
+            self._refresh_in_background([s['isin'] for s in stocks if s.get('isin')], key)
+
+    def _refresh_in_background(self, isins: list, key: tuple) -> None:
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+
+        def run():
+            try:
+                # Historiques de toutes les valeurs : priorité basse, les utilisateurs passent avant
+                with rate_limiter.priority('backfill'):
+                    self._refresh(isins, key)
+            except Exception as e:
+                logger.error(f"Erreur lors du calcul des statistiques de séance: {e}")
+            finally:
+                self._refreshing = False
+        threading.Thread(target=run, name='session-stats', daemon=True).start()
+
+    def _refresh(self, isins: list, key: tuple) -> None:
+        from .history_store import get_history_store
+
+        histories = get_history_store().get_many(isins)
+        if not histories:
+            return
+        stats = compute_session_stats(histories)
+        with self._lock:
+            self._stats = stats
+            self.refreshes += 1
+            # Historiques incomplets (débit amont saturé) : nouvel essai au prochain instantané
+            if len(histories) == len(isins):
+                self._session = key
+        logger.info(f"Statistiques de séance recalculées pour {len(stats)} valeurs")
+
+    def get(self, isin: str) -> Optional[Dict]:
+        """
+        Statistiques de la dernière séance d'un ISIN (None si elles ne sont pas encore calculées)
+        """
+        if self._session is None and not self._refreshing:
+            from .data_service import DataService
+            self.update(DataService().snapshot())
+        stats = self._stats.get(isin)
+        if stats is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return stats
+
+    def stats(self) -> Dict:
+        return {'hits': self.hits, 'misses': self.misses, 'entries': len(self._stats), 'refreshes': self.refreshes}
+
+
+_session_stats = None
+_session_stats_lock = threading.Lock()
+
+
+def get_session_stats() -> SessionStatsService:
+    """
+    Retourne le service de statistiques de séance partagé par le processus
+    """
+    global _session_stats
+    with _session_stats_lock:
+        if _session_stats is None:
+            _session_stats = SessionStatsService()
+            market_feed.subscribe(_session_stats.update)
+            metrics.register_cache('session_stats', _session_stats.stats)
+        return _session_stats
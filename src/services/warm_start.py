@@ -0,0 +1,245 @@
+"""
+Démarrage à chaud : valeurs partagées par le processus (snapshot du marché, indices, correspondance
+ticker -> stockName) servies en stale-while-revalidate et persistées sur disque entre deux lancements
+
+Au démarrage, les valeurs sont rechargées depuis WARM_START_PATH (JSON compressé gzip) ; avec
+gunicorn (preload_app), le maître les charge avant le fork pour que les workers partagent ces pages.
+"""
+import gzip
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional
+
+from . import metrics, rate_limiter
+from .cache import sizeof
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+
+_registry: Dict[str, 'WarmValue'] = {}
+_save_lock = threading.Lock()
+_last_save = 0.0
+
+
+def _encode(value):
+    # Les snapshots normalisés contiennent des datetime (last_updated) : restitués tels quels au chargement
+    if isinstance(value, datetime):
+        return {'$datetime': value.isoformat()}
+    raise TypeError(f"Type non sérialisable: {type(value).__name__}")
+
+
+def _decode(obj: Dict):
+    if len(obj) == 1 and '$datetime' in obj:
+        return datetime.fromisoformat(obj['$datetime'])
+    return obj
+
+
+def warm_start_path() -> str:
+    return os.getenv('WARM_START_PATH', os.path.join(
+        os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'cache', 'warm_start.json.gz'))
+
+
+class WarmValue:
+    """
+    Valeur rechargée par `loader` : fraîche pendant `ttl` secondes, puis servie telle quelle
+    jusqu'à `max_stale` secondes pendant qu'un thread la rafraîchit
+    """
+
+    def __init__(self, name: str, loader: Callable[[], Any], ttl: float, max_stale: float,
+                 on_update: Optional[Callable[[Any], None]] = None):
+        self.name = name
+        self.loader = loader
+        self.ttl = ttl
+        self.max_stale = max_stale
+        self.on_update = on_update
+        self.value = None
+        self.bytes = 0
+        self.updated_at = 0.0
+        self._lock = threading.Lock()
+        # Verrou distinct de celui du chargement : une lecture périmée ne l'attend jamais
+        self._refreshing_lock = threading.Lock()
+        self._refreshing = False
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.unchanged = 0
+
+    def age(self) -> float:
+        return time.time() - self.updated_at
+
+    def get(self) -> Any:
+        value = self.value
+        if value is not None:
+            age = self.age()
+            if age < self.ttl:
+                self.hits += 1
+                return value
+            if age < self.max_stale:
+                self.stale_hits += 1
+                self._refresh_in_background()
+                return value
+        self.misses += 1
+        refreshed = self.refresh()
+        return refreshed if refreshed is not None else value
+
+    def set(self, value: Any, updated_at: Optional[float] = None) -> None:
+        self.value = value
+        self.bytes = sizeof(value)
+        self.updated_at = updated_at or time.time()
+        if self.on_update is not None:
+            try:
+                self.on_update(value)
+            except Exception as e:
+                logger.error(f"Erreur lors de la mise à jour de {self.name}: {e}")
+
+    def refresh(self) -> Any:
+        """
+        Recharge la valeur (un seul chargement à la fois ; les appels concurrents attendent son résultat)
+        """
+        started_at = time.time()
+        changed = False
+        with self._lock:
+            if self.updated_at >= started_at:
+                return self.value
+            try:
+                value = self.loader()
+            except Exception as e:
+                logger.error(f"Erreur lors du rechargement de {self.name}: {e}")
+                value = None
+            if value is not None and value is self.value:
+                # Le chargeur a réutilisé la valeur courante (réponse amont inchangée) : elle est
+                # seulement marquée fraîche, sans republication ni sauvegarde
+                self.updated_at = time.time()
+                self.unchanged += 1
+                metrics.count_skipped('publish', self.name)
+            elif value is not None:
+                self.set(value)
+                changed = True
+        # Écriture du fichier hors du verrou de chargement
+        if changed:
+            save_soon()
+        return value
+
+    def _refresh_in_background(self) -> None:
+        with self._refreshing_lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+
+        def run():
+            try:
+                # Rafraîchissement de fond : cède le débit amont aux requêtes des utilisateurs
+                with rate_limiter.priority('poller'):
+                    self.refresh()
+            finally:
+                self._refreshing = False
+        threading.Thread(target=run, name=f'warm-{self.name}', daemon=True).start()
+
+    def stats(self) -> Dict:
+        # Valeur toujours servie : comptée dans les octets mais jamais évincée
+        return {'hits': self.hits + self.stale_hits, 'misses': self.misses,
+                'entries': 0 if self.value is None else 1, 'bytes': self.bytes, 'unchanged': self.unchanged}
+
+
+def register(name: str, loader: Callable[[], Any], ttl: float, max_stale: float = 24 * 3600,
+             on_update: Optional[Callable[[Any], None]] = None) -> WarmValue:
+    value = WarmValue(name, loader, ttl, max_stale, on_update)
+    _registry[name] = value
+    metrics.register_cache(name, value.stats)
+    return value
+
+
+def save(path: Optional[str] = None) -> Optional[str]:
+    """
+    Écrit les valeurs connues dans le fichier de démarrage à chaud (écriture atomique)
+    """
+    path = path or warm_start_path()
+    values = {name: {'updated_at': v.updated_at, 'value': v.value}
+              for name, v in _registry.items() if v.value is not None}
+    if not values:
+        return None
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with gzip.open(tmp, 'wt', encoding='utf-8', compresslevel=6) as f:
+            json.dump({'version': FORMAT_VERSION, 'saved_at': time.time(), 'values': values}, f,
+                      separators=(',', ':'), ensure_ascii=False, default=_encode)
+        os.replace(tmp, path)
+        return path
+    except (OSError, TypeError) as e:
+        logger.error(f"Impossible d'écrire le fichier de démarrage à chaud {path}: {e}")
+        return None
+
+
+def save_soon() -> None:
+    """
+    Sauvegarde au plus une fois toutes les WARM_START_SAVE_INTERVAL secondes
+    """
+    global _last_save
+    interval = float(os.getenv('WARM_START_SAVE_INTERVAL', 60))
+    now = time.monotonic()
+    if (_last_save and now - _last_save < interval) or not _save_lock.acquire(blocking=False):
+        return
+    try:
+        _last_save = now
+        save()
+    finally:
+        _save_lock.release()
+
+
+def _import_owners() -> None:
+    # Les routes importent les services à la demande : on s'assure que leurs valeurs sont enregistrées
+    from . import bvmt_service, data_service  # noqa: F401
+
+
+def load(path: Optional[str] = None) -> int:
+    """
+    Recharge les valeurs enregistrées plus récentes que celles en mémoire ; retourne leur nombre
+    """
+    _import_owners()
+    path = path or warm_start_path()
+    if not os.path.isfile(path):
+        return 0
+    try:
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            data = json.load(f, object_hook=_decode)
+    except (OSError, ValueError) as e:
+        logger.warning(f"Fichier de démarrage à chaud illisible {path}: {e}")
+        return 0
+    if data.get('version') != FORMAT_VERSION:
+        return 0
+
+    loaded = 0
+    for name, entry in data.get('values', {}).items():
+        target = _registry.get(name)
+        if target is None or entry.get('value') is None:
+            continue
+        if entry['updated_at'] > target.updated_at and time.time() - entry['updated_at'] < target.max_stale:
+            target.set(entry['value'], entry['updated_at'])
+            loaded += 1
+    return loaded
+
+
+def warm(fetch_missing: bool = True) -> Dict[str, str]:
+    """
+    Prépare les caches avant de servir : chargement depuis le disque, puis appel amont pour les valeurs absentes.
+    Synchrone et sans thread, donc utilisable dans le maître gunicorn avant le fork.
+    """
+    started = time.perf_counter()
+    load()
+    status = {}
+    for name, value in _registry.items():
+        if value.value is not None:
+            status[name] = f"disque ({int(value.age())} s)"
+        elif fetch_missing:
+            with rate_limiter.priority('poller'):
+                status[name] = 'amont' if value.refresh() is not None else 'indisponible'
+        else:
+            status[name] = 'absent'
+    logger.info(f"Démarrage à chaud en {(time.perf_counter() - started) * 1000:.0f} ms: {status}")
+    return status
@@ -382,22 +382,28 @@ async function fetchStockHistory(symbol) {
         const period = getPeriodParam();
 
         // Récupérer les données de l'API
-        const response = await fetch(`/api/stocks/${symbol}/history?period=${period}`);
-        if (!response.ok) {
-            throw new Error(`Erreur HTTP: ${response.status}`);
+        const series = await fetchColumnar(`/api/stocks/${symbol}/history?period=${period}`);
+        if (series.columns) {
+            // Format binaire : colonnes date (jours epoch) et close lues sans analyse JSON
+            const { date, close } = series.columns;
+            if (close.length === 0) {
+                throw new Error('Format de données invalide');
+            }
+            return Array.from(close, (y, i) => ({ x: epochDayToDate(date[i]), y }));
         }
 
-        const data = await response.json();
+        const payload = series.json;
+        const data = payload && payload.success && payload.data ? payload.data.history : null;
 
         // Vérifier que les données sont valides
-        if (!data || !Array.isArray(data)) {
+        if (!data || !Array.isArray(data) || data.length === 0) {
             throw new Error('Format de données invalide');
         }
 
         // Formater les données pour le graphique
         return data.map(item => ({
             x: new Date(item.date),
-            y: item.close || item.value
+            y: item.close
         }));
     } catch (error) {
         console.error(`Erreur lors de la récupération de l'historique de l'action ${symbol}:`, error);
@@ -463,15 +469,15 @@ function getDemoStockData(symbol) {
 // Fonction pour convertir la période en paramètre API
 function getPeriodParam() {
     switch (currentPeriod) {
-        case '1D': return 'day';
-        case '1W': return 'week';
-        case '1M': return 'month';
-        case '3M': return '3months';
-        case '6M': return '6months';
-        case '1Y': return 'year';
+        case '1D': return '1d';
+        case '1W': return '1w';
+        case '1M': return '1m';
+        case '3M': return '3m';
+        case '6M': return '6m';
+        case '1Y': return '1y';
         case 'YTD': return 'ytd';
-        case 'MAX': return 'max';
-        default: return '3months';
+        case 'MAX': return 'all';
+        default: return '3m';
     }
 }
 
@@ -38,7 +38,7 @@ async function initIndexCharts() {
 }
 
 /**
- * Récupère l'historique d'un indice depuis l'API
+ * Récupère l'historique d'un indice depuis l'API (cache serveur partagé, série déjà réduite pour l'affichage)
  * @param {string} isin - Code ISIN de l'indice
  * @returns {Array} Données historiques formatées pour Chart.js
  */
@@ -46,232 +46,40 @@ async function fetchIndexHistory(isin) {
     try {
         console.log(`Récupération de l'historique pour l'indice ${isin}...`);
 
-        // Essayer d'abord notre API interne
-        try {
-            const internalApiResponse = await fetch(`/api/indices/history/${isin}`);
-            if (internalApiResponse.ok) {
-                const data = await internalApiResponse.json();
-                if (data.success && data.data && data.data.history) {
-                    console.log(`Données historiques reçues de l'API interne pour ${isin}`);
-                    return formatIndexHistoryData(data.data.history);
-                }
-            }
-        } catch (internalErr) {
-            console.warn(`Échec de l'API interne, tentative via API BVMT directe: ${internalErr}`);
-        }
-
-        let historyData;
-
-        // Pour TUNINDEX, essayer l'API intraday qui a des données plus riches
-        if (isin === TUNINDEX_ISIN) {
-            try {
-                console.log(`Tentative via l'API intraday pour TUNINDEX...`);
-                const intradayResponse = await fetch(`https://www.bvmt.com.tn/rest_api/rest/intraday/${isin}`);
-
-                if (intradayResponse.ok) {
-                    const data = await intradayResponse.json();
-                    console.log('Données intraday reçues:', data);
-
-                    if (data && data.intradayDatas && data.intradayDatas.length > 0) {
-                        // Extraire les données historiques de l'API intraday
-                        // et les formater pour être compatibles avec le format attendu
-                        historyData = {
-                            indexHistorys: data.intradayDatas.map(item => ({
-                                sEANCE: item.sEANCE,
-                                lAST: item.lAST,
-                                oPEN: item.oPEN,
-                                hIGH: item.hIGH,
-                                lOW: item.lOW,
-                                pREV_CLOSE: item.pREV_CLOSE,
-                                // Calcul explicite de la variation
-                                cHANGE: parseFloat(item.lAST) - parseFloat(item.pREV_CLOSE),
-                                // Calcul explicite du pourcentage de variation
-                                yChange: parseFloat(item.pREV_CLOSE) > 0 ?
-                                    ((parseFloat(item.lAST) - parseFloat(item.pREV_CLOSE)) / parseFloat(item.pREV_CLOSE)) * 100 : 0
-                            }))
-                        };
-                        console.log(`Données intraday formatées pour ${isin}:`, historyData);
-                        return formatIndexHistoryData(historyData.indexHistorys);
-                    }
-                }
-            } catch (intradayError) {
-                console.error(`Erreur lors de l'accès à l'API intraday:`, intradayError);
-            }
-        }
-
-        // Si l'API intraday a échoué ou pour TUNINDEX20, utiliser l'API history standard
-        console.log(`Tentative via l'API history standard...`);
-        const response = await fetch(`https://www.bvmt.com.tn/rest_api/rest/history/${isin}`);
-
-        if (!response.ok) {
-            throw new Error(`Erreur HTTP: ${response.status}`);
+        const series = await fetchColumnar(`/api/indices/history/${isin}?period=1y&points=400`);
+        if (series.columns) {
+            // Format binaire : colonnes date (jours epoch) et value lues sans analyse JSON
+            const { date, value } = series.columns;
+            console.log(`${series.meta.count} points historiques reçus pour ${isin} (sur ${series.meta.source_count})`);
+            return Array.from(value, (y, i) => ({ x: epochDayToDate(date[i]), y }));
         }
 
-        const data = await response.json();
-        console.log(`Données historiques reçues directement de BVMT pour ${isin}:`, data);
-
-        // Vérifier que les données sont bien formatées
-        if (!data || !data.indexHistorys || !Array.isArray(data.indexHistorys)) {
+        const data = series.json;
+        if (!data || !data.success || !data.data || !Array.isArray(data.data.points)) {
             throw new Error('Format de données invalide');
         }
 
-        // Enrichir les données avec des pourcentages de variation calculés
-        const enrichedData = {
-            ...data,
-            indexHistorys: data.indexHistorys.map((item, index, array) => {
-                // Récupérer les valeurs numériques
-                const currentValue = parseFloat(item.lAST);
-
-                // Trouver la valeur précédente si possible
-                let prevValue = null;
-                if (index > 0) {
-                    prevValue = parseFloat(array[index - 1].lAST);
-                } else if (item.pREV_CLOSE) {
-                    prevValue = parseFloat(item.pREV_CLOSE);
-                }
-
-                // Calculer la variation et le pourcentage si possible
-                let change = 0;
-                let percentChange = 0;
-
-                if (prevValue && !isNaN(prevValue) && !isNaN(currentValue)) {
-                    change = currentValue - prevValue;
-                    percentChange = (change / prevValue) * 100;
-                }
-
-                return {
-                    ...item,
-                    calculatedChange: change,
-                    calculatedPercentChange: percentChange
-                };
-            })
-        };
-
-        console.log(`Données enrichies pour ${isin}:`, enrichedData);
-        return formatIndexHistoryData(enrichedData.indexHistorys);
+        console.log(`${data.data.count} points historiques reçus pour ${isin} (sur ${data.data.source_count})`);
+        return formatIndexHistoryData(data.data.points);
     } catch (error) {
         console.error(`Erreur lors de la récupération de l'historique de l'indice ${isin}:`, error);
 
-        // Deuxième tentative avec un proxy CORS si nécessaire
-        try {
-            const corsProxyUrl = `https://corsproxy.io/?https://www.bvmt.com.tn/rest_api/rest/history/${isin}`;
-            console.log(`Tentative via proxy CORS: ${corsProxyUrl}`);
-
-            const proxyResponse = await fetch(corsProxyUrl);
-            if (proxyResponse.ok) {
-                const data = await proxyResponse.json();
-                if (data && data.indexHistorys && Array.isArray(data.indexHistorys)) {
-                    console.log(`Données historiques reçues via proxy pour ${isin}`);
-
-                    // Enrichir les données avec des calculs
-                    const enrichedData = {
-                        ...data,
-                        indexHistorys: data.indexHistorys.map((item, index, array) => {
-                            // Récupérer les valeurs numériques
-                            const currentValue = parseFloat(item.lAST);
-
-                            // Trouver la valeur précédente si possible
-                            let prevValue = null;
-                            if (index > 0) {
-                                prevValue = parseFloat(array[index - 1].lAST);
-                            } else if (item.pREV_CLOSE) {
-                                prevValue = parseFloat(item.pREV_CLOSE);
-                            }
-
-                            // Calculer la variation et le pourcentage si possible
-                            let change = 0;
-                            let percentChange = 0;
-
-                            if (prevValue && !isNaN(prevValue) && !isNaN(currentValue)) {
-                                change = currentValue - prevValue;
-                                percentChange = (change / prevValue) * 100;
-                            }
-
-                            return {
-                                ...item,
-                                calculatedChange: change,
-                                calculatedPercentChange: percentChange
-                            };
-                        })
-                    };
-
-                    return formatIndexHistoryData(enrichedData.indexHistorys);
-                }
-            }
-        } catch (proxyError) {
-            console.error(`Échec de la tentative via proxy CORS:`, proxyError);
-        }
-
         // En dernier recours, utiliser les données de démonstration
-        console.warn(`Utilisation des données de démonstration pour ${isin} après échec des tentatives`);
+        console.warn(`Utilisation des données de démonstration pour ${isin} après échec de l'API`);
         return getDemoIndexData(isin);
     }
 }
 
 /**
- * Formate les données historiques d'un indice pour Chart.js
- * @param {Array} historyData - Données brutes de l'API
+ * Formate les points renvoyés par /api/indices/history pour Chart.js
+ * @param {Array} points - Points {date: 'YYYY-MM-DD', value} triés par date
  * @returns {Array} Données formatées pour Chart.js
  */
-function formatIndexHistoryData(historyData) {
-    return historyData
-        .sort((a, b) => {
-            // Convertir les dates (format: "jour mois année") en objets Date
-            const dateA = parseSeanceDate(a.sEANCE);
-            const dateB = parseSeanceDate(b.sEANCE);
-            return dateA - dateB;
-        })
-        .map(item => ({
-            x: parseSeanceDate(item.sEANCE),
-            y: item.lAST
-        }));
-}
-
-/**
- * Parse une date au format "jour mois année" en objet Date
- * @param {string} dateStr - Date au format "jour mois année"
- * @returns {Date} Date parsée
- */
-function parseSeanceDate(dateStr) {
-    // Convertir les mois abrégés français en indices numériques
-    const monthsMapping = {
-        'janv.': 0, 'févr.': 1, 'mars': 2, 'avr.': 3, 'mai': 4, 'juin': 5,
-        'juil.': 6, 'août': 7, 'sept.': 8, 'oct.': 9, 'nov.': 10, 'déc.': 11
-    };
-
-    // Traiter les formats avec l'année à 4 chiffres ou à 2 chiffres
-    const parts = dateStr.split(' ');
-
-    if (parts.length !== 3) {
-        // Format invalide, retourner la date actuelle
-        console.warn(`Format de date invalide: ${dateStr}`);
-        return new Date();
-    }
-
-    const day = parseInt(parts[0], 10);
-    const monthStr = parts[1].toLowerCase();
-    let year = parseInt(parts[2], 10);
-
-    // Si l'année est sur 2 chiffres, convertir en 4 chiffres
-    if (year < 100) {
-        year += 2000;
-    }
-
-    // Trouver le mois correspondant
-    let month = -1;
-    for (const [key, value] of Object.entries(monthsMapping)) {
-        if (monthStr.startsWith(key.toLowerCase())) {
-            month = value;
-            break;
-        }
-    }
-
-    if (month === -1) {
-        console.warn(`Mois non reconnu: ${monthStr}`);
-        month = 0; // Défaut à janvier
-    }
-
-    return new Date(year, month, day);
+function formatIndexHistoryData(points) {
+    return points.map(point => ({
+        x: new Date(point.date),
+        y: point.value
+    }));
 }
 
 /**
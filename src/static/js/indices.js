@@ -2,8 +2,8 @@
 
 /**
  * Met à jour les indices boursiers sur le dashboard
- * Cette fonction utilise les API pour récupérer les vraies données des indices
- * stockées dans MongoDB et/ou directement depuis l'API BVMT
+ * Cette fonction utilise l'API interne (indices puis séries intraday en cache côté serveur) :
+ * le navigateur n'interroge jamais bvmt.com.tn directement
  */
 async function updateMarketIndices() {
     try {
@@ -21,256 +21,56 @@ async function updateMarketIndices() {
             }
         } catch (error) {
             console.warn('Erreur API lors de la récupération des indices:', error);
-            dataSource = 'bvmt_direct';
+            dataSource = 'intraday';
         }
 
-        // 2. Si l'API interne échoue, essayer directement l'API BVMT
+        // 2. Si l'API interne échoue, reconstituer les indices depuis leurs séries intraday (cache serveur)
         if (!indicesData) {
             try {
-                console.log('Tentative de récupération des indices directement depuis l\'API BVMT...');
-
-                // Utilisation de l'endpoint intraday pour TUNINDEX comme recommandé par l'utilisateur
-                const [tunindexResponse, tunindex20Response] = await Promise.allSettled([
-                    fetch('https://www.bvmt.com.tn/rest_api/rest/intraday/TN0009050014'),
-                    fetch('https://www.bvmt.com.tn/rest_api/rest/market/TN0009050287')
-                ]);
-
-                // Traiter TUNINDEX (depuis l'API intraday)
-                let tunindexData = null;
-                if (tunindexResponse.status === 'fulfilled' && tunindexResponse.value.ok) {
-                    const data = await tunindexResponse.value.json();
-                    console.log('Données TUNINDEX brutes de BVMT (intraday):', data);
-
-                    if (data && data.intradayDatas && data.intradayDatas.length > 0) {
-                        // Prendre la dernière valeur intraday (la plus récente)
-                        const lastData = data.intradayDatas[data.intradayDatas.length - 1];
-
-                        // L'API intraday a un format différent, adaptation des données
-                        const value = parseFloat(lastData.lAST);
-                        const prevValue = parseFloat(lastData.pREV_CLOSE);
-                        const change = value - prevValue;
-                        // Correction du calcul du pourcentage de variation
-                        const percent_change = prevValue ? (change / prevValue) * 100 : 0;
-
-                        console.log('TUNINDEX - Données calculées avec précision:', {
-                            value,
-                            prevValue,
-                            change,
-                            percent_change
-                        });
-
-                        tunindexData = {
-                            name: 'TUNINDEX',
-                            isin: 'TN0009050014',
-                            value: value,
-                            prev_value: prevValue,
-                            change: change,
-                            percent_change: percent_change, // Utiliser la valeur calculée correctement
-                            seance: lastData.sEANCE || new Date().toLocaleDateString('fr-FR'),
-                            time: lastData.tIME || new Date().toLocaleTimeString('fr-FR'),
-                            last_updated: new Date().toISOString()
-                        };
+                console.log('Tentative de récupération des indices depuis les séries intraday...');
+
+                const indexDefinitions = [
+                    { name: 'TUNINDEX', isin: 'TN0009050014' },
+                    { name: 'TUNINDEX20', isin: 'TN0009050287' }
+                ];
+                const responses = await Promise.allSettled(
+                    indexDefinitions.map(index => fetch(`/api/indices/intraday/${index.isin}?points=2`))
+                );
+
+                const indices = [];
+                for (let i = 0; i < indexDefinitions.length; i++) {
+                    const response = responses[i];
+                    if (response.status !== 'fulfilled' || !response.value.ok) {
+                        continue;
                     }
-                }
-
-                // Traiter TUNINDEX20 (depuis l'API market)
-                let tunindex20Data = null;
-                if (tunindex20Response.status === 'fulfilled' && tunindex20Response.value.ok) {
-                    const data = await tunindex20Response.value.json();
-                    console.log('Données TUNINDEX20 brutes de BVMT:', data);
-
-                    if (data && data.market) {
-                        // L'API market utilise un format différent
-                        const marketData = data.market;
-
-                        // Récupération directe des valeurs depuis l'API
-                        const value = parseFloat(marketData.last) || 0;
-                        const close = parseFloat(marketData.close) || 0;
-                        const prevClose = parseFloat(marketData.prev_close) || close || value; // Fallback si prev_close n'existe pas
-
-                        // Calcul de la variation si nécessaire
-                        let change = parseFloat(marketData.change);
-                        if (isNaN(change) && value && prevClose) {
-                            change = value - prevClose;
-                        }
-
-                        // Calcul du pourcentage de variation si nécessaire
-                        let percentChange = parseFloat(marketData.ychange);
-                        if (isNaN(percentChange) && change && prevClose) {
-                            percentChange = (change / prevClose) * 100;
-                        }
-
-                        console.log('TUNINDEX20 - Données calculées:', {
-                            value,
-                            prevClose,
-                            change,
-                            percentChange
-                        });
-
-                        tunindex20Data = {
-                            name: 'TUNINDEX20',
-                            isin: 'TN0009050287',
-                            value: value,
-                            prev_value: prevClose,
-                            change: change || 0,
-                            percent_change: percentChange || 0,
-                            seance: marketData.seance,
-                            time: marketData.time,
-                            last_updated: new Date().toISOString()
-                        };
+                    const result = await response.value.json();
+                    if (!result.success || !result.data || result.data.last === undefined) {
+                        continue;
                     }
+                    const series = result.data;
+                    indices.push({
+                        name: indexDefinitions[i].name,
+                        isin: indexDefinitions[i].isin,
+                        value: series.last,
+                        prev_value: series.prev_close,
+                        change: series.change || 0,
+                        percent_change: series.change_percent || 0,
+                        seance: new Date().toLocaleDateString('fr-FR'),
+                        time: series.last_time,
+                        last_updated: new Date().toISOString()
+                    });
                 }
 
-                // Si au moins un indice a été récupéré, créer un objet de données
-                if (tunindexData || tunindex20Data) {
+                if (indices.length > 0) {
                     indicesData = {
-                        indices: [],
+                        indices: indices,
                         timestamp: new Date().toISOString()
                     };
-
-                    // Ajouter explicitement les données et afficher un log détaillé
-                    if (tunindexData) {
-                        console.log('Ajout des données TUNINDEX à l\'objet indicesData:', tunindexData);
-                        indicesData.indices.push(tunindexData);
-                    }
-
-                    if (tunindex20Data) {
-                        console.log('Ajout des données TUNINDEX20 à l\'objet indicesData:', tunindex20Data);
-                        indicesData.indices.push(tunindex20Data);
-                    }
-
-                    // Vérifier que les données ont bien été ajoutées
-                    console.log('Nombre d\'indices dans indicesData:', indicesData.indices.length);
-                    console.log('Données complètes indicesData:', indicesData);
-
-                    console.log('Données des indices récupérées avec succès directement depuis l\'API BVMT');
-                    dataSource = 'bvmt_direct';
-                }
-            } catch (bvmtError) {
-                console.warn('Erreur lors de l\'accès direct à l\'API BVMT:', bvmtError);
-                dataSource = 'proxy';
-            }
-        }
-
-        // 3. Si l'API BVMT directe échoue, essayer via un proxy CORS
-        if (!indicesData) {
-            try {
-                console.log('Tentative de récupération des indices via proxy CORS...');
-
-                const [tunindexResponse, tunindex20Response] = await Promise.allSettled([
-                    fetch('https://corsproxy.io/?https://www.bvmt.com.tn/rest_api/rest/market/TN0009050014'),
-                    fetch('https://corsproxy.io/?https://www.bvmt.com.tn/rest_api/rest/market/TN0009050287')
-                ]);
-
-                // Traiter TUNINDEX via proxy
-                let tunindexData = null;
-                if (tunindexResponse.status === 'fulfilled' && tunindexResponse.value.ok) {
-                    const data = await tunindexResponse.value.json();
-                    console.log('Données TUNINDEX brutes via proxy:', data);
-
-                    if (data && data.market) {
-                        // Extraction et nettoyage des données de variation
-                        const rawChange = data.market.change;
-                        const rawPercentChange = data.market.ychange;
-
-                        // Conversion en nombres avec traitement des cas spéciaux
-                        const change = parseFloat(rawChange) || 0;
-                        // S'assurer que percent_change est un nombre, même si c'est 0
-                        let percent_change = parseFloat(rawPercentChange);
-                        if (isNaN(percent_change)) {
-                            // Si la valeur est NaN, utiliser le calcul à partir de la variation absolue
-                            // et de la dernière valeur si possible
-                            const lastValue = parseFloat(data.market.last);
-                            if (!isNaN(lastValue) && lastValue > 0 && !isNaN(change)) {
-                                percent_change = (change / (lastValue - change)) * 100;
-                            } else {
-                                percent_change = 0;
-                            }
-                        }
-
-                        console.log('TUNINDEX via proxy - Variation calculée:', { change, percent_change });
-
-                        tunindexData = {
-                            name: 'TUNINDEX',
-                            isin: 'TN0009050014',
-                            value: parseFloat(data.market.last) || 0,
-                            change: change,
-                            percent_change: percent_change,
-                            seance: data.market.seance,
-                            time: data.market.time,
-                            last_updated: new Date().toISOString()
-                        };
-                    }
-                }
-
-                // Traiter TUNINDEX20 via proxy
-                let tunindex20Data = null;
-                if (tunindex20Response.status === 'fulfilled' && tunindex20Response.value.ok) {
-                    const data = await tunindex20Response.value.json();
-                    console.log('Données TUNINDEX20 brutes via proxy:', data);
-
-                    if (data && data.market) {
-                        // Extraction et nettoyage des données de variation
-                        const rawChange = data.market.change;
-                        const rawPercentChange = data.market.ychange;
-
-                        // Conversion en nombres avec traitement des cas spéciaux
-                        const change = parseFloat(rawChange) || 0;
-                        // S'assurer que percent_change est un nombre, même si c'est 0
-                        let percent_change = parseFloat(rawPercentChange);
-                        if (isNaN(percent_change)) {
-                            // Si la valeur est NaN, utiliser le calcul à partir de la variation absolue
-                            // et de la dernière valeur si possible
-                            const lastValue = parseFloat(data.market.last);
-                            if (!isNaN(lastValue) && lastValue > 0 && !isNaN(change)) {
-                                percent_change = (change / (lastValue - change)) * 100;
-                            } else {
-                                percent_change = 0;
-                            }
-                        }
-
-                        console.log('TUNINDEX20 via proxy - Variation calculée:', { change, percent_change });
-
-                        tunindex20Data = {
-                            name: 'TUNINDEX20',
-                            isin: 'TN0009050287',
-                            value: parseFloat(data.market.last) || 0,
-                            change: change,
-                            percent_change: percent_change,
-                            seance: data.market.seance,
-                            time: data.market.time,
-                            last_updated: new Date().toISOString()
-                        };
-                    }
-                }
-
-                // Si au moins un indice a été récupéré, créer un objet de données
-                if (tunindexData || tunindex20Data) {
-                    indicesData = {
-                        indices: [],
-                        timestamp: new Date().toISOString()
-                    };
-
-                    // Ajouter explicitement les données et afficher un log détaillé
-                    if (tunindexData) {
-                        console.log('Ajout des données TUNINDEX à l\'objet indicesData:', tunindexData);
-                        indicesData.indices.push(tunindexData);
-                    }
-
-                    if (tunindex20Data) {
-                        console.log('Ajout des données TUNINDEX20 à l\'objet indicesData:', tunindex20Data);
-                        indicesData.indices.push(tunindex20Data);
-                    }
-
-                    // Vérifier que les données ont bien été ajoutées
-                    console.log('Nombre d\'indices dans indicesData:', indicesData.indices.length);
-                    console.log('Données complètes indicesData:', indicesData);
-
-                    console.log('Données des indices récupérées avec succès via proxy CORS');
-                    dataSource = 'proxy';
+                    console.log('Données des indices reconstituées depuis les séries intraday:', indicesData);
+                    dataSource = 'intraday';
                 }
-            } catch (proxyError) {
-                console.warn('Erreur lors de l\'accès via proxy CORS:', proxyError);
+            } catch (intradayError) {
+                console.warn('Erreur lors de la récupération des séries intraday des indices:', intradayError);
                 dataSource = 'fallback';
             }
         }
@@ -549,7 +549,7 @@ class Stocks {
         try {
             const response = await fetch(`/api/stocks/intraday/${isin}`);
             const result = await response.json();
-            const intradays = result.intradays || [];
+            const intradays = (result.data && result.data.intradays) || [];
             if (intradays.length > 0) {
                 intradays.sort((a, b) => (a.time > b.time ? 1 : -1));
                 const labels = intradays.map(item => item.time);
@@ -354,3 +354,54 @@ function downloadCSV(data, filename = 'data.csv') {
     URL.revokeObjectURL(url);
 }
 
+
+// Séries de graphiques au format binaire en colonnes (application/vnd.atlas.columnar)
+const COLUMNAR_MIMETYPE = 'application/vnd.atlas.columnar';
+
+// Décode un corps binaire en colonnes : { meta, columns } où chaque colonne est une vue typée sur le tampon
+function decodeColumnar(buffer) {
+    const view = new DataView(buffer);
+    const magic = String.fromCharCode(view.getUint8(0), view.getUint8(1), view.getUint8(2), view.getUint8(3));
+    if (magic !== 'ATLC' || view.getUint8(4) !== 1) {
+        throw new Error('Format en colonnes non reconnu');
+    }
+    const count = view.getUint8(5);
+    const metaLength = view.getUint16(6, true);
+    const rows = view.getUint32(8, true);
+    const decoder = new TextDecoder();
+    let offset = 12;
+    const meta = JSON.parse(decoder.decode(new Uint8Array(buffer, offset, metaLength)) || '{}');
+    offset += metaLength;
+
+    const descriptors = [];
+    for (let i = 0; i < count; i++) {
+        const kind = String.fromCharCode(view.getUint8(offset));
+        const nameLength = view.getUint8(offset + 1);
+        descriptors.push({ kind, name: decoder.decode(new Uint8Array(buffer, offset + 2, nameLength)) });
+        offset += 2 + nameLength + ((4 - (2 + nameLength) % 4) % 4);
+    }
+    // Les données sont little-endian : lecture directe sur les plateformes little-endian (toutes en pratique)
+    const columns = {};
+    for (const { kind, name } of descriptors) {
+        columns[name] = kind === 'i' ? new Int32Array(buffer, offset, rows) : new Float32Array(buffer, offset, rows);
+        offset += rows * 4;
+    }
+    return { meta, columns };
+}
+
+// Récupère une série en demandant le format binaire ; retombe sur le JSON si le serveur ne le fournit pas
+async function fetchColumnar(url) {
+    const response = await fetch(url, { headers: { Accept: `${COLUMNAR_MIMETYPE}, application/json;q=0.5` } });
+    if (!response.ok) {
+        throw new Error(`Erreur HTTP: ${response.status}`);
+    }
+    if ((response.headers.get('Content-Type') || '').startsWith(COLUMNAR_MIMETYPE)) {
+        return decodeColumnar(await response.arrayBuffer());
+    }
+    return { json: await response.json() };
+}
+
+// Jours depuis le 1970-01-01 (colonne date) -> Date
+function epochDayToDate(day) {
+    return new Date(day * 86400000);
+}
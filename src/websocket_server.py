@@ -1,8 +1,21 @@
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
 from flask import Flask, render_template
 from flask_socketio import SocketIO, emit
+import argparse
+import logging
 import threading
 import time
 
+from src.services.data_service import DataService
+from src.services.anomalies import get_anomaly_detector
+from src.services import rate_limiter
+from src.services.session_archive import SessionReplayer, get_session_recorder
+
+logger = logging.getLogger(__name__)
+
 app = Flask(__name__)
 socketio = SocketIO(app, cors_allowed_origins="*")
 
@@ -10,16 +23,50 @@ socketio = SocketIO(app, cors_allowed_origins="*")
 def index():
     return "WebSocket server running."
 
-# Exemple : émettre un événement toutes les 10 secondes (à remplacer par ta logique réelle)
-def background_thread():
+# Chaque nouvel instantané alimente le détecteur d'anomalies ; seules les nouvelles anomalies sont diffusées.
+# En direct, la boucle déclenche aussi (en arrière-plan) le relevé des carnets et l'archive de fin de séance.
+def background_thread(interval=None, record_session=True):
+    data_service = DataService()
+    detector = get_anomaly_detector()
+    recorder = get_session_recorder()
+    last_seq = 0
+    interval = interval or float(os.getenv('SNAPSHOT_TTL', 15))
     while True:
-        socketio.emit('update_chart', {'message': 'Mise à jour des données !'})
-        time.sleep(10)
+        try:
+            with rate_limiter.priority('poller'):
+                stocks = data_service.snapshot()
+            if record_session:
+                recorder.tick(stocks)
+            anomalies = detector.recent(since=last_seq, limit=100)
+            if anomalies:
+                last_seq = anomalies[0]['seq']
+                socketio.emit('anomalies', {'anomalies': anomalies})
+            socketio.emit('update_chart', {'message': 'Mise à jour des données !'})
+        except Exception as e:
+            logger.error(f"Erreur dans la diffusion des mises à jour: {e}")
+        time.sleep(interval)
+
+# Rejeu d'une séance archivée, à la place du direct
+def replay_thread(path, speed):
+    try:
+        stats = SessionReplayer(path, speed=speed).run()
+        logger.info(f"Rejeu terminé: {stats}")
+    except Exception as e:
+        logger.error(f"Erreur lors du rejeu de {path}: {e}")
 
 if __name__ == '__main__':
-    thread = threading.Thread(target=background_thread)
+    parser = argparse.ArgumentParser(description="Serveur WebSocket des mises à jour de marché")
+    parser.add_argument('--replay', metavar='ARCHIVE', help="Rejouer une archive de séance au lieu du direct")
+    parser.add_argument('--speed', type=float, default=10.0, help="Accélération du rejeu (défaut 10x)")
+    parser.add_argument('--port', type=int, default=5000)
+    args = parser.parse_args()
+
+    if args.replay:
+        threading.Thread(target=replay_thread, args=(args.replay, args.speed), daemon=True).start()
+        interval = float(os.getenv('SNAPSHOT_TTL', 15)) / args.speed
+        thread = threading.Thread(target=background_thread, args=(interval, False))
+    else:
+        thread = threading.Thread(target=background_thread)
     thread.daemon = True
     thread.start()
-    socketio.run(app, host='0.0.0.0', port=5000)
-
-
+    socketio.run(app, host='0.0.0.0', port=args.port)